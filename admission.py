@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger("Admission")
+
+
+class AdmissionController:
+    """Limits on concurrent streams and bytes in flight, per server and per
+    user. A limit of 0 means unlimited."""
+
+    RETRY_AFTER_MS = 1000
+    MAX_RETRY_AFTER_MS = 30000
+
+    def __init__(self, max_streams=0, max_streams_per_user=0,
+                 max_bytes=0, max_bytes_per_user=0):
+        self.max_streams = max_streams
+        self.max_streams_per_user = max_streams_per_user
+        self.max_bytes = max_bytes
+        self.max_bytes_per_user = max_bytes_per_user
+
+        self.streams = {}  # sid -> username
+        self.user_streams = Counter()
+        self.bytes = 0
+        self.user_bytes = Counter()
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def admit(self, sid, username):
+        "Take a stream slot for sid; return 0 or the retry-after hint in ms"
+        with self.lock:
+            if sid in self.streams:
+                return 0  # la sesión ya tiene hueco: cambiar de stream no cuenta doble
+
+            overload = max(
+                self.ratio(len(self.streams) + 1, self.max_streams),
+                self.ratio(self.user_streams[username] + 1, self.max_streams_per_user),
+                self.ratio(self.bytes, self.max_bytes),
+                self.ratio(self.user_bytes[username], self.max_bytes_per_user))
+
+            if overload > 1:
+                self.rejected += 1
+                # Cuanto más saturado, más largo el aviso: así los clientes se reparten
+                return int(min(self.RETRY_AFTER_MS * overload, self.MAX_RETRY_AFTER_MS))
+
+            self.streams[sid] = username
+            self.user_streams[username] += 1
+            return 0
+
+    @staticmethod
+    def ratio(value, limit):
+        return value / limit if limit else 0
+
+    def release(self, sid):
+        with self.lock:
+            username = self.streams.pop(sid, None)
+            if username is not None:
+                self.user_streams[username] -= 1
+                if not self.user_streams[username]:
+                    del self.user_streams[username]
+
+    def add_in_flight(self, username, nbytes):
+        with self.lock:
+            self.bytes += nbytes
+            self.user_bytes[username] += nbytes
+
+    def remove_in_flight(self, username, nbytes):
+        with self.lock:
+            self.bytes -= nbytes
+            self.user_bytes[username] -= nbytes
+            if self.user_bytes[username] <= 0:
+                del self.user_bytes[username]
+
+    @property
+    def active_streams(self):
+        return len(self.streams)
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from time import monotonic, sleep
+
+import Ice
+
+import media_server
+import slice_cache
+from impairment import ImpairedProxy, Impairments
+from media_server import Spotifice
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger("Benchmark")
+
+CHUNK_SIZES = [4096, 16384, 65536]
+SESSION_COUNTS = [1, 4, 16]
+AUTH_THREADS = [1, 4]
+TRACK = '4s.mp3'
+PLAYLIST = 'test-playlist'
+
+
+def percentiles(samples):
+    "p50/p90/p99/max of a list of seconds, in milliseconds"
+    if not samples:
+        return {}
+
+    samples = sorted(samples)
+    def at(p):
+        index = min(len(samples) - 1, int(p / 100 * len(samples)))
+        return round(samples[index] * 1000, 3)
+
+    return dict(p50=at(50), p90=at(90), p99=at(99), max=round(samples[-1] * 1000, 3),
+                count=len(samples))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+#Servidor y render en localhost, en hilos de este proceso o como subprocesos
+class LocalDeployment:
+    def __init__(self, server_port, render_port, server_props=None, use_processes=False,
+                 impairments=None):
+        self.server_port = server_port
+        self.render_port = render_port
+        self.server_props = {
+            'MediaServerAdapter.Endpoints': f'tcp -p {server_port}',
+            'MediaServer.Content': 'test/media',
+            'MediaServer.Playlists': 'test/playlists',
+            **(server_props or {}),
+        }
+        self.use_processes = use_processes
+        self.cleanups = []
+        self.client_ic = Ice.initialize()
+        self.cleanups.append(self.client_ic.destroy)
+        self.player = None
+
+        #Con impairments todo el tráfico al servidor (sesiones incluidas) va por el proxy
+        self.impaired = None
+        if impairments:
+            self.impaired = ImpairedProxy(server_port, impairments).start()
+            self.cleanups.append(self.impaired.stop)
+            self.server_props['MediaServerAdapter.PublishedEndpoints'] = \
+                f'tcp -p {self.impaired.port}'
+
+    def start_server(self):
+        if self.use_processes:
+            self.start_process('media_server.py', self.server_props)
+        else:
+            self.start_thread(media_server.main, self.server_props)
+
+        port = self.impaired.port if self.impaired else self.server_port
+        return self.proxy(f'mediaServer1:tcp -p {port}', Spotifice.MediaServerPrx)
+
+    #El render necesita GStreamer; se arranca en este proceso para leer su GstPlayer.
+    #Con red degradada reproduce a ritmo real para que los cortes de audio sean reales
+    def start_render(self):
+        import media_render
+        from gst_player import GstPlayer
+
+        self.player = GstPlayer(sink='realtime' if self.impaired else 'fast')
+        self.player.start()
+        self.cleanups.append(self.player.shutdown)
+
+        props = {'MediaRenderAdapter.Endpoints': f'tcp -p {self.render_port}'}
+        self.start_thread(media_render.main, props, self.player)
+        return self.proxy(f'mediaRender1:tcp -p {self.render_port}',
+                          Spotifice.MediaRenderPrx)
+
+    def start_thread(self, main, props, *args):
+        init_data = Ice.InitializationData()
+        init_data.properties = Ice.createProperties()
+        for k, v in props.items():
+            init_data.properties.setProperty(k, v)
+
+        ic = Ice.initialize(init_data)
+        thread = threading.Thread(target=main, args=(ic,) + args, daemon=True)
+        thread.start()
+
+        def shutdown():
+            ic.shutdown()
+            ic.destroy()
+            thread.join(3)
+        self.cleanups.append(shutdown)
+
+    def start_process(self, script, props):
+        fd, config = tempfile.mkstemp(suffix='.config')
+        with os.fdopen(fd, 'w') as f:
+            for k, v in props.items():
+                f.write(f'{k}={v}\n')
+
+        process = subprocess.Popen([sys.executable, script, config],
+                                   stderr=subprocess.DEVNULL)
+
+        def shutdown():
+            process.terminate()
+            process.wait(3)
+            os.remove(config)
+        self.cleanups.append(shutdown)
+
+    def proxy(self, proxy_str, cast):
+        proxy = self.client_ic.stringToProxy(proxy_str)
+        for _ in range(20):
+            try:
+                proxy.ice_ping()
+                return cast.uncheckedCast(proxy)
+            except Ice.Exception:
+                sleep(0.25)
+        raise RuntimeError(f"Object not ready: {proxy_str}")
+
+    def stop(self):
+        for cleanup in reversed(self.cleanups):
+            try:
+                cleanup()
+            except Exception as e:
+                logger.warning(f"Cleanup failed: {e}")
+
+
+class StreamingBenchmark:
+    def __init__(self, deployment, duration):
+        self.deployment = deployment
+        self.duration = duration
+        self.server = deployment.start_server()
+
+    #Cada sesión relee la pista en bucle durante `duration` segundos midiendo cada RPC
+    def chunks(self, chunk_size, sessions):
+        latencies = []
+        total = [0]
+        lock = threading.Lock()
+        deadline = monotonic() + self.duration
+
+        def listener():
+            session = self.server.authenticate(None, 'user', 'secret')
+            local, nbytes = [], 0
+            try:
+                while monotonic() < deadline:
+                    session.open_stream(TRACK, 0)
+                    while monotonic() < deadline:
+                        start = monotonic()
+                        chunk = session.get_audio_chunk(chunk_size)
+                        local.append(monotonic() - start)
+                        if not chunk:
+                            break
+                        nbytes += len(chunk)
+            finally:
+                session.close()
+
+            with lock:
+                latencies.extend(local)
+                total[0] += nbytes
+
+        start = monotonic()
+        self.run_threads(listener, sessions)
+        elapsed = monotonic() - start
+
+        return dict(chunk_size=chunk_size, sessions=sessions,
+                    mb_per_sec=round(total[0] / elapsed / 1e6, 3),
+                    latency_ms=percentiles(latencies))
+
+    def authenticate(self, threads):
+        latencies = []
+        lock = threading.Lock()
+        deadline = monotonic() + self.duration
+
+        def client():
+            local = []
+            while monotonic() < deadline:
+                start = monotonic()
+                self.server.authenticate(None, 'user', 'secret').close()
+                local.append(monotonic() - start)
+            with lock:
+                latencies.extend(local)
+
+        start = monotonic()
+        self.run_threads(client, threads)
+        elapsed = monotonic() - start
+
+        return dict(threads=threads, per_sec=round(len(latencies) / elapsed, 1),
+                    latency_ms=percentiles(latencies))
+
+    #Tiempo hasta el primer buffer decodificado, al empezar y al cambiar de pista
+    def render(self, repetitions=5):
+        render = self.deployment.start_render()
+        player = self.deployment.player
+        session = self.server.authenticate(render, 'user', 'secret')
+        render.bind_media_server(self.server, session)
+
+        first_audio = []
+        for _ in range(repetitions):
+            render.load_track(TRACK)
+            start = monotonic()
+            render.play()
+            if player.wait_first_buffer() is not None:
+                first_audio.append(monotonic() - start)
+            render.stop()
+
+        #Reproducción completa de una pista: duración real y cortes por falta de datos
+        render.load_track(TRACK)
+        start = monotonic()
+        render.play()
+        while render.get_status().state != Spotifice.PlaybackState.STOPPED:
+            sleep(0.1)
+        playthrough = dict(secs=round(monotonic() - start, 3),
+                           underruns=player.stats.underruns)
+
+        #Con repeat, next() vuelve al principio en vez de quedarse en la última pista
+        track_change = []
+        render.set_repeat(True)
+        render.load_playlist(PLAYLIST)
+        render.play()
+        player.wait_first_buffer()
+        for _ in range(repetitions):
+            start = monotonic()
+            render.next()
+            if player.wait_first_buffer() is not None:
+                track_change.append(monotonic() - start)
+        render.stop()
+
+        return dict(time_to_first_audio_ms=percentiles(first_audio),
+                    track_change_gap_ms=percentiles(track_change),
+                    playthrough=playthrough)
+
+    #Importar media_server en un intérprete nuevo, con y sin Slice precompilado
+    def cold_start(self, runs=5):
+        for ice_file in slice_cache.SLICE_FILES:
+            slice_cache.build(ice_file)
+        return slice_cache.measure_cold_start('media_server', runs)
+
+    @staticmethod
+    def run_threads(target, count):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+
+def run(args):
+    impairments = Impairments.parse(args.impair) if args.impair else None
+    deployment = LocalDeployment(args.server_port, args.render_port,
+                                 use_processes=args.processes, impairments=impairments)
+    results = {}
+    try:
+        bench = StreamingBenchmark(deployment, args.duration)
+        results['chunks'] = [bench.chunks(size, sessions)
+                             for size in args.chunk_sizes for sessions in args.sessions]
+        results['authenticate'] = [bench.authenticate(n) for n in AUTH_THREADS]
+
+        results['cold_start_ms'] = bench.cold_start()
+
+        try:
+            results['render'] = bench.render()
+        except ImportError as e:
+            results['render'] = dict(skipped=f"GStreamer not available: {e}")
+    finally:
+        deployment.stop()
+
+    return dict(
+        revision=git_revision(),
+        date=datetime.now().isoformat(timespec='seconds'),
+        python=platform.python_version(),
+        machine=platform.machine(),
+        mode='processes' if args.processes else 'threads',
+        duration_secs=args.duration,
+        impairments=args.impair,
+        connection_drops=deployment.impaired.drops if deployment.impaired else 0,
+        results=results)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Spotifice streaming benchmarks")
+    parser.add_argument('-o', '--output',
+                        help="JSON file (default: bench/<revision>.json)")
+    parser.add_argument('-d', '--duration', type=float, default=2.0,
+                        help="seconds per measurement")
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=CHUNK_SIZES)
+    parser.add_argument('--sessions', type=int, nargs='+', default=SESSION_COUNTS)
+    parser.add_argument('--processes', action='store_true',
+                        help="run the server as a subprocess instead of a thread")
+    parser.add_argument('--impair', metavar='SPEC',
+                        help="network between clients and server, e.g. "
+                             "latency_ms=50,jitter_ms=10,bandwidth_kbps=512,drop_every_secs=30")
+    parser.add_argument('--server-port', type=int, default=10100)
+    parser.add_argument('--render-port', type=int, default=10101)
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    output = args.output or os.path.join('bench', f"{report['revision'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as fd:
+        json.dump(report, fd, indent=2)
+
+    for row in report['results']['chunks']:
+        print(f"chunk={row['chunk_size']:>6} sessions={row['sessions']:>3} "
+              f"{row['mb_per_sec']:>8.2f} MB/s p99={row['latency_ms'].get('p99')} ms")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
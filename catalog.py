@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+import uuid
+from collections import deque
+
+TRACK = 'track'
+PLAYLIST = 'playlist'
+
+
+class ChangeLog:
+    """Catalog version, increased on every change, and the ids changed by
+    the last `max_entries` versions. Versions are only comparable within one
+    epoch: each log (each process) has its own, so a version issued by
+    another replica or worker is never mistaken for a known one."""
+
+    def __init__(self, max_entries=1000, version=0, epoch=None):
+        self.epoch = epoch or uuid.uuid4().hex
+        self.version = version
+        self.first = self.version  # el log tiene los cambios posteriores a esta versión
+        self.entries = deque()     # (versión, tipo, id)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+    def record(self, kind, item_id):
+        with self.lock:
+            self.version += 1
+            self.entries.append((self.version, kind, item_id))
+            if len(self.entries) > self.max_entries:
+                self.first = self.entries.popleft()[0]
+            return self.version
+
+    def changes_since(self, epoch, version):
+        """(current version, {(kind, id)} changed after `version`), with None
+        instead of the set when `epoch` is not ours or the log no longer goes
+        back that far"""
+        with self.lock:
+            if epoch != self.epoch:
+                return self.version, None
+            if version == self.version:
+                return self.version, set()
+            if not self.first <= version < self.version:
+                return self.version, None
+
+            changed = set()
+            for entry_version, kind, item_id in reversed(self.entries):
+                if entry_version <= version:
+                    break
+                changed.add((kind, item_id))
+            return self.version, changed
+
+
+#Copia local del catálogo de un servidor que se pone al día pidiendo solo los cambios
+class CatalogReplica:
+    def __init__(self, refresh_secs=0):
+        self.epoch = ''
+        self.version = 0
+        self.tracks = {}
+        self.playlists = {}
+        self.refresh_secs = refresh_secs
+        self.synced_at = None
+        self.lock = threading.Lock()
+
+    def apply(self, delta):
+        with self.lock:
+            if delta.epoch == self.epoch and delta.version < self.version:
+                return  # otro hilo ya aplicó una respuesta más reciente
+            if not delta.full and delta.epoch != self.epoch:
+                return  # un delta de otra época no sirve sobre esta copia
+            if delta.full:
+                self.tracks = {t.id: t for t in delta.tracks}
+                self.playlists = {p.id: p for p in delta.playlists}
+            else:
+                self.tracks.update((t.id, t) for t in delta.tracks)
+                self.playlists.update((p.id, p) for p in delta.playlists)
+                for track_id in delta.removed_tracks:
+                    self.tracks.pop(track_id, None)
+                for playlist_id in delta.removed_playlists:
+                    self.playlists.pop(playlist_id, None)
+            self.epoch = delta.epoch
+            self.version = delta.version
+
+    def sync(self, server, force=False):
+        "Fetch what changed since the last sync, at most once every refresh_secs"
+        now = time.monotonic()
+        if not force and self.synced_at is not None \
+                and now - self.synced_at < self.refresh_secs:
+            return
+        self.apply(server.get_catalog_changes(self.epoch, self.version))
+        self.synced_at = now
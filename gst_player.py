@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
 import logging
+import os
 import queue
 import threading
+import time
 from enum import Enum, auto
 from time import monotonic
 
@@ -11,9 +13,18 @@ import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst  # type: ignore # noqa: E402
 
+import tracing  # noqa: E402
+from metrics import REGISTRY  # noqa: E402
+from profiling import profiled  # noqa: E402
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("GstPlayer")
 
+UNDERRUNS = REGISTRY.counter('spotifice_player_underruns_total',
+                             "Times the player ran out of audio while playing")
+BYTES_PUSHED = REGISTRY.counter('spotifice_player_bytes_total',
+                                "Bytes pushed to the pipeline")
+
 Gst.init(None)
 
 state_map = {
@@ -24,6 +35,34 @@ state_map = {
     None: 'STOP'
 }
 
+# Modos de salida con nombre; cualquier otra cadena se usa tal cual como elemento sink
+SINKS = {
+    'auto': 'autoaudiosink',
+    'realtime': 'fakesink sync=true',  # sin audio, pero al ritmo real de reproducción
+    'fast': 'fakesink sync=false',     # sin audio y tan rápido como se pueda decodificar
+}
+
+
+class RunStats:
+    "Counters for a single configure() .. stop() run"
+
+    def __init__(self):
+        self.bytes_pushed = 0
+        self.bytes_decoded = 0
+        self.buffers = 0
+        self.underruns = 0
+        self.time_to_first_buffer = None
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __str__(self):
+        ttfb = self.time_to_first_buffer
+        ttfb = f"{ttfb * 1000:.1f}ms" if ttfb is not None else "-"
+        return (f"pushed={self.bytes_pushed} decoded={self.bytes_decoded} "
+                f"underruns={self.underruns} ttfb={ttfb}")
+
+
 class Cmd(Enum):
     CONFIGURED = auto()
     STOP = auto()
@@ -33,21 +72,34 @@ class Cmd(Enum):
 
 class GstPlayer(threading.Thread):
     CHUNK_SIZE = 4096
-    PIPELINE = 'appsrc name=src ! decodebin ! audioconvert ! audioresample ! autoaudiosink'
+    PIPELINE = ('appsrc name=src ! decodebin ! audioconvert ! audioresample ! '
+                '{sink} name=sink')
+    SINK = os.environ.get('GST_PLAYER_SINK', 'auto')
+    MAX_BYTES = 8192
+    MIN_PERCENT = 50
     TIMEOUT_SECS = 2
 
-    def __init__(self, **kwargs):
+    def __init__(self, sink=None, max_bytes=None, **kwargs):
         super().__init__(**kwargs)
+        sink = sink or self.SINK
+        self.sink = SINKS.get(sink, sink)
+        self.max_bytes = max_bytes or self.MAX_BYTES
         self.command_queue = queue.Queue()
         self.play_confirmed_e = threading.Event()
         self.stop_confirmed_e = threading.Event()
         self.stop_confirmed_e.set()
+        self.first_buffer_e = threading.Event()
+        self.configured_at = None
+        self.time_to_first_buffer = None
+        self.stats = RunStats()
 
         self.pipeline: Gst.Pipeline = None
         self.get_chunk_hook = None
         self.track_exhausted_hook = lambda: None
 
         self.show_stats = False
+        self.trace = None
+        self.trace_start = 0.0
 
     def run(self):
         while True:
@@ -66,18 +118,27 @@ class GstPlayer(threading.Thread):
                     logger.warning(f"Unexpected command: {command}")
 
     def setup_pipeline(self):
-        retval = Gst.parse_launch(self.PIPELINE)
+        retval = Gst.parse_launch(self.PIPELINE.format(sink=self.sink))
         self.appsrc = retval.get_by_name('src')
         self.appsrc.set_properties(
-            format=Gst.Format.TIME, block=True, is_live=True, max_bytes=8192)
+            format=Gst.Format.TIME, block=True, is_live=True, max_bytes=self.max_bytes,
+            min_percent=self.MIN_PERCENT)
         self.appsrc.connect('need-data', self.on_need_data)
+
+        sink_pad = retval.get_by_name('sink').get_static_pad('sink')
+        sink_pad.add_probe(Gst.PadProbeType.BUFFER, self.on_decoded_buffer)
         return retval
 
+    def on_decoded_buffer(self, pad, info):
+        self.stats.bytes_decoded += info.get_buffer().get_size()
+        return Gst.PadProbeReturn.OK
+
     def activate_stream(self):
         self.last_time = None
         self.stop_confirmed_e.clear()
         self.pipeline = self.setup_pipeline()
         self.pipeline.set_state(Gst.State.PLAYING)
+        tracing.record('gst.pipeline_built', self.trace_start, time.time(), self.trace)
         self.play_confirmed_e.set()
         logger.info("Playing...")
 
@@ -90,12 +151,18 @@ class GstPlayer(threading.Thread):
         self.pipeline.set_state(Gst.State.NULL)
         self.pipeline = None
         self.stop_confirmed_e.set()
-        logger.info("Stopped.")
+        logger.info(f"Stopped. {self.stats}")
         return True
 
+    @profiled('gst.on_need_data')
     def on_need_data(self, src, length):
         assert self.get_chunk_hook
 
+        # need-data salta al bajar de MIN_PERCENT: con la cola ya vacía es un underrun
+        if self.first_buffer_e.is_set() and src.get_property('current-level-bytes') == 0:
+            self.stats.underruns += 1
+            UNDERRUNS.inc()
+
         chunk_size = length if length > 0 else self.CHUNK_SIZE
         if not (chunk := self.get_chunk_hook(chunk_size)):
             src.emit('end-of-stream')
@@ -106,6 +173,15 @@ class GstPlayer(threading.Thread):
         buf = Gst.Buffer.new_allocate(None, len(chunk), None)
         buf.fill(offset=0, src=chunk)
         src.emit('push-buffer', buf)
+        self.stats.bytes_pushed += len(chunk)
+        BYTES_PUSHED.inc(len(chunk))
+        self.stats.buffers += 1
+
+        if not self.first_buffer_e.is_set():
+            self.time_to_first_buffer = monotonic() - self.configured_at
+            self.stats.time_to_first_buffer = self.time_to_first_buffer
+            tracing.record('gst.first_buffer', self.trace_start, time.time(), self.trace)
+            self.first_buffer_e.set()
 
         if self.show_stats:
             self.print_stats(len(chunk))
@@ -118,9 +194,15 @@ class GstPlayer(threading.Thread):
                 print(f"\rbitrate: {bitrate:.2f} kB/s    ", end='', flush=True)
         self.last_time = monotonic()
 
-    def configure(self, get_chunk_hook, track_exhausted_hook=None):
+    def configure(self, get_chunk_hook, track_exhausted_hook=None, trace=None):
         self.get_chunk_hook = get_chunk_hook
         self.track_exhausted_hook = track_exhausted_hook or (lambda: None)
+        self.trace = trace  #Traza a la que se añaden los spans del pipeline
+        self.trace_start = time.time()
+        self.configured_at = monotonic()
+        self.time_to_first_buffer = None
+        self.stats = RunStats()
+        self.first_buffer_e.clear()
         self.stop_confirmed_e.clear()
         self.command_queue.put(Cmd.CONFIGURED)
 
@@ -158,6 +240,12 @@ class GstPlayer(threading.Thread):
         logger.debug(f"play confirmed: {retval}")
         return retval
 
+    def wait_first_buffer(self):
+        "Seconds from configure() to the first pushed buffer, None on timeout"
+        if not self.first_buffer_e.wait(self.TIMEOUT_SECS):
+            return None
+        return self.time_to_first_buffer
+
     def shutdown(self):
         self.command_queue.put(Cmd.SHUTDOWN)
         self.join(self.TIMEOUT_SECS)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+import heapq
+import logging
+import random
+import socket
+import sys
+import threading
+from time import monotonic, sleep
+
+from pacing import TokenBucket
+
+logger = logging.getLogger("Impairment")
+
+
+class Impairments:
+    "WAN-like conditions applied to every byte going through an ImpairedProxy"
+
+    def __init__(self, latency_ms=0, jitter_ms=0, bandwidth_kbps=0, drop_every_secs=0,
+                 seed=None):
+        self.latency_ms = latency_ms            # retardo en cada sentido
+        self.jitter_ms = jitter_ms              # variación aleatoria del retardo
+        self.bandwidth_kbps = bandwidth_kbps    # tope de cada sentido (0 = sin tope)
+        self.drop_every_secs = drop_every_secs  # media entre cortes (0 = nunca)
+        self.rng = random.Random(seed)
+
+    def delay(self):
+        jitter = 0
+        if self.jitter_ms:
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(self.latency_ms + jitter, 0) / 1000
+
+    @classmethod
+    def parse(cls, text):
+        "Build from 'latency_ms=50,jitter_ms=10,bandwidth_kbps=256'"
+        params = {}
+        for item in filter(None, text.split(',')):
+            key, value = item.split('=')
+            params[key.strip()] = float(value)
+        return cls(**params)
+
+
+#Un sentido de una conexión: lee, retrasa y limita el ancho de banda sin desordenar bytes
+class Pipe:
+    READ_SIZE = 16 * 1024
+
+    def __init__(self, proxy, src, dst):
+        self.proxy = proxy
+        self.src = src
+        self.dst = dst
+        self.queue = []  # heap de (instante de entrega, seq, datos)
+        self.seq = 0
+        self.last_due = 0
+        self.cond = threading.Condition()
+        self.closed = False
+        rate = proxy.impairments.bandwidth_kbps * 125
+        self.bucket = TokenBucket(rate, rate * 0.1 or 0)
+
+    def start(self):
+        threading.Thread(target=self.read_loop, daemon=True).start()
+        threading.Thread(target=self.write_loop, daemon=True).start()
+
+    def read_loop(self):
+        try:
+            while data := self.src.recv(self.READ_SIZE):
+                # TCP no reordena: con jitter, un bloque sale como pronto tras el anterior
+                due = max(monotonic() + self.proxy.impairments.delay(), self.last_due)
+                self.last_due = due
+                with self.cond:
+                    self.seq += 1
+                    heapq.heappush(self.queue, (due, self.seq, data))
+                    self.cond.notify()
+        except OSError:
+            pass
+        self.close()
+
+    def write_loop(self):
+        try:
+            while True:
+                with self.cond:
+                    while not self.closed and not self.queue:
+                        self.cond.wait()
+                    if not self.queue:
+                        break
+                    due, _, data = heapq.heappop(self.queue)
+
+                wait = max(due - monotonic(), 0) + self.bucket.take(len(data))
+                if wait > 0:
+                    sleep(wait)
+                self.dst.sendall(data)
+        except OSError:
+            pass
+        self.proxy.close_connection(self.src, self.dst)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+
+class ImpairedProxy:
+    """TCP proxy on localhost that forwards to target_port through
+    Impairments. Put it between render and server by publishing the server
+    adapter on the proxy port."""
+
+    def __init__(self, target_port, impairments=None, port=0, target_host='127.0.0.1'):
+        self.target = (target_host, target_port)
+        self.impairments = impairments or Impairments()
+        self.listener = socket.create_server(('127.0.0.1', port))
+        self.port = self.listener.getsockname()[1]
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.drops = 0
+        self.running = True
+
+    def start(self):
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        if self.impairments.drop_every_secs:
+            threading.Thread(target=self.drop_loop, daemon=True).start()
+        host, port = self.target
+        logger.info(f"Impaired proxy 127.0.0.1:{self.port} -> {host}:{port}")
+        return self
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                client, _ = self.listener.accept()
+            except OSError:
+                continue
+            try:
+                server = socket.create_connection(self.target)
+            except OSError as e:
+                logger.warning(f"Could not connect to {self.target}: {e}")
+                client.close()
+                continue
+
+            for sock in (client, server):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                self.connections.add((client, server))
+
+            Pipe(self, client, server).start()
+            Pipe(self, server, client).start()
+
+    def drop_loop(self):
+        while self.running:
+            sleep(self.impairments.rng.expovariate(1 / self.impairments.drop_every_secs))
+            self.drop()
+
+    def drop(self):
+        "Cut every open connection, as a network failure would"
+        with self.lock:
+            connections, self.connections = self.connections, set()
+        for pair in connections:
+            self.close_connection(*pair)
+        self.drops += len(connections)
+        if connections:
+            logger.info(f"Dropped {len(connections)} connections")
+
+    def close_connection(self, a, b):
+        with self.lock:
+            self.connections.discard((a, b))
+            self.connections.discard((b, a))
+        for sock in (a, b):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def stop(self):
+        self.running = False
+        try:
+            self.listener.shutdown(socket.SHUT_RDWR)  # despierta al accept() bloqueado
+        except OSError:
+            pass
+        self.listener.close()
+        self.drop()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("Usage: impairment.py <listen-port> <target-port> "
+                 "[latency_ms=50,jitter_ms=10,bandwidth_kbps=256,drop_every_secs=30]")
+
+    logging.basicConfig(level=logging.INFO)
+    impairments = Impairments.parse(sys.argv[3] if len(sys.argv) > 3 else '')
+    proxy = ImpairedProxy(int(sys.argv[2]), impairments, port=int(sys.argv[1])).start()
+    try:
+        while True:
+            sleep(3600)
+    except KeyboardInterrupt:
+        proxy.stop()
@@ -4,19 +4,25 @@ import logging
 import os
 import signal
 import sys
+from collections import OrderedDict
+from time import monotonic
 
 import gi
 gi.require_version('Gtk', '4.0')
-from gi.repository import Gtk
+from gi.repository import Gio, GLib, GObject, Gtk
 
 import Ice
+import tracing
 
-Ice.loadSlice('-I{} spotifice_v2.ice'.format(Ice.getSliceDir()))
-import Spotifice
+import slice_cache
+Spotifice = slice_cache.load('spotifice_v2.ice')
 
 from media_control_v1 import (
+    STARTED,
     SpotificeControlWindow as BaseWindow,
-    get_proxy,
+    chain,
+    completed,
+    on_main_loop,
 )
 
 try:
@@ -75,41 +81,145 @@ def acquire_credentials(communicator) -> tuple[str, str]:
     return username, password
 
 
+#Modelo de lista que solo pide al servidor las páginas que el desplegable llega a mostrar
+class PagedPlaylistModel(GObject.Object, Gio.ListModel):
+    """Gio.ListModel over get_playlists_page. It knows the size of the
+    catalog after the first page, asks for every other page the first time
+    one of its rows is shown, and keeps the MAX_PAGES used most recently.
+    The pages kept are dropped when a page comes from a newer catalog
+    version; the first page is asked again every REFRESH_SECS to notice."""
+
+    PAGE_SIZE = 100
+    MAX_PAGES = 20
+    REFRESH_SECS = 30
+    PLACEHOLDER = "..."
+
+    def __init__(self, guard):
+        super().__init__()
+        # evita que la ventana tome los cambios del modelo por el usuario
+        self.guard = guard
+        self.server = None
+        self.total = 0
+        self.pages = OrderedDict()  # nº de página -> PlaylistSummarySeq
+        self.version = None  # (epoch, versión) del catálogo de las páginas guardadas
+        self.loading = set()
+        self.on_first_page = None
+
+    def do_get_item_type(self):
+        return Gtk.StringObject.__gtype__
+
+    def do_get_n_items(self):
+        return self.total
+
+    def do_get_item(self, position):
+        if position >= self.total:
+            return None
+        summary = self.get_summary(position)
+        return Gtk.StringObject.new(summary.name if summary else self.PLACEHOLDER)
+
+    def attach(self, server, on_first_page):
+        self.server = server
+        self.on_first_page = on_first_page
+        self.fetch(0)
+        GLib.timeout_add_seconds(self.REFRESH_SECS, self.refresh)
+
+    def refresh(self):
+        self.fetch(0)
+        return GLib.SOURCE_CONTINUE
+
+    def get_summary(self, position):
+        "PlaylistSummary at position, or None while its page is loading"
+        page, row = divmod(position, self.PAGE_SIZE)
+        if page not in self.pages:
+            self.fetch(page)
+            return None
+
+        self.pages.move_to_end(page)
+        rows = self.pages[page]
+        return rows[row] if row < len(rows) else None
+
+    def fetch(self, page):
+        if page in self.loading or self.server is None:
+            return
+        self.loading.add(page)
+        request = self.server.get_playlists_pageAsync(page * self.PAGE_SIZE,
+                                                      self.PAGE_SIZE)
+        on_main_loop(request, lambda result: self.page_loaded(page, result),
+                     lambda e: self.page_failed(page, e))
+
+    def page_loaded(self, page, result):
+        self.loading.discard(page)
+        version = (result.epoch, result.version)
+        epoch, number = version
+        if self.version and epoch == self.version[0] and number < self.version[1]:
+            # cortada de un catálogo anterior al de las páginas guardadas
+            self.fetch(page)
+            return
+
+        changed = self.version is not None and version != self.version
+        if changed:
+            self.pages.clear()
+        self.version = version
+        self.pages[page] = result.playlists
+        while len(self.pages) > self.MAX_PAGES:
+            self.pages.popitem(last=False)
+
+        with self.guard():
+            if result.total != self.total:
+                previous, self.total = self.total, result.total
+                self.items_changed(0, previous, self.total)
+            elif changed:
+                # cualquier fila puede haber cambiado: se vuelven a pedir las visibles
+                self.items_changed(0, self.total, self.total)
+            elif result.playlists:
+                # las filas con el texto provisional se vuelven a pedir
+                n = len(result.playlists)
+                self.items_changed(page * self.PAGE_SIZE, n, n)
+
+        if self.on_first_page:
+            callback, self.on_first_page = self.on_first_page, None
+            callback(self.total)
+
+    def page_failed(self, page, error):
+        self.loading.discard(page)
+        logger.error(f"Error loading playlists page {page}: {error}")
+
+
 class SpotificeControlWindowV2(BaseWindow):
     "Subclass of v1 window that only changes authentication/binding for v2."
 
     def __init__(self, app, communicator):
         self._v2_communicator = communicator
-        super().__init__(app, communicator)
-        self.set_title("Spotifice Control (v2)")
-
-    def init_ice_proxies(self):
         try:
-            server = get_proxy(self.communicator, 'MediaServer.Proxy', Spotifice.MediaServerPrx)
-            render = get_proxy(self.communicator, 'MediaRender.Proxy', Spotifice.MediaRenderPrx)
-            user, pwd = acquire_credentials(self.communicator)
-            ssm = server.authenticate(render, user, pwd)
-            render.bind_media_server(server, ssm)
-        except Exception as e:
+            self.credentials = acquire_credentials(communicator)
+        except RuntimeError as e:
             logger.error(f"v2 authentication error: {e}")
             sys.exit(1)
-        return server, render
+        super().__init__(app, communicator)
+        self.set_title("Spotifice Control (v2)")
 
-    def load_initial_state(self):
-        try:
-            status = self.render.get_status()
-        except Exception:
-            self.update_status("Ready")
-            return
-        self.update_current_track()
-        mapping = {
-            Spotifice.PlaybackState.PLAYING: "Playing",
-            Spotifice.PlaybackState.PAUSED: "Paused",
-            Spotifice.PlaybackState.STOPPED: "Stopped",
-        }
-        self.update_status(mapping.get(status.state, "Ready"))
-        self.update_button_states(status.state)
-        self.update_repeat_button(status.repeat)
+    def create_playlist_model(self):
+        return PagedPlaylistModel(self.updating_ui)
+
+    def playlist_at(self, index):
+        summary = self.playlist_model.get_summary(index)
+        return (summary.id, summary.name) if summary else None
+
+    def load_playlists(self, server):
+        self.playlist_model.attach(server, self.on_playlists_counted)
+
+    def on_playlists_counted(self, total):
+        with self.updating_ui():
+            if total:
+                self.playlist_dropdown.set_selected(0)
+        self.set_connected(self.render is not None)
+        logger.info(f"{total} playlists after {(monotonic() - STARTED) * 1000:.0f} ms")
+
+    def bind_proxies(self, server, render):
+        user, pwd = self.credentials
+        return chain(server.authenticateAsync(render, user, pwd),
+                     lambda ssm: chain(render.bind_media_serverAsync(server, ssm),
+                                       lambda _: completed((server, render))))
 
 
 class SpotificeAppV2(Gtk.Application):
@@ -129,6 +239,7 @@ def main(argv: list[str]):
     if len(argv) < 2:
         sys.exit('Usage: media_control_v2.py <config-file>')
     with Ice.initialize(argv[1]) as communicator:
+        tracing.install(communicator, 'MediaControl')
         app = SpotificeAppV2(communicator)
         signal.signal(signal.SIGINT, lambda sig, frame: app.quit())
         app.run(None)
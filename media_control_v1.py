@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 
 import logging
+import os
 import signal
 import sys
-from time import sleep
+import threading
+from contextlib import contextmanager
+from time import monotonic
+
+STARTED = monotonic()  # antes de importar GTK e Ice, que también cuentan en el arranque
 
 import gi
 
@@ -11,9 +16,10 @@ gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, GLib
 
 import Ice
+import tracing
 
-Ice.loadSlice('-I{} spotifice_v1.ice'.format(Ice.getSliceDir()))
-import Spotifice  # type: ignore # noqa: E402
+import slice_cache
+Spotifice = slice_cache.load('spotifice_v1.ice')
 
 try:
     from mpris2_support import MPRIS2Service
@@ -25,31 +31,161 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def get_proxy(ic, property, cls):
+def resolve_proxy(ic, property, cls, attempts=5, retry_delay=0.5):
+    "checkedCast through AMI, retrying while refused. Returns an Ice.Future"
     proxy = ic.propertyToProxy(property)
+    result = Ice.Future()
+
+    def attempt(left):
+        def done(future):
+            try:
+                object = future.result()
+            except Ice.ConnectionRefusedException as e:
+                if left > 1:
+                    threading.Timer(retry_delay, attempt, (left - 1,)).start()
+                else:
+                    result.set_exception(e)
+                return
+            except Exception as e:
+                result.set_exception(e)
+                return
+
+            if object is None:
+                result.set_exception(RuntimeError(f'Invalid proxy for {property}'))
+            else:
+                result.set_result(object)
+
+        cls.checkedCastAsync(proxy).add_done_callback(done)
+
+    attempt(attempts)
+    return result
+
+
+def get_proxy(ic, property, cls):
+    return resolve_proxy(ic, property, cls).result()
+
 
-    for _ in range(5):
+def gather(*futures):
+    "Ice.Future with the results of every future, or the first exception"
+    result = Ice.Future()
+    values = [None] * len(futures)
+    pending = [len(futures)]
+    lock = threading.Lock()
+
+    def done(i, future):
         try:
-            proxy.ice_ping()
-            break
-        except Ice.ConnectionRefusedException:
-            sleep(0.5)
+            value = future.result()
+        except Exception as e:
+            if not result.done():
+                result.set_exception(e)
+            return
+
+        with lock:
+            values[i] = value
+            pending[0] -= 1
+            last = pending[0] == 0
+        if last and not result.done():
+            result.set_result(values)
+
+    for i, future in enumerate(futures):
+        future.add_done_callback(lambda f, i=i: done(i, f))
+    return result
 
-    object = cls.checkedCast(proxy)
-    if object is None:
-        raise RuntimeError(f'Invalid proxy for {property}')
 
-    return object
+def completed(value):
+    future = Ice.Future()
+    future.set_result(value)
+    return future
+
+
+def chain(future, func):
+    "Ice.Future of func(result), where func returns another future"
+    result = Ice.Future()
+
+    def forward(inner):
+        try:
+            result.set_result(inner.result())
+        except Exception as e:
+            result.set_exception(e)
+
+    def done(f):
+        try:
+            func(f.result()).add_done_callback(forward)
+        except Exception as e:
+            result.set_exception(e)
+
+    future.add_done_callback(done)
+    return result
+
+
+def on_main_loop(future, callback, errback):
+    "Run callback(result) or errback(exception) in the GTK main loop once future is done"
+    def done(f):
+        try:
+            value = f.result()
+        except Exception as e:
+            #e deja de existir al salir del except: la lambda se queda con su valor
+            GLib.idle_add(lambda error=e: errback(error) and False)
+        else:
+            GLib.idle_add(lambda: callback(value) and False)
+
+    future.add_done_callback(done)
+
+
+class RequestCoalescer:
+    """At most one RPC in flight per key, so repeated clicks do not pile up
+    requests. While one runs, a different request for the same key waits
+    (only the latest one) and a request equal to the running one is dropped.
+    Reads (read=True) are never dropped: one more run is queued, so the
+    result reflects what changed meanwhile. Used from the GTK main loop only."""
+
+    def __init__(self):
+        self.running = {}  # clave -> petición en curso
+        self.pending = {}  # clave -> (petición, start, callback, errback, read)
+
+    def submit(self, key, request, start, callback, errback, read=False):
+        if key in self.running:
+            if self.running[key] == request and not read:
+                self.pending.pop(key, None)
+            else:
+                self.pending[key] = (request, start, callback, errback, read)
+            return
+
+        self.running[key] = request
+
+        def finish(func):
+            def wrapper(value):
+                del self.running[key]
+                func(value)
+                if key in self.pending:
+                    self.submit(key, *self.pending.pop(key))
+            return wrapper
+
+        try:
+            future = start()
+        except Exception as e:
+            finish(errback)(e)
+            return
+        on_main_loop(future, finish(callback), finish(errback))
 
 
 def handle_action_error(func):
     "Decorator to handle exceptions in action methods"
     action_name = func.__name__.replace('on_', '').replace('_', ' ')
     def wrapper(self, button):
+        #Cada acción del usuario es la raíz de una traza por el render y el servidor.
+        #La recoge request() y la cierra al llegar la respuesta del RPC
+        self.action = tracing.Span(f"control.{func.__name__}")
         try:
             return func(self, button)
         except Exception as e:
+            if self.action:
+                self.action.end(error=str(e))
             self.update_status(f"Error in {action_name}(): {e}")
+        finally:
+            if self.action:  # la acción no llegó a llamar al render
+                self.action.end()
+            self.action = None
     return wrapper
 
 
@@ -77,14 +213,14 @@ class UIBuilder:
         self.main_box.set_margin_end(15)
         return self
 
-    def build_playlist_selector(self, on_changed_callback):
+    def build_playlist_selector(self, on_changed_callback, model=None):
         self.playlist_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
 
         playlist_label = Gtk.Label(label="Playlist:")
         playlist_label.set_size_request(70, -1)
         playlist_label.set_xalign(0)
 
-        self.playlist_model = Gtk.StringList()
+        self.playlist_model = model or Gtk.StringList()
         self.playlist_dropdown = Gtk.DropDown(model=self.playlist_model)
         self.playlist_dropdown.set_hexpand(True)
         self.playlist_dropdown.connect("notify::selected", on_changed_callback)
@@ -183,6 +319,7 @@ class UIBuilder:
     def get_result(self):
         return {
             'main_box': self.main_box,
+            'controls_box': self.controls_box,
             'playlist_dropdown': self.playlist_dropdown,
             'playlist_model': self.playlist_model,
             'play_button': self.play_button,
@@ -200,23 +337,48 @@ class SpotificeControlWindow(Gtk.ApplicationWindow):
         self.set_resizable(False)
 
         self.communicator = communicator
-        self.server, self.render = self.init_ice_proxies()
+        self.server = self.render = None
+        self.time_to_interactive = None
         self.create_ui()
-        self.load_initial_state()
-        self.load_playlists()
+        self.set_connected(False)
+        self.update_status("Connecting...")
+        self.init_ice_proxies()
 
+    #Con la ventana ya a la vista, resuelvo ambos proxies a la vez y relleno según llegan
     def init_ice_proxies(self):
-        try:
-            server = get_proxy(
-                self.communicator, 'MediaServer.Proxy', Spotifice.MediaServerPrx)
-            render = get_proxy(
-                self.communicator, 'MediaRender.Proxy', Spotifice.MediaRenderPrx)
-            render.bind_media_server(server)
-        except Exception as e:
-            logger.error(f"Error initializing Ice proxies: {e}")
-            sys.exit(1)
+        server = resolve_proxy(self.communicator, 'MediaServer.Proxy',
+                               Spotifice.MediaServerPrx)
+        render = resolve_proxy(self.communicator, 'MediaRender.Proxy',
+                               Spotifice.MediaRenderPrx)
+
+        on_main_loop(server, self.load_playlists, self.on_connection_error)
+        bound = chain(gather(server, render), lambda proxies: self.bind_proxies(*proxies))
+        on_main_loop(bound, self.on_connected, self.on_connection_error)
+
+    def bind_proxies(self, server, render):
+        "Future that completes with (server, render) once the render is bound"
+        return chain(render.bind_media_serverAsync(server),
+                     lambda _: completed((server, render)))
+
+    def on_connected(self, proxies):
+        self.server, self.render = proxies
+        self.load_initial_state()
+
+    def on_connection_error(self, error):
+        if self.render is None:
+            logger.error(f"Error initializing Ice proxies: {error}")
+            self.update_status(f"Could not connect: {error}")
 
-        return server, render
+    def set_connected(self, connected):
+        self.controls_box.set_sensitive(connected)
+        self.playlist_dropdown.set_sensitive(
+            connected and self.playlist_model.get_n_items() > 0)
+
+    def on_interactive(self):
+        self.time_to_interactive = monotonic() - STARTED
+        logger.info(f"Interactive after {self.time_to_interactive * 1000:.0f} ms")
+        if os.environ.get('SPOTIFICE_CONTROL_EXIT_WHEN_READY'):
+            self.get_application().quit()
 
     def create_ui(self):
         callbacks = {
@@ -230,13 +392,15 @@ class SpotificeControlWindow(Gtk.ApplicationWindow):
 
         builder = UIBuilder()
         builder.build_main_container() \
-               .build_playlist_selector(self.on_playlist_changed) \
+               .build_playlist_selector(self.on_playlist_changed,
+                                        self.create_playlist_model()) \
                .build_playback_controls(callbacks) \
                .build_track_display() \
                .build_status_bar() \
                .assemble()
 
         ui = builder.get_result()
+        self.controls_box = ui['controls_box']
         self.playlist_dropdown = ui['playlist_dropdown']
         self.playlist_model = ui['playlist_model']
         self.play_button = ui['play_button']
@@ -251,20 +415,27 @@ class SpotificeControlWindow(Gtk.ApplicationWindow):
         self.track_animation_timeout = None
 
         self.playlist_ids = []
+        self.requests = RequestCoalescer()
+        self.action = None  # span de la acción del usuario en curso
 
         self.set_child(ui['main_box'])
         # flag to avoid triggering handlers while updating UI programmatically
         self._updating_ui = False
 
     def load_initial_state(self):
-        try:
-            status = self.render.get_status()
-        except Exception as e:
-            logger.error(f"Error loading initial state: {e}")
-            self.update_status("Ready")
-            return
+        state = gather(self.render.get_statusAsync(),
+                       self.render.get_current_trackAsync())
+        on_main_loop(state, self.show_initial_state, self.on_initial_state_error)
+
+    def on_initial_state_error(self, error):
+        logger.error(f"Error loading initial state: {error}")
+        self.update_status("Ready")
+        self.set_connected(True)
+        self.on_interactive()
 
-        self.update_current_track()
+    def show_initial_state(self, results):
+        status, track = results
+        self.show_track(track)
 
         match status.state:
             case Spotifice.PlaybackState.PLAYING:
@@ -279,6 +450,8 @@ class SpotificeControlWindow(Gtk.ApplicationWindow):
         self.update_status(status_message)
         self.update_button_states(status.state)
         self.update_repeat_button(status.repeat)
+        self.set_connected(True)
+        self.on_interactive()
 
     def update_status(self, message):
         self.status_label.set_text(message)
@@ -304,19 +477,43 @@ class SpotificeControlWindow(Gtk.ApplicationWindow):
         finally:
             self._updating_ui = False
 
+    def request(self, key, request, start, callback, action=None, errback=None,
+                read=False):
+        """Call the render or server through AMI, handling the result in the main
+        loop. start(context) gets the Ice context carrying the trace."""
+        #El span se cierra con la respuesta, no al lanzar la llamada. Su contexto va
+        #explícito: el coalescer puede empezarla más tarde, o desde un hilo de Ice
+        span = self.action or tracing.Span(f"control.{key}")
+        self.action = None
+
+        def done(value):
+            span.end()
+            with span.activated():  # lo que se pida al atender la respuesta, es hija
+                callback(value)
+
+        def failed(e):
+            span.end(error=str(e))
+            if errback:
+                errback(e)
+            else:
+                self.update_status(f"Error in {action or key}(): {e}")
+
+        self.requests.submit(key, request, lambda: start(span.context), done, failed,
+                             read)
+
     def update_current_track(self):
+        def errback(e):
+            logger.error(f"Error getting current track: {e}")
+            self.show_track(None)
+        self.request('track', 'get_current_track',
+                     lambda ctx: self.render.get_current_trackAsync(context=ctx),
+                     self.show_track, errback=errback, read=True)
+
+    def show_track(self, track):
         if self.track_animation_timeout is not None:
             GLib.source_remove(self.track_animation_timeout)
             self.track_animation_timeout = None
 
-        try:
-            track = self.render.get_current_track()
-        except Exception as e:
-            self.track_full_text = "No track loaded"
-            self.track_label.set_text(self.track_full_text)
-            logger.error(f"Error getting current track: {e}")
-            return
-
         if not track or not track.title:
             self.track_full_text = "No track loaded"
             self.track_label.set_text(self.track_full_text)
@@ -352,78 +549,121 @@ class SpotificeControlWindow(Gtk.ApplicationWindow):
 
         return True
 
-    def load_playlists(self):
+    def create_playlist_model(self):
+        return Gtk.StringList()
+
+    def playlist_at(self, index):
+        "(id, name) of the playlist shown at index, or None"
+        if index >= len(self.playlist_ids):
+            return None
+        return self.playlist_ids[index], self.playlist_model.get_string(index)
+
+    def load_playlists(self, server):
+        on_main_loop(server.get_all_playlistsAsync(), self.show_playlists,
+                     self.on_playlists_error)
+
+    def on_playlists_error(self, error):
+        logger.error(f"Error loading playlists: {error}")
+        self.update_status(f"Error loading playlists: {error}")
+
+    @contextmanager
+    def updating_ui(self):
+        "Widget changes made inside are not taken as user actions"
+        self._updating_ui = True
         try:
-            playlists = self.server.get_all_playlists()
-        except Exception as e:
-            logger.error(f"Error loading playlists: {e}")
-            self.update_status(f"Error loading playlists: {e}")
-            return
+            yield
+        finally:
+            self._updating_ui = False
 
-        for playlist in playlists:
-            self.playlist_model.append(playlist.name)
-            self.playlist_ids.append(playlist.id)
+    def show_playlists(self, playlists):
+        # al rellenar el modelo cambia la selección: no es el usuario eligiendo
+        with self.updating_ui():
+            for playlist in playlists:
+                self.playlist_model.append(playlist.name)
+                self.playlist_ids.append(playlist.id)
+            if playlists:
+                self.playlist_dropdown.set_selected(0)
 
-        if playlists:
-            self.playlist_dropdown.set_selected(0)
+        self.set_connected(self.render is not None)
+        elapsed_ms = (monotonic() - STARTED) * 1000
+        logger.info(f"{len(playlists)} playlists after {elapsed_ms:.0f} ms")
 
     def on_playlist_changed(self, dropdown, _pspec):
-        selected_index = dropdown.get_selected()
-        if selected_index == Gtk.INVALID_LIST_POSITION or selected_index >= len(self.playlist_ids):
+        if self._updating_ui:
             return
 
-        playlist_id = self.playlist_ids[selected_index]
-
-        try:
-            self.render.stop()
-            self.render.load_playlist(playlist_id)
-        except Exception as e:
-            self.update_status(f"Error loading playlist: {e}")
+        selected_index = dropdown.get_selected()
+        if selected_index == Gtk.INVALID_LIST_POSITION:
             return
 
-        playlist_name = self.playlist_model.get_string(selected_index)
-        self.update_status(f"Loaded playlist: {playlist_name}")
-        self.update_current_track()
-        self.update_button_states(Spotifice.PlaybackState.STOPPED)
+        playlist = self.playlist_at(selected_index)
+        if playlist is None:
+            return
+        playlist_id, playlist_name = playlist
+
+        def loaded(_):
+            self.update_status(f"Loaded playlist: {playlist_name}")
+            self.update_current_track()
+            self.update_button_states(Spotifice.PlaybackState.STOPPED)
+
+        #Si el usuario sigue cambiando de playlist mientras carga, solo se carga la última
+        self.request('playlist', playlist_id,
+                     lambda ctx: chain(
+                         self.render.stopAsync(context=ctx),
+                         lambda _: self.render.load_playlistAsync(playlist_id,
+                                                                  context=ctx)),
+                     loaded, 'load playlist')
+
+    #play, pause y stop comparten clave: cuenta el último botón pulsado
+    def transport(self, operation, status, state):
+        def done(_):
+            self.update_status(status)
+            self.update_button_states(state)
+            if operation == 'play':
+                self.update_current_track()
+
+        call = getattr(self.render, f'{operation}Async')
+        self.request('transport', operation, lambda ctx: call(context=ctx), done,
+                     operation)
+
+    def skip(self, operation, status):
+        def done(_):
+            self.update_status(status)
+            self.update_current_track()
+
+        call = getattr(self.render, f'{operation}Async')
+        self.request('skip', operation, lambda ctx: call(context=ctx), done, operation)
 
     @handle_action_error
     def on_play(self, button):
-        self.render.play()
-        self.update_status("Playing")
-        self.update_button_states(Spotifice.PlaybackState.PLAYING)
-        self.update_current_track()
+        self.transport('play', "Playing", Spotifice.PlaybackState.PLAYING)
 
     @handle_action_error
     def on_pause(self, button):
-        self.render.pause()
-        self.update_status("Paused")
-        self.update_button_states(Spotifice.PlaybackState.PAUSED)
+        self.transport('pause', "Paused", Spotifice.PlaybackState.PAUSED)
 
     @handle_action_error
     def on_stop(self, button):
-        self.render.stop()
-        self.update_status("Stopped")
-        self.update_button_states(Spotifice.PlaybackState.STOPPED)
+        self.transport('stop', "Stopped", Spotifice.PlaybackState.STOPPED)
 
     @handle_action_error
     def on_previous(self, button):
-        self.render.previous()
-        self.update_status("Previous track")
-        self.update_current_track()
+        self.skip('previous', "Previous track")
 
     @handle_action_error
     def on_next(self, button):
-        self.render.next()
-        self.update_status("Next track")
-        self.update_current_track()
+        self.skip('next', "Next track")
 
     @handle_action_error
     def on_repeat(self, button):
         if getattr(self, "_updating_ui", False):
             return
         is_active = bool(button.get_active())
-        self.render.set_repeat(is_active)
-        self.update_status("Repeat On" if is_active else "Repeat Off")
+        self.request('repeat', is_active,
+                     lambda ctx: self.render.set_repeatAsync(is_active, context=ctx),
+                     lambda _: self.update_status(
+                         "Repeat On" if is_active else "Repeat Off"),
+                     'repeat')
 
 
 class SpotificeApp(Gtk.Application):
@@ -444,6 +684,7 @@ if __name__ == '__main__':
         sys.exit("Usage: media_control_v1.py <config-file>")
 
     with Ice.initialize(sys.argv[1]) as communicator:
+        tracing.install(communicator, 'MediaControl')
         app = SpotificeApp(communicator)
         signal.signal(signal.SIGINT, lambda sig, frame: app.quit())
         app.run(None)
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+
+import hashlib
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import Ice
+
+import slice_cache
+from catalog import CatalogReplica
+
+Spotifice = slice_cache.load('spotifice_v2.ice')
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("MediaEdge")
+
+
+class FetchCancelled(Exception):
+    "The session downloading a block moved on before finishing it"
+
+
+#Bloque que se está descargando: los lectores reciben sus bytes según llegan
+class PartialBlock:
+    def __init__(self):
+        self.data = bytearray()
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def append(self, chunk):
+        with self.cond:
+            self.data += chunk
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def read(self, offset, size=None):
+        "Bytes [offset, offset + size) once any are there; without size, the whole block"
+        with self.cond:
+            if size is None:
+                self.cond.wait_for(lambda: self.done)
+            else:
+                self.cond.wait_for(lambda: len(self.data) > offset or self.done)
+            if self.error:
+                raise self.error
+            end = len(self.data) if size is None else offset + size
+            return bytes(self.data[offset:end])
+
+
+#Caché de bloques de audio en dos niveles: memoria (LRU) y disco (LRU), ambos acotados
+class BlockCache:
+    def __init__(self, memory_bytes, disk_dir=None, disk_bytes=0):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_bytes = disk_bytes if disk_dir else 0
+
+        self.memory = OrderedDict()  # key -> bytes
+        self.memory_used = 0
+        self.disk = OrderedDict()    # key -> tamaño en disco
+        self.disk_used = 0
+
+        self.inflight = {}  # key -> PartialBlock de la descarga en curso
+        self.lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = self.coalesced = 0
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def block_path(self, key):
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return self.disk_dir / name
+
+    #Bytes de un bloque; si falta, un solo hilo lo descarga con fetch(append) y todos
+    #los lectores reciben lo que ya ha llegado sin esperar al bloque entero
+    def read(self, key, offset, size, fetch):
+        with self.lock:
+            data = self.lookup(key)
+            if data is not None:
+                return data[offset:offset + size]
+
+            partial = self.inflight.get(key)
+            if partial is None:
+                partial = self.inflight[key] = PartialBlock()
+                self.misses += 1
+                threading.Thread(target=self.download, args=(key, partial, fetch),
+                                 daemon=True).start()
+            elif offset == 0:
+                self.coalesced += 1
+
+        return partial.read(offset, size)
+
+    def get(self, key, fetch):
+        "The whole block, fetching it with fetch() if it is missing"
+        with self.lock:
+            data = self.lookup(key)
+            if data is not None:
+                return data
+
+            partial = self.inflight.get(key)
+            if partial is None:
+                partial = self.inflight[key] = PartialBlock()
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if owner:
+            self.download(key, partial, lambda append: append(fetch()))
+        return partial.read(0)
+
+    def download(self, key, partial, fetch):
+        try:
+            fetch(partial.append)
+        except Exception as e:
+            with self.lock:
+                del self.inflight[key]
+            partial.finish(e)
+            return
+
+        with self.lock:
+            self.store(key, bytes(partial.data))
+            del self.inflight[key]
+        partial.finish()
+
+    def lookup(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+
+        if key in self.disk:
+            try:
+                data = self.block_path(key).read_bytes()
+            except OSError as e:
+                logger.warning(f"Lost cached block {key}: {e}")
+                self.disk_used -= self.disk.pop(key)
+                return None
+
+            self.disk_used -= self.disk.pop(key)
+            self.disk_hits += 1
+            self.store(key, data)
+            return data
+
+        return None
+
+    def store(self, key, data):
+        self.memory[key] = data
+        self.memory_used += len(data)
+
+        while self.memory_used > self.memory_bytes and len(self.memory) > 1:
+            old_key, old_data = self.memory.popitem(last=False)
+            self.memory_used -= len(old_data)
+            self.spill(old_key, old_data)
+
+    #Los bloques expulsados de memoria bajan a disco si hay presupuesto
+    def spill(self, key, data):
+        if len(data) > self.disk_bytes:
+            return
+
+        try:
+            self.block_path(key).write_bytes(data)
+        except OSError as e:
+            logger.warning(f"Could not spill block {key} to disk: {e}")
+            return
+
+        self.disk[key] = len(data)
+        self.disk_used += len(data)
+
+        while self.disk_used > self.disk_bytes:
+            old_key, size = self.disk.popitem(last=False)
+            self.disk_used -= size
+            self.block_path(old_key).unlink(missing_ok=True)
+
+    def __str__(self):
+        return (f"hits={self.hits} disk_hits={self.disk_hits} misses={self.misses} "
+                f"coalesced={self.coalesced} memory={self.memory_used} "
+                f"disk={self.disk_used}")
+
+
+#Lee bloques del origen con la sesión del usuario (open/seek_stream + get_audio_chunk)
+class OriginFetcher:
+    FETCH_SIZE = 32768  # piezas pequeñas: el origen las entrega con su ritmo
+
+    def __init__(self, origin_session, block_size):
+        self.session = origin_session
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.cancelled = False
+        # (track_id, quality, offset) donde está el stream del origen
+        self.position = None
+
+    def fetch(self, track_id, quality, block_no, append):
+        "Pass the block to append piece by piece, as the (paced) origin sends it"
+        offset = block_no * self.block_size
+        with self.lock:
+            position, self.position = self.position, None
+            if position != (track_id, quality, offset):
+                self.session.open_stream(track_id, quality)
+                if offset:
+                    self.session.seek_stream(offset)
+
+            # El origen alinea a frames MP3, así que pido hasta completar el bloque
+            received = 0
+            while received < self.block_size:
+                if self.cancelled:
+                    raise FetchCancelled(f"{track_id} block {block_no}")
+                size = min(self.FETCH_SIZE, self.block_size - received)
+                chunk = self.session.get_audio_chunk(size)
+                if not chunk:
+                    break
+                received += len(chunk)
+                append(chunk)
+
+            at_end = received < self.block_size
+            self.position = None if at_end else (track_id, quality, offset + received)
+
+    #La sesión del origen pasa a otro uso: corto la descarga en curso tras su pieza actual
+    def reset(self):
+        self.cancelled = True
+        with self.lock:
+            self.cancelled = False
+            self.position = None
+
+
+class CachedStream:
+    def __init__(self, track, variant, cache, fetcher, block_size):
+        self.track = track
+        # (quality, is_premium): el origen puede transcodificar distinto
+        self.variant = variant
+        self.cache = cache
+        self.fetcher = fetcher
+        self.block_size = block_size
+        self.position = 0
+
+    def read(self, size):
+        block_no, offset = divmod(self.position, self.block_size)
+        quality = self.variant[0]
+        while True:
+            try:
+                data = self.cache.read(
+                    (self.track.id, self.variant, block_no), offset, size,
+                    lambda append: self.fetcher.fetch(self.track.id, quality, block_no,
+                                                      append))
+                break
+            except FetchCancelled:
+                pass  # otra sesión lo dejó a medias: lo descarga esta
+        self.position += len(data)
+        return data
+
+    def resume_at(self, offset):
+        if offset // self.block_size != self.position // self.block_size:
+            self.fetcher.reset()
+        self.position = offset
+
+    def close(self):
+        self.fetcher.reset()
+
+    def __repr__(self):
+        return f"<CachedStream '{self.track.id}'>"
+
+
+#Sesión del edge: las pistas completas salen de la caché, el resto se reenvía al origen
+class EdgeStreamManagerI(Spotifice.SecureStreamManager):
+    def __init__(self, origin_session, library, cache, block_size):
+        self.origin = origin_session
+        self.library = library
+        self.cache = cache
+        self.block_size = block_size
+        self.fetcher = OriginFetcher(origin_session, block_size)
+        self.user = origin_session.get_user_info()
+        self.current_stream = None
+        self.passthrough = False
+
+    def get_user_info(self, current=None):
+        return self.user
+
+    def get_resume_token(self, current=None):
+        return self.origin.get_resume_token()
+
+    def close(self, current=None):
+        self.close_stream(current)
+        try:
+            self.origin.close()
+        except Ice.Exception as e:
+            logger.warning(f"Error closing origin session: {e}")
+        current.adapter.remove(current.id)
+        logger.info(f"Session closed for user: {self.user.username}")
+
+    #Las playlists se editan en el origen
+    def create_playlist(self, name, description, current=None):
+        return self.origin.create_playlist(name, description)
+
+    def append_track(self, playlist_id, track_id, current=None):
+        return self.origin.append_track(playlist_id, track_id)
+
+    def remove_track(self, playlist_id, index, current=None):
+        return self.origin.remove_track(playlist_id, index)
+
+    def move_track(self, playlist_id, from_index, to_index, current=None):
+        return self.origin.move_track(playlist_id, from_index, to_index)
+
+    def delete_playlist(self, playlist_id, current=None):
+        self.origin.delete_playlist(playlist_id)
+
+    def open_stream(self, track_id, quality, current=None):
+        track = self.library.get_track_info(track_id)
+        self.close_stream(current)
+        variant = (max(quality, 0), self.user.is_premium)
+        self.current_stream = CachedStream(
+            track, variant, self.cache, self.fetcher, self.block_size)
+        logger.info(f"Open cached stream for track '{track_id}'")
+
+    #Seek, playlists y broadcasts no se cachean: se reenvían a la sesión del origen
+    def open_stream_at(self, track_id, position_ms, current=None):
+        self.start_passthrough()
+        return self.origin.open_stream_at(track_id, position_ms)
+
+    def open_playlist_stream(self, playlist_id, start_index, current=None):
+        self.start_passthrough()
+        return self.origin.open_playlist_stream(playlist_id, start_index)
+
+    def open_broadcast(self, playlist_id, start_index, current=None):
+        self.start_passthrough()
+        return self.origin.open_broadcast(playlist_id, start_index)
+
+    def join_broadcast(self, broadcast_id, current=None):
+        self.start_passthrough()
+        return self.origin.join_broadcast(broadcast_id)
+
+    def start_passthrough(self):
+        self.current_stream = None
+        self.passthrough = True
+        self.fetcher.reset()
+
+    def seek_stream(self, byte_offset, current=None):
+        if self.passthrough:
+            return self.origin.seek_stream(byte_offset)
+        if not self.current_stream:
+            raise Spotifice.StreamError("Session", "No open stream for render")
+        self.current_stream.resume_at(byte_offset)
+
+    def close_stream(self, current=None):
+        if self.passthrough:
+            self.origin.close_stream()
+            self.passthrough = False
+        if self.current_stream:
+            self.current_stream.close()
+        self.current_stream = None
+
+    def get_audio_chunk(self, chunk_size, current=None):
+        if self.passthrough:
+            return self.origin.get_audio_chunk(chunk_size)
+
+        if not self.current_stream:
+            raise Spotifice.StreamError("Session", "No open stream for render")
+
+        try:
+            data = self.current_stream.read(chunk_size)
+        except Spotifice.Error:
+            raise
+        except Ice.Exception as e:
+            raise Spotifice.IOError(
+                self.current_stream.track.filename, f"Error fetching from origin: {e}")
+
+        if not data:
+            logger.info(f"Track exhausted: '{self.current_stream.track.id}'")
+            self.current_stream = None
+        return data
+
+
+class MediaEdgeI(Spotifice.MediaServer):
+    def __init__(self, origin, cache, block_size, catalog_refresh_secs=2):
+        self.origin = origin
+        self.cache = cache
+        self.block_size = block_size
+        #Copia del catálogo del origen; se pone al día pidiéndole solo lo que ha cambiado
+        self.catalog = CatalogReplica(catalog_refresh_secs)
+
+    # ---- MusicLibrary ----
+    def get_all_tracks(self, current=None):
+        self.catalog.sync(self.origin)
+        return list(self.catalog.tracks.values())
+
+    def get_tracks_page(self, offset, count, current=None):
+        return self.origin.get_tracks_page(offset, count)
+
+    def get_track_info(self, track_id, current=None):
+        self.catalog.sync(self.origin)
+        track = self.catalog.tracks.get(track_id)
+        return track if track is not None else self.origin.get_track_info(track_id)
+
+    # ---- PlaylistManager ----
+    def get_all_playlists(self, current=None):
+        self.catalog.sync(self.origin)
+        return list(self.catalog.playlists.values())
+
+    def get_playlist(self, playlist_id, current=None):
+        self.catalog.sync(self.origin)
+        playlist = self.catalog.playlists.get(playlist_id)
+        return playlist if playlist is not None else self.origin.get_playlist(playlist_id)
+
+    def get_playlists_page(self, offset, count, current=None):
+        return self.origin.get_playlists_page(offset, count)
+
+    # ---- CatalogSync ----
+    def get_catalog_changes(self, epoch, since_version, current=None):
+        return self.origin.get_catalog_changes(epoch, since_version)
+
+    # ---- LoadMonitor ----
+    def get_load(self, current=None):
+        return self.origin.get_load()
+
+    # ---- AuthManager ----
+    def authenticate(self, media_render, username, password, current=None):
+        origin_session = self.origin.authenticate(media_render, username, password)
+        return self.create_session(origin_session, current)
+
+    def resume_session(self, media_render, token, current=None):
+        origin_session = self.origin.resume_session(media_render, token)
+        return self.create_session(origin_session, current)
+
+    def create_session(self, origin_session, current):
+        servant = EdgeStreamManagerI(origin_session, self, self.cache, self.block_size)
+        proxy = current.adapter.addWithUUID(servant)
+        logger.info(f"User '{servant.user.username}' connected through edge")
+        return Spotifice.SecureStreamManagerPrx.uncheckedCast(proxy)
+
+
+def main(ic):
+   properties = ic.getProperties()
+   origin = Spotifice.MediaServerPrx.uncheckedCast(
+       ic.propertyToProxy('MediaEdge.Origin'))
+   if origin is None:
+       raise RuntimeError("MediaEdge.Origin is not set")
+
+   block_size = properties.getPropertyAsIntWithDefault('MediaEdge.BlockSize', 256 * 1024)
+   cache = BlockCache(
+       properties.getPropertyAsIntWithDefault('MediaEdge.MemoryBytes', 64 * 1024 * 1024),
+       properties.getProperty('MediaEdge.DiskDir') or None,
+       properties.getPropertyAsIntWithDefault('MediaEdge.DiskBytes', 1024 * 1024 * 1024))
+
+   adapter = ic.createObjectAdapter("MediaEdgeAdapter")
+   refresh = properties.getPropertyAsIntWithDefault('MediaEdge.CatalogRefresh', 2)
+   servant = MediaEdgeI(origin, cache, block_size, refresh)
+   identity = properties.getPropertyWithDefault('MediaEdge.Identity', 'mediaServer1')
+   proxy = adapter.add(servant, ic.stringToIdentity(identity))
+
+   logger.info(f"MediaEdge: {proxy} -> origin {origin}")
+
+   adapter.activate()
+   ic.waitForShutdown()
+
+   logger.info(f"Shutdown. Cache: {cache}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Usage: media_edge.py <config-file>")
+
+    props = Ice.createProperties(sys.argv)
+    props.load(sys.argv[1])
+
+    init_data = Ice.InitializationData()
+    init_data.properties = props
+
+    try:
+        with Ice.initialize(sys.argv, init_data) as communicator:
+            main(communicator)
+    except KeyboardInterrupt:
+        logger.info("Edge interrupted by user.")
@@ -1,32 +1,110 @@
 #!/usr/bin/env python3
 
 import logging
+import random
+import resource
 import sys
+import threading
 from contextlib import contextmanager
+from time import monotonic, sleep
 
 import Ice
 from Ice import identityToString as id2str
 
+import metrics
+import profiling
+import slice_cache
+import tracing
 from gst_player import GstPlayer
+from metrics import REGISTRY, timed
+from profiling import profiled
+from tracing import traced
 
-Ice.loadSlice('-I{} spotifice_v2.ice'.format(Ice.getSliceDir()))
-import Spotifice  # type: ignore # noqa: E402
+Spotifice = slice_cache.load('spotifice_v2.ice')
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("MediaRender")
 
+CHUNK_FETCH = REGISTRY.histogram('spotifice_chunk_fetch_seconds',
+                                 "get_audio_chunk round trip seen by the render")
+
+
+#Caché de metadatos de pistas compartida por todas las zonas de un mismo proceso
+class TrackInfoCache:
+    def __init__(self):
+        self.tracks = {}
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+        REGISTRY.counter('spotifice_cache_hits_total', "Cache hits",
+                         cache='track_info', func=lambda: self.hits)
+        REGISTRY.counter('spotifice_cache_misses_total', "Cache misses",
+                         cache='track_info', func=lambda: self.misses)
+
+    def get(self, server, track_id):
+        key = (id2str(server.ice_getIdentity()), track_id)
+        with self.lock:
+            if key in self.tracks:
+                self.hits += 1
+                return self.tracks[key]
+            self.misses += 1
+
+        track = server.get_track_info(track_id)
+        with self.lock:
+            self.tracks[key] = track
+        return track
+
+
+#Contadores de uso de recursos de una zona (un MediaRenderI con su player)
+class ZoneStats:
+    def __init__(self):
+        self.chunks = 0
+        self.bytes = 0
+        self.fetch_secs = 0.0
+        self.errors = 0
+
+    def record_chunk(self, size, elapsed):
+        CHUNK_FETCH.observe(elapsed)
+        self.chunks += 1
+        self.bytes += size
+        self.fetch_secs += elapsed
+
+    def __str__(self):
+        avg_ms = self.fetch_secs / self.chunks * 1000 if self.chunks else 0
+        return (f"chunks={self.chunks} bytes={self.bytes} "
+                f"avg_fetch={avg_ms:.2f}ms errors={self.errors}")
+
 
 class MediaRenderI(Spotifice.MediaRender):
-    def __init__(self, player):
+    FAILOVER_TIMEOUT_MS = 500
+    ADMISSION_RETRIES = 4     # reintentos si el servidor rechaza el stream por carga
+    MAX_BACKOFF_SECS = 8.0
+    MAX_ADMISSION_WAIT_SECS = 5.0  # espera total en el hilo de Ice antes de dar el error
+
+    def __init__(self, player, track_cache=None, replicas=None, quality=0):
         self.player = player
+        self.quality = quality  #kbps pedidos al servidor (0 = calidad original)
+        self.track_cache = track_cache or TrackInfoCache()
+        self.stats = ZoneStats()
+        #Otras réplicas de MediaServer a las que saltar si cae la actual
+        self.replicas = replicas or []
         self.server: Spotifice.MediaServerPrx = None
         self.stream_manager: Spotifice.SecureStreamManagerPrx = None # Guardo el proxy de SecureStreamManager
+        self.resume_token = ""  #Token para reabrir la sesión en otro servidor
+        self.own_proxy = None
 
         self.current_track = None
         self.current_playlist = None
+        self.current_broadcast = None  #Id del broadcast (modo fiesta) cargado
         self.playlist_index = 0
         self.repeat = False #Repetición desactivada por defecto
         self.history = []  #Historial de pistas reproducidas para previous
+        self.seek_target = None  #(track_id, ms) pendiente de aplicar en el siguiente play
+        #Fronteras de pista pendientes en el stream de playlist
+        self.track_boundaries = []
+        self.stream_offset = 0  #Bytes recibidos del stream actual
+        self.stream_origin = None  #Cómo se abrió el stream actual: (tipo, id, posición)
+        #Traza (trace_id, span_id) de la petición que abrió el stream
+        self.stream_trace = None
     
     def ensure_player_stopped(self):
         if self.player.is_playing():
@@ -36,6 +114,9 @@ class MediaRenderI(Spotifice.MediaRender):
         if not self.server:
             raise Spotifice.BadReference(reason="No MediaServer bound")
 
+    def get_track_info(self, track_id):
+        return self.track_cache.get(self.server, track_id)
+
     # --- RenderConnectivity ---
 
     def bind_media_server(self, media_server, stream_manager, current=None): #Modifico el bind para poder recibir también el stream_manager
@@ -47,6 +128,10 @@ class MediaRenderI(Spotifice.MediaRender):
 
         self.server = media_server
         self.stream_manager = stream_manager #Guargo la referencia de la sesión de SecureStreamManager para poder usarla en el play
+        self.resume_token = stream_manager.get_resume_token()
+        if current:
+            self.own_proxy = Spotifice.MediaRenderPrx.uncheckedCast(
+                current.adapter.createProxy(current.id))
         self.history = [] #Reinicio el historial si cambio de servidor
         logger.info(f"Bound to MediaServer '{id2str(media_server.ice_getIdentity())}'")
 
@@ -59,10 +144,14 @@ class MediaRenderI(Spotifice.MediaRender):
                 logger.warning(f"Error cerrando sesion: {e}")
         self.server = None
         self.stream_manager = None
+        self.resume_token = ""
         logger.info("Unbound MediaServer")
 
     # --- ContentManager ---
 
+    @timed('load_track')
+    @profiled('render.load_track')
+    @traced('render.load_track', root=True)
     def load_track(self, track_id, current=None):
         self.ensure_server_bound()
 
@@ -72,8 +161,9 @@ class MediaRenderI(Spotifice.MediaRender):
                 if self.current_track:
                     self.history.append(self.current_track.id) #Añado la pista actual al historial antes de cambiar.
               
-                self.current_track = self.server.get_track_info(track_id)
+                self.current_track = self.get_track_info(track_id)
                 self.current_playlist = None
+                self.current_broadcast = None
                 self.playlist_index = 0
 
             logger.info(f"Current track set to: {self.current_track.title}")
@@ -86,11 +176,15 @@ class MediaRenderI(Spotifice.MediaRender):
         return self.current_track
 
     #--- PlaylistManager ---
+    @timed('load_playlist')
+    @profiled('render.load_playlist')
+    @traced('render.load_playlist', root=True)
     def load_playlist(self, playlist_id, current=None):
         self.ensure_server_bound() 
 
         with self.keep_playing_state(current):
             self.current_playlist = self.server.get_playlist(playlist_id) #Obtengo la información de la playlist al servidor
+            self.current_broadcast = None
             self.playlist_index = 0
         
             self.history = [] #Reinicio el historial al cargar una nueva playlist
@@ -99,13 +193,29 @@ class MediaRenderI(Spotifice.MediaRender):
             #Compruebo si la playlist tiene pistas
             if self.current_playlist.track_ids:
              first_track_id = self.current_playlist.track_ids[0]
-             self.current_track = self.server.get_track_info(first_track_id) #Cargo la primera pista de la playlist
+             #Cargo la primera pista de la playlist
+             self.current_track = self.get_track_info(first_track_id)
              logger.info(f"Loaded playlist: {self.current_playlist.name}, first track: {self.current_track.title}")
             
             else:
               self.current_track = None 
               logger.info(f"Loaded playlist: {self.current_playlist.name}, but it is empty.")
 
+    #Me uno a un broadcast del servidor: la pista la marca el lector común, no este render
+    @timed('load_broadcast')
+    @profiled('render.load_broadcast')
+    def load_broadcast(self, broadcast_id, current=None):
+        self.ensure_server_bound()
+
+        with self.keep_playing_state(current):
+            self.current_broadcast = broadcast_id
+            self.current_playlist = None
+            self.current_track = None
+            self.playlist_index = 0
+            self.history = []
+
+        logger.info(f"Broadcast loaded: {broadcast_id}")
+
     # --- PlaybackController ---
 
     @contextmanager
@@ -123,27 +233,74 @@ class MediaRenderI(Spotifice.MediaRender):
                 self.play(current)
                 
 
+    @timed('play')
+    @profiled('render.play')
+    @traced('render.play', root=True)
     def play(self, current=None):
+        #Los chunks hasta el primer buffer entran en la traza que arrancó la reproducción
         def get_chunk_hook(chunk_size):
+            if self.stream_trace and not self.player.first_buffer_e.is_set():
+                ic = self.stream_manager.ice_getCommunicator()
+                with tracing.span('render.get_audio_chunk', self.stream_trace, ic):
+                    return fetch_chunk(chunk_size)
+            return fetch_chunk(chunk_size)
+
+        def fetch_chunk(chunk_size):
+            start = monotonic()
             try:
-                return self.stream_manager.get_audio_chunk(chunk_size)
+                chunk = self.stream_manager.get_audio_chunk(chunk_size)
             except Spotifice.IOError as e:
                 logger.error(e)
+                self.stats.errors += 1
+                return None
+            except Ice.LocalException as e:
+                #El servidor ha caído o la sesión ya no existe: reanudo en otra réplica
+                logger.critical(e)
+                self.stats.errors += 1
+                if not self.failover():
+                    return None
+                try:
+                    chunk = self.stream_manager.get_audio_chunk(chunk_size)
+                except Ice.Exception as e:
+                    logger.critical(e)
+                    return None
             except Ice.Exception as e:
                 logger.critical(e)
-                
-        # Función para manejar la repetición de una pista individual
+                self.stats.errors += 1
+                return None
+
+            self.stats.record_chunk(len(chunk), monotonic() - start)
+            self.follow_track_boundaries(len(chunk))
+            return chunk
+
+        # Función para manejar la repetición de una pista individual o de la playlist
         def handle_individual_repeat():
             # Si la repetición está activada y no hay playlist, repito la pista
-            if self.repeat and not self.current_playlist:
+            if self.repeat and not self.current_playlist and not self.current_broadcast:
                 logger.info("Individual track finished, repeating...")
                 try:
-                    self.stream_manager.open_stream(self.current_track.id) #Abro el stream de la pista actual
+                    #Abro el stream de la pista actual
+                    self.start_stream(('track', self.current_track.id, 0))
                     self.player.configure(get_chunk_hook, track_exhausted_hook=handle_individual_repeat) #Reconfiguro el player con el hook
                     self.player.confirm_play_starts() #Confirmo que la reproducción ha comenzado
                     
                 except Exception as e:
                     logger.error(f"Failed to repeat track: {e}")
+
+            # El stream de playlist ha llegado al final: vuelvo a la primera pista
+            elif self.repeat and self.current_playlist:
+                logger.info("Playlist finished, repeating...")
+                try:
+                    if self.current_track:
+                        self.history.append(self.current_track.id)
+                    self.playlist_index = 0
+                    self.start_stream(('playlist', self.current_playlist.id, 0))
+                    self.player.configure(get_chunk_hook,
+                                          track_exhausted_hook=handle_individual_repeat)
+                    self.player.confirm_play_starts()
+
+                except Exception as e:
+                    logger.error(f"Failed to repeat playlist: {e}")
                     
             else:
                 logger.debug("Track finished, not repeating.")
@@ -162,21 +319,187 @@ class MediaRenderI(Spotifice.MediaRender):
         if player_state == 'PLAYING':
             raise Spotifice.PlayerError(reason="Already playing")
         
-        if not self.current_track:
+        if not self.current_track and not self.current_broadcast:
             raise Spotifice.TrackError(reason="No track loaded")
 
+        #Solo aplico el seek pendiente si sigue siendo la misma pista
+        seek_target, self.seek_target = self.seek_target, None
+        position_ms = 0
+        if seek_target and self.current_track and seek_target[0] == self.current_track.id:
+            position_ms = seek_target[1]
+
         try:
-            self.stream_manager.open_stream(self.current_track.id)
+            if self.current_broadcast:
+                self.start_stream(('broadcast', self.current_broadcast, 0))
+            elif position_ms:
+                position_ms = self.start_stream(
+                    ('track', self.current_track.id, position_ms))
+            elif self.current_playlist:
+                self.start_stream(
+                    ('playlist', self.current_playlist.id, self.playlist_index))
+            else:
+                self.start_stream(('track', self.current_track.id, 0))
         except Spotifice.BadIdentity as e:
             logger.error(f"Error starting stream: {e.reason}")
             raise Spotifice.StreamError(reason="Stream setup failed")
 
-        self.player.configure(get_chunk_hook, track_exhausted_hook=handle_individual_repeat)
+        self.player.configure(get_chunk_hook,
+                              track_exhausted_hook=handle_individual_repeat,
+                              trace=self.stream_trace)
 
         if not self.player.confirm_play_starts():
             raise Spotifice.PlayerError(reason="Failed to confirm playback")
 
+        if seek_target:
+            elapsed = self.player.wait_first_buffer()
+            if elapsed is None:
+                logger.warning(f"Seek to {position_ms} ms: no audio after seek")
+            else:
+                logger.info(f"Seek to {position_ms} ms: "
+                            f"time to audio {elapsed * 1000:.1f} ms")
+
+    #Si el servidor está saturado espero lo que indica (con jitter, creciendo en cada
+    #intento), pero como mucho MAX_ADMISSION_WAIT_SECS en total
+    def start_stream(self, origin):
+        waited = 0
+        for attempt in range(self.ADMISSION_RETRIES + 1):
+            try:
+                return self.open_origin(origin)
+            except Spotifice.OverloadError as e:
+                delay = self.backoff_delay(e.retry_after_ms, attempt)
+                if attempt == self.ADMISSION_RETRIES \
+                        or waited + delay > self.MAX_ADMISSION_WAIT_SECS:
+                    raise
+                waited += delay
+                logger.warning(f"Server over capacity, retrying in {delay:.2f} s")
+                sleep(delay)
+
+    @classmethod
+    def backoff_delay(cls, retry_after_ms, attempt):
+        base = max(retry_after_ms / 1000, 0.25 * 2 ** attempt)
+        return min(base, cls.MAX_BACKOFF_SECS) * random.uniform(0.5, 1.5)
+
+    #Abro el stream: ('track', id, ms), ('playlist', id, índice) o ('broadcast', id, 0)
+    def open_origin(self, origin):
+        kind, item_id, position = origin
+        self.stream_trace = tracing.current()
+        self.stream_origin = origin
+        self.stream_offset = 0
+
+        if kind == 'broadcast':
+            info = self.stream_manager.join_broadcast(item_id)
+            self.follow_broadcast(info)
+        elif kind == 'playlist':
+            #La playlist llega como un único stream desde la pista indicada
+            boundaries = self.stream_manager.open_playlist_stream(item_id, position)
+            self.current_track = boundaries[0].track
+            self.track_boundaries = list(boundaries[1:])
+        elif position:
+            position = self.stream_manager.open_stream_at(item_id, position)
+            self.track_boundaries = []
+        else:
+            self.stream_manager.open_stream(item_id, self.quality)
+            self.track_boundaries = []
+
+        return position
+
+    #Me coloco en el punto del broadcast donde entro: las fronteras anteriores ya pasaron
+    def follow_broadcast(self, info):
+        self.track_boundaries = list(info.boundaries)
+        self.stream_offset = info.offset
+        while self.track_boundaries and self.track_boundaries[0].offset <= info.offset:
+            boundary = self.track_boundaries.pop(0)
+            self.current_track = boundary.track
+            self.playlist_index = boundary.index
+
+    #Abro el mismo stream en otra sesión y me coloco en el byte por el que iba
+    def reopen_stream(self, stream_manager):
+        kind, item_id, position = self.stream_origin
+        if kind == 'broadcast':
+            #En directo no se puede volver atrás: sigo desde donde vaya el broadcast
+            self.follow_broadcast(stream_manager.join_broadcast(item_id))
+            return
+        if kind == 'playlist':
+            stream_manager.open_playlist_stream(item_id, position)
+        elif position:
+            stream_manager.open_stream_at(item_id, position)
+        else:
+            stream_manager.open_stream(item_id, self.quality)
+
+        if self.stream_offset:
+            stream_manager.seek_stream(self.stream_offset)
+
+    def failover_candidates(self):
+        #Re-resuelvo el proxy sin caché: con IceGrid el locator puede dar otra réplica
+        yield self.server.ice_locatorCacheTimeout(0).ice_connectionId(Ice.generateUUID())
+        for replica in self.replicas:
+            if replica != self.server:
+                yield replica
+
+    def failover(self):
+        if not (self.server and self.resume_token and self.stream_origin):
+            return False
+
+        start = monotonic()
+        for server in self.failover_candidates():
+            server = server.ice_invocationTimeout(self.FAILOVER_TIMEOUT_MS)
+            try:
+                stream_manager = server.resume_session(self.own_proxy, self.resume_token)
+                self.reopen_stream(stream_manager)
+            except Ice.Exception as e:
+                logger.warning(f"Failover to '{server}' failed: {e}")
+                continue
+
+            self.server = server.ice_invocationTimeout(-1)
+            self.stream_manager = stream_manager.ice_invocationTimeout(-1)
+            self.resume_token = self.stream_manager.get_resume_token()
+            logger.warning(f"Failover done in {(monotonic() - start) * 1000:.0f} ms, "
+                           f"resumed at byte {self.stream_offset}")
+            return True
+
+        logger.error("Failover failed: no MediaServer replica available")
+        return False
+
+    #Si lo recibido pasa la frontera de la siguiente pista, actualizo la pista actual
+    def follow_track_boundaries(self, chunk_size):
+        self.stream_offset += chunk_size
+        boundaries = self.track_boundaries
+        while boundaries and boundaries[0].offset < self.stream_offset:
+            boundary = boundaries.pop(0)
+            if self.current_track:
+                self.history.append(self.current_track.id)
+            self.current_track = boundary.track
+            self.playlist_index = boundary.index
+            logger.info(f"Playlist advanced to: {self.current_track.title}")
+
+    #Salto a una posición de la pista actual. Si está parado, se aplica al hacer play
+    @timed('seek')
+    @profiled('render.seek')
+    @traced('render.seek', root=True)
+    def seek(self, position_ms, current=None):
+        self.ensure_server_bound()
+
+        if self.current_broadcast:
+            raise Spotifice.PlayerError(reason="Can not seek a broadcast")
+
+        if not self.current_track:
+            raise Spotifice.TrackError(reason="No track loaded")
+
+        if position_ms < 0:
+            raise Spotifice.StreamError(str(position_ms), "Invalid seek position")
+
+        self.seek_target = (self.current_track.id, position_ms)
+
+        if self.player.get_state() == 'STOP':
+            logger.info(f"Seek to {position_ms} ms pending until play")
+            return
+
+        with self.keep_playing_state(current):
+            pass
+
     
+    @timed('pause')
+    @profiled('render.pause')
     def pause(self, current=None):
         if not self.player.is_playing():
             raise Spotifice.PlayerError(reason="Not currently playing") #Si no se está reproduciendo nada, no lo puedo pausar.
@@ -207,6 +530,9 @@ class MediaRenderI(Spotifice.MediaRender):
             current_track_id = current_id,
             repeat = self.repeat
         )
+    @timed('next')
+    @profiled('render.next')
+    @traced('render.next', root=True)
     def next(self, current=None):
         if not self.current_playlist: #Si no hay ninguna playlist cargada, no puedo hacer next a la siguiente.
             logger.info("No playlist loaded, cannot go to next track.")
@@ -222,7 +548,8 @@ class MediaRenderI(Spotifice.MediaRender):
             self.playlist_index += 1
             new_track_id = self.current_playlist.track_ids[self.playlist_index] #Obtengo el id de la siguiente pista
             with self.keep_playing_state(current):
-                self.current_track = self.server.get_track_info(new_track_id) #Cargo la nueva pista
+                #Cargo la nueva pista
+                self.current_track = self.get_track_info(new_track_id)
             logger.info(f"Playing next track: {self.current_track.title}")
         
         #Si estamos al final de la playlist y la opción repeat está activada, vuelvo al inicio
@@ -230,7 +557,8 @@ class MediaRenderI(Spotifice.MediaRender):
              self.playlist_index = 0
              new_track_id = self.current_playlist.track_ids[self.playlist_index] #Obtengo el id de la primera pista
              with self.keep_playing_state(current):
-                    self.current_track = self.server.get_track_info(new_track_id) #Cargo la nueva pista
+                    #Cargo la nueva pista
+                    self.current_track = self.get_track_info(new_track_id)
              logger.info(f"Reached end of playlist, repeating from start: {self.current_track.title}")
         
         else: #Si no hay mas pistas y repeat está desactivado, no se avanza de pista
@@ -238,6 +566,9 @@ class MediaRenderI(Spotifice.MediaRender):
             if self.history:
                 self.history.pop() #Elimino la pista actual del historial ya que no se ha cambiado.
 
+    @timed('previous')
+    @profiled('render.previous')
+    @traced('render.previous', root=True)
     def previous(self, current=None):
         #Si no hay pistas en el historial, no puedo retroceder.
         if not self.history:
@@ -248,7 +579,8 @@ class MediaRenderI(Spotifice.MediaRender):
         
         #Cargo la pista anterior manteniendo el estado de reproducción
         with self.keep_playing_state(current):
-            self.current_track = self.server.get_track_info(last_track_id) #Cargo la pista anterior
+            #Cargo la pista anterior
+            self.current_track = self.get_track_info(last_track_id)
         
         #Si la pista anterior está en la playlist actual, actualizo el índice de la playlist
         if self.current_playlist and last_track_id in self.current_playlist.track_ids:
@@ -263,6 +595,8 @@ class MediaRenderI(Spotifice.MediaRender):
         self.repeat = repeat
         logger.info(f"Set repeat to: {self.repeat}")
 
+    @timed('stop')
+    @profiled('render.stop')
     def stop(self, current=None):
         if self.stream_manager:
             try:
@@ -275,8 +609,19 @@ class MediaRenderI(Spotifice.MediaRender):
         logger.info("Stopped")
 
 
+#Réplicas para failover, p.ej. "mediaServer1:tcp -p 10000, mediaServer1:tcp -p 10010"
+def load_replicas(ic):
+    replicas = ic.getProperties().getProperty('MediaRender.ServerReplicas')
+    return [Spotifice.MediaServerPrx.uncheckedCast(ic.stringToProxy(proxy.strip()))
+            for proxy in replicas.split(',') if proxy.strip()]
+
+
 def main(ic, player):
-    servant = MediaRenderI(player)
+    quality = ic.getProperties().getPropertyAsInt('MediaRender.Quality')
+    servant = MediaRenderI(player, replicas=load_replicas(ic), quality=quality)
+    metrics.install(ic)
+    tracing.install(ic, 'MediaRender')
+    profiling.install(ic, 'MediaRender')
 
     adapter = ic.createObjectAdapter("MediaRenderAdapter")
     proxy = adapter.add(servant, ic.stringToIdentity("mediaRender1"))
@@ -287,13 +632,84 @@ def main(ic, player):
 
     logger.info("Shutdown")
 
+
+#Varias zonas (MediaRenderI + GstPlayer) en un solo proceso, con un único communicator
+class RenderHost:
+    def __init__(self, ic, adapter):
+        self.ic = ic
+        self.adapter = adapter
+        self.track_cache = TrackInfoCache()
+        self.replicas = load_replicas(ic)
+        self.zones = {}
+
+    def add_zone(self, name, identity, sink=None, max_bytes=None, quality=0):
+        player = GstPlayer(sink=sink, max_bytes=max_bytes, name=f"GstPlayer-{name}")
+        player.start()
+
+        servant = MediaRenderI(player, self.track_cache, self.replicas, quality)
+        proxy = self.adapter.add(servant, self.ic.stringToIdentity(identity))
+        self.zones[name] = servant
+        logger.info(f"Zone '{name}': {proxy} "
+                    f"(sink={player.sink}, max_bytes={player.max_bytes})")
+        return proxy
+
+    def report(self):
+        for name, servant in self.zones.items():
+            logger.info(f"Zone '{name}': {servant.player.get_state()} {servant.stats}")
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu = usage.ru_utime + usage.ru_stime
+        logger.info(f"Host: {len(self.zones)} zones, cpu={cpu:.2f}s "
+                    f"maxrss={usage.ru_maxrss}kB "
+                    f"cached_tracks={len(self.track_cache.tracks)}")
+
+    def report_loop(self, interval, stop_e):
+        while not stop_e.wait(interval):
+            self.report()
+
+    def shutdown(self):
+        for servant in self.zones.values():
+            servant.player.shutdown()
+
+
+def host_main(ic):
+    properties = ic.getProperties()
+    zones = properties.getPropertyAsList('MediaRender.Zones')
+    interval = properties.getPropertyAsIntWithDefault('MediaRender.StatsInterval', 60)
+    quality = properties.getPropertyAsInt('MediaRender.Quality')
+
+    adapter = ic.createObjectAdapter("MediaRenderAdapter")
+    host = RenderHost(ic, adapter)
+    metrics.install(ic)
+    tracing.install(ic, 'MediaRender')
+    profiling.install(ic, 'MediaRender')
+
+    for name in zones:
+        prefix = f'MediaRender.Zone.{name}'
+        host.add_zone(
+            name,
+            properties.getPropertyWithDefault(f'{prefix}.Identity', name),
+            properties.getProperty(f'{prefix}.Sink') or None,
+            properties.getPropertyAsInt(f'{prefix}.BufferBytes') or None,
+            properties.getPropertyAsIntWithDefault(f'{prefix}.Quality', quality))
+
+    stop_e = threading.Event()
+    threading.Thread(target=host.report_loop, args=(interval, stop_e),
+                     daemon=True).start()
+
+    adapter.activate()
+    ic.waitForShutdown()
+
+    stop_e.set()
+    host.report()
+    host.shutdown()
+    logger.info("Shutdown")
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         sys.exit("Usage: media_render.py <config-file>")
 
-    player = GstPlayer()
-    player.start()
-
     # 1. Crear propiedades base cogiendo los argumentos de consola (Lo que manda IceGrid)
     props = Ice.createProperties(sys.argv)
     
@@ -304,10 +720,22 @@ if __name__ == "__main__":
     init_data = Ice.InitializationData()
     init_data.properties = props
 
+    # Con MediaRender.Zones definido, el proceso aloja varias zonas
+    if props.getProperty('MediaRender.Zones'):
+        try:
+            with Ice.initialize(sys.argv, init_data) as communicator:
+                host_main(communicator)
+        except KeyboardInterrupt:
+            logger.info("Server interrupted by user.")
+        sys.exit(0)
+
+    player = GstPlayer()
+    player.start()
+
     try:
         with Ice.initialize(sys.argv, init_data) as communicator:
             main(communicator, player)
     except KeyboardInterrupt:
         logger.info("Server interrupted by user.")
     finally:
-        player.shutdown()
\ No newline at end of file
+        player.shutdown()
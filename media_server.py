@@ -1,35 +1,112 @@
 #!/usr/bin/env python3
 
-import logging
-import json
-import sys
 import hashlib
+import hmac
+import json
+import logging
+import os
 import secrets
-from pathlib import Path
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
 from datetime import datetime
+from pathlib import Path
 
 import Ice
 from Ice import identityToString as id2str
 
-Ice.loadSlice('-I{} spotifice_v2.ice'.format(Ice.getSliceDir()))
-import Spotifice  # type: ignore # noqa: E402
+import metrics
+import profiling
+import slice_cache
+import tracing
+from admission import AdmissionController
+from catalog import PLAYLIST, TRACK, ChangeLog
+from metrics import REGISTRY, timed
+from mp3_frames import FrameIndexCache
+from pacing import FairShareScheduler
+from playlist_store import PlaylistStore
+from popularity import PopularityTracker, read_ahead
+from profiling import profiled
+from tracing import traced
+from transcode import TranscodeCache, TranscodeError, snap_quality
+
+Spotifice = slice_cache.load('spotifice_v2.ice')
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("MediaServer")
 
+BYTES_SERVED = REGISTRY.counter('spotifice_bytes_served_total',
+                                "Audio bytes sent to clients")
+ACTIVE_SESSIONS = REGISTRY.gauge('spotifice_sessions', "Open sessions")
+
+MAX_PAGE = 1000  # elementos como mucho por página de un listado
+
+
+class PageIndex:
+    """Ids of a catalog dict in order, so that a page is a slice of a list
+    instead of a walk from the first item. The list is rebuilt when the
+    catalog version moves."""
+
+    def __init__(self, items, changes):
+        self.items = items
+        self.changes = changes
+        self.version = None
+        self.ids = []
+        self.lock = threading.Lock()
+
+    def page(self, offset, count):
+        "Values in [offset, offset + count), at most MAX_PAGE, and the catalog version"
+        with self.lock:
+            #Leo la versión antes que los ids: un cambio a medias se rehace la próxima vez
+            version = self.changes.version
+            if version != self.version or len(self.ids) != len(self.items):
+                self.ids, self.version = list(self.items), version
+            ids = self.ids
+
+        offset = max(offset, 0)
+        page = ids[offset:offset + min(max(count, 0), MAX_PAGE)]
+        return [self.items[i] for i in page if i in self.items], version
+
 
 class StreamedFile:
-    def __init__(self, track_info, media_dir):
+    def __init__(self, track_info, media_dir, frame_index=None, filepath=None):
         self.track = track_info
-        filepath = media_dir / track_info.filename
+        self.index = frame_index  # con índice, los chunks acaban en frontera de frame
+        self.stop = None  # si se fija, no se lee más allá de este byte
+        self.origin = 0  # byte del fichero donde empieza el stream
+        filepath = filepath or media_dir / track_info.filename  # o el transcodificado
 
         try:
             self.file = open(filepath, 'rb')
         except Exception as e:
             raise Spotifice.IOError(track_info.filename, f"Error opening media file: {e}")
 
+    def seek(self, offset):
+        self.file.seek(offset)
+        self.origin = offset
+
+    #Vuelvo a una posición relativa al inicio del stream (para reanudar tras un failover)
+    def resume_at(self, offset):
+        self.file.seek(self.origin + offset)
+
+    #Me quedo solo con los frames de audio (sin ID3) para poder concatenar pistas
+    def trim(self):
+        if self.index:
+            self.seek(self.index.offsets[0])
+            self.stop = self.index.end
+
     def read(self, size):
-        return self.file.read(size)
+        if not self.index:
+            return self.file.read(size)
+
+        start = self.file.tell()
+        end = self.index.align(start, start + size)
+        if self.stop is not None:
+            end = min(end, self.stop)
+        return self.file.read(max(end - start, 0))
 
     def close(self):
         try:
@@ -41,89 +118,732 @@ class StreamedFile:
     def __repr__(self):
         return f"<StreamState '{self.track.id}'>"
 
+
+#Stream continuo con las pistas de una playlist una detrás de otra
+class PlaylistStream:
+    def __init__(self, playlist, start_index, tracks_library, media_dir, file_for,
+                 on_track=None, started=True):
+        self.playlist = playlist
+        self.media_dir = media_dir
+        self.on_track = on_track or (lambda track_id: None)  # al empezar cada pista
+        self.boundaries = []
+        self.files = {}  # posición -> (fichero o None si es el original, índice)
+        self.current = None
+
+        offset = 0
+        for i in range(start_index, len(playlist.track_ids)):
+            track = tracks_library[playlist.track_ids[i]]
+            #Fijo el fichero de cada pista al abrir: los offsets valen para todo el stream
+            self.files[i] = file_for(track)
+            self.boundaries.append(Spotifice.TrackBoundary(i, track, offset))
+            offset += self.audio_size(track, *self.files[i])
+
+        self.pending = list(self.boundaries)
+        self.track = self.pending[0].track if self.pending else None
+        self.advance(started)
+
+    def audio_size(self, track, filepath, index):
+        if index:
+            return index.end - index.offsets[0]
+        return (filepath or self.media_dir / track.filename).stat().st_size
+
+    def advance(self, started=True):
+        if self.current:
+            self.current.close()
+            self.current = None
+
+        if not self.pending:
+            return False
+
+        boundary = self.pending.pop(0)
+        self.track = boundary.track
+        filepath, index = self.files[boundary.index]
+        self.current = StreamedFile(self.track, self.media_dir, index, filepath)
+        self.current.trim()
+        logger.debug(f"Playlist '{self.playlist.id}' now streaming '{self.track.id}'")
+        if started:
+            self.on_track(self.track.id)
+        return True
+
+    def resume_at(self, offset):
+        i = max(i for i, b in enumerate(self.boundaries) if b.offset <= offset)
+        self.pending = self.boundaries[i:]
+        self.advance(started=False)  # la pista ya empezó a sonar antes de reanudar
+        self.current.resume_at(offset - self.boundaries[i].offset)
+
+    def read(self, size):
+        while self.current:
+            if data := self.current.read(size):
+                return data
+            self.advance()
+        return b''
+
+    def close(self):
+        if self.current:
+            self.current.close()
+            self.current = None
+
+    @property
+    def index(self):
+        return self.current.index if self.current else None
+
+    def __repr__(self):
+        return f"<PlaylistStream '{self.playlist.id}'>"
+
+
+#Modo fiesta: un único lector del stream que reparte los chunks a todos los suscriptores
+class Broadcast:
+    CHUNK_SIZE = 8192
+    BUFFER_CHUNKS = 64     # ventana de retraso compartida (~32 s a 128 kbps)
+    LEAD_SECS = 2.0        # el lector va este tiempo por delante del tiempo real
+    MAX_SKIPS = 3          # saltos permitidos a un suscriptor lento antes de expulsarlo
+    DEFAULT_KBPS = 128
+
+    def __init__(self, broadcast_id, stream, boundaries, on_empty=None, on_play=None):
+        self.id = broadcast_id
+        self.stream = stream
+        self.boundaries = boundaries
+        self.on_empty = on_empty or (lambda broadcast: None)
+        self.on_play = on_play or (lambda track_id, times: None)
+        stream.on_track = self.track_started
+
+        self.chunks = deque(maxlen=self.BUFFER_CHUNKS)  # (offset, data)
+        self.next_seq = 0     # número de secuencia del próximo chunk
+        self.offset = 0       # bytes leídos del stream
+        self.finished = False
+        self.subscribers = {}  # id -> [cursor, skips]
+        self.waiters = {}      # id -> Ice.Future pendiente
+        self.lock = threading.Lock()
+        self.stop_e = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    #Cada suscriptor oye la pista que empieza: cuenta como una reproducción suya
+    def track_started(self, track_id):
+        with self.lock:
+            listeners = len(self.subscribers)
+        self.on_play(track_id, listeners)
+
+    @property
+    def oldest_seq(self):
+        return self.next_seq - len(self.chunks)
+
+    def run(self):
+        start = time.monotonic()
+        media_secs = 0.0
+
+        while not self.stop_e.is_set():
+            try:
+                data = self.stream.read(self.CHUNK_SIZE)
+            except Exception as e:
+                logger.error(f"Broadcast '{self.id}' read error: {e}")
+                data = b''
+
+            with self.lock:
+                if not data:
+                    self.finished = True
+                else:
+                    self.chunks.append((self.offset, data))
+                    self.next_seq += 1
+                    self.offset += len(data)
+                self.wake_waiters()
+
+            if not data:
+                break
+
+            #Ritmo de tiempo real según el bitrate de la pista que se está leyendo
+            index = self.stream.index
+            kbps = (index and index.bitrate_kbps) or self.DEFAULT_KBPS
+            media_secs += len(data) * 8 / (kbps * 1000)
+            delay = start + media_secs - self.LEAD_SECS - time.monotonic()
+            if delay > 0:
+                self.stop_e.wait(delay)
+
+        self.stream.close()
+        logger.info(f"Broadcast '{self.id}' finished at byte {self.offset}")
+
+    def subscribe(self, subscriber_id):
+        with self.lock:
+            self.subscribers[subscriber_id] = [self.oldest_seq, 0]
+            offset = self.chunks[0][0] if self.chunks else self.offset
+
+        logger.info(f"Broadcast '{self.id}': {len(self.subscribers)} subscribers")
+        return Spotifice.BroadcastInfo(self.id, self.boundaries, offset)
+
+    def unsubscribe(self, subscriber_id):
+        with self.lock:
+            self.subscribers.pop(subscriber_id, None)
+            if future := self.waiters.pop(subscriber_id, None):
+                future.set_result(b'')
+            empty = not self.subscribers
+
+        if empty:
+            self.stop_e.set()
+            self.on_empty(self)
+
+    #Devuelve un Ice.Future; si el suscriptor va al día, se resuelve con el próximo chunk
+    def read(self, subscriber_id):
+        future = Ice.Future()
+        with self.lock:
+            try:
+                data = self.next_chunk(subscriber_id)
+            except Spotifice.StreamError as e:
+                future.set_exception(e)
+                return future
+
+            if data is None:
+                self.waiters[subscriber_id] = future
+            else:
+                future.set_result(data)
+        return future
+
+    def next_chunk(self, subscriber_id):
+        if subscriber_id not in self.subscribers:
+            raise Spotifice.StreamError(self.id, "Not subscribed to broadcast")
+
+        sub = self.subscribers[subscriber_id]
+        if sub[0] < self.oldest_seq:
+            #El suscriptor ha quedado fuera de la ventana: salta adelante o se le expulsa
+            sub[1] += 1
+            if sub[1] > self.MAX_SKIPS:
+                del self.subscribers[subscriber_id]
+                logger.warning(f"Broadcast '{self.id}': dropped slow subscriber")
+                raise Spotifice.StreamError(self.id, "Dropped from broadcast: too slow")
+            sub[0] = self.next_seq - len(self.chunks) // 2
+            logger.info(f"Broadcast '{self.id}': slow subscriber skipped ahead")
+
+        if sub[0] < self.next_seq:
+            data = self.chunks[sub[0] - self.oldest_seq][1]
+            sub[0] += 1
+            return data
+
+        return b'' if self.finished else None
+
+    def wake_waiters(self):
+        for subscriber_id, future in list(self.waiters.items()):
+            try:
+                data = self.next_chunk(subscriber_id)
+            except Spotifice.StreamError as e:
+                del self.waiters[subscriber_id]
+                future.set_exception(e)
+                continue
+
+            if data is not None:
+                del self.waiters[subscriber_id]
+                future.set_result(data)
+
+
+#Lo que ve una sesión suscrita a un broadcast: se comporta como un stream más
+class BroadcastSubscription:
+    def __init__(self, broadcast, subscriber_id):
+        self.broadcast = broadcast
+        self.subscriber_id = subscriber_id
+        self.track = broadcast.stream.track
+        self.info = broadcast.subscribe(subscriber_id)
+
+    def read_async(self):
+        return self.broadcast.read(self.subscriber_id)
+
+    def resume_at(self, offset):
+        raise ValueError("A broadcast can not be seeked")
+
+    def close(self):
+        self.broadcast.unsubscribe(self.subscriber_id)
+
+    def __repr__(self):
+        return f"<BroadcastSubscription '{self.broadcast.id}'>"
+
 #Implemento la nueva interfaz que añade la gestión de sesiones de los usuarios
 class SecureStreamManagerI(Spotifice.SecureStreamManager):
-    def __init__(self, user_info, media_dir, tracks_library):
+    def __init__(self, user_info, media_dir, tracks_library, frame_indexes, playlists,
+                 resume_token="", broadcasts=None, scheduler=None, admission=None,
+                 transcodes=None, free_quality=0, store=None, plays=None):
         self.user = user_info #Guardo la información del usuario de esta sesión para saber quién está escuchando
+        self.resume_token = resume_token #Token para reabrir la sesión en otra réplica
         self.media_dir = media_dir
         self.tracks_library = tracks_library
+        #Caché de índices de frames compartida entre sesiones
+        self.frame_indexes = frame_indexes
+        self.playlists = playlists
+        #Broadcasts activos del servidor
+        self.broadcasts = broadcasts if broadcasts is not None else {}
         self.current_stream = None
+
+        #Cada sesión tiene su cubo de tokens en el planificador del servidor
+        self.session_id = Ice.generateUUID()
+        self.scheduler = scheduler or FairShareScheduler()
+        self.scheduler.register(self.session_id, self.scheduler.weight_for(user_info))
+        ACTIVE_SESSIONS.inc()
+        #Límites de streams y bytes en vuelo
+        self.admission = admission or AdmissionController()
+        #Caché de pistas transcodificadas (None si no hay GStreamer)
+        self.transcodes = transcodes
+        #Tope en kbps para usuarios no premium (0 = sin tope)
+        self.free_quality = free_quality
+        self.store = store #Almacén de playlists editables (None si son de solo lectura)
+        #Registro de reproducciones para la popularidad (None si no se guarda)
+        self.plays = plays
+        self.last_active = time.monotonic() #Para cerrar las sesiones abandonadas
+        self.closed = False
+        #Sesión reanudada tras un failover: el primer stream que abra ya estaba sonando
+        self.resuming = False
         logger.info(f"New session created for user: {user_info.username}")
 
     #Método que devuelve la información del usuario asociado a esta sesión
     def get_user_info(self, current=None):
         return self.user
     
+    def get_resume_token(self, current=None):
+        return self.resume_token
+
     #Método que cierra la sesión del usuario y además limpia la memoria cerrando cualquier stream abierto
     def close(self, current=None):
         logger.info(f"Session closed for user: {self.user.username}")
-        self.close_stream(current)
+        self.release()
         current.adapter.remove(current.id)
 
-    def open_stream(self, track_id, current=None): #Ya no necesito el render_id debido a que cada usuario tiene su propia sesión privada
+    #Libera el stream, su hueco de admisión y el reparto de ancho de banda (una sola vez)
+    def release(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.close_stream()
+        self.scheduler.unregister(self.session_id)
+        ACTIVE_SESSIONS.dec()
+
+    @timed('open_stream')
+    @profiled('server.open_stream')
+    @traced('server.open_stream')
+    #Ya no necesito el render_id debido a que cada usuario tiene su propia sesión privada
+    def open_stream(self, track_id, quality, current=None):
+        self.open_track(track_id, quality)
+        if not self.resumed():
+            self.played(track_id)
+
+    def open_track(self, track_id, quality):
         if track_id not in self.tracks_library:
             raise Spotifice.TrackError(track_id, "Track not found")
 
+        self.admit()
+        if self.current_stream:
+            self.current_stream.close()
+            self.current_stream = None
+
+        track = self.tracks_library[track_id]
+        filepath, index = self.stream_file(track, quality)
+        self.current_stream = StreamedFile(track, self.media_dir, index, filepath)
+        if filepath:
+            logger.info(f"Open stream for track '{track_id}' from '{filepath.name}'")
+        else:
+            logger.info(f"Open stream for track '{track_id}'")
+
+    #Lo que se reabre al reanudar la sesión no es una escucha nueva (solo cuenta una vez)
+    def resumed(self):
+        resuming, self.resuming = self.resuming, False
+        return resuming
+
+    def played(self, track_id, times=1):
+        if self.plays:
+            for _ in range(times):
+                self.plays.record(track_id)
+
+    @property
+    def capped(self):
+        "Whether this session's streams are limited to the FreeQuality cap"
+        return bool(self.free_quality) and not self.user.is_premium
+
+    #Solo transcodifico si la calidad pedida (o el tope) queda por debajo del original
+    def stream_quality(self, quality, index, capped):
+        if capped:
+            if quality > 0:
+                quality = min(quality, self.free_quality)
+            else:
+                quality = self.free_quality
+
+        source_kbps = index.bitrate_kbps if index else 0
+        if quality <= 0 or not self.transcodes or quality >= source_kbps:
+            return 0
+        return snap_quality(quality)
+
+    def stream_file(self, track, quality, capped=None):
+        """(path, frame index) to serve track at quality, with None as path
+        for the original file. The cap waits for its version (the server
+        encodes it ahead of time); a lower quality asked for voluntarily is
+        encoded in the background while the original is served."""
+        capped = self.capped if capped is None else capped
+        index = self.frame_index(track)
+        quality = self.stream_quality(quality, index, capped)
+        if not quality:
+            return None, index
+
+        if not capped and not self.transcodes.cached(track.id, quality):
+            self.transcodes.prefetch(track.id, self.media_dir / track.filename, quality,
+                                     self.frame_indexes.invalidate)
+            return None, index
+        return self.transcoded(track, quality)
+
+    def transcoded(self, track, quality):
+        try:
+            filepath = self.transcodes.get(
+                track.id, self.media_dir / track.filename, quality,
+                self.frame_indexes.invalidate)
+            return filepath, self.frame_indexes.get(filepath.name, filepath)
+        except (TranscodeError, OSError) as e:
+            raise Spotifice.IOError(track.filename, f"Error transcoding media file: {e}")
+
+    #Abro el stream colocándome en el frame MP3 que contiene la posición pedida
+    @timed('open_stream_at')
+    @profiled('server.open_stream_at')
+    @traced('server.open_stream_at')
+    def open_stream_at(self, track_id, position_ms, current=None):
+        if position_ms < 0:
+            raise Spotifice.TrackError(track_id, f"Invalid position: {position_ms} ms")
+
+        #Saltar dentro de la pista (o reanudarla) no es volver a escucharla
+        self.resumed()
+        self.open_track(track_id, 0)
+        index = self.current_stream.index
+        if not index:
+            return 0
+
+        offset, frame_ms = index.offset_at(position_ms)
+        self.current_stream.seek(offset)
+        logger.info(f"Seek '{track_id}' to {frame_ms} ms (byte {offset})")
+        return frame_ms
+
+    #Abro un único stream con todas las pistas de la playlist desde start_index
+    @timed('open_playlist_stream')
+    @profiled('server.open_playlist_stream')
+    @traced('server.open_playlist_stream')
+    def open_playlist_stream(self, playlist_id, start_index, current=None):
+        return self.playlist_stream(playlist_id, start_index, self.capped, self.played,
+                                    started=not self.resumed())
+
+    def playlist_stream(self, playlist_id, start_index, capped, on_track=None,
+                        started=True):
+        if playlist_id not in self.playlists:
+            raise Spotifice.PlaylistError(playlist_id, "Playlist not found")
+
+        playlist = self.playlists[playlist_id]
+        if not 0 <= start_index < len(playlist.track_ids):
+            raise Spotifice.PlaylistError(playlist_id,
+                                          f"Invalid track index: {start_index}")
+
+        self.admit()
         if self.current_stream:
             self.current_stream.close()
+            self.current_stream = None
+
+        try:
+            stream = PlaylistStream(
+                playlist, start_index, self.tracks_library, self.media_dir,
+                lambda track: self.stream_file(track, 0, capped), on_track, started)
+        except OSError as e:
+            raise Spotifice.IOError(playlist_id, f"Error opening playlist stream: {e}")
+
+        self.current_stream = stream
+        logger.info(f"Open playlist stream '{playlist_id}' from track {start_index}")
+        return stream.boundaries
+
+    #Empiezo un broadcast de la playlist al que se pueden unir otras sesiones
+    @timed('open_broadcast')
+    @profiled('server.open_broadcast')
+    def open_broadcast(self, playlist_id, start_index, current=None):
+        #Todos oyen el mismo stream: con tope, va a la calidad que puede oír cualquiera
+        self.playlist_stream(playlist_id, start_index, bool(self.free_quality))
+        stream, self.current_stream = self.current_stream, None
 
-        self.current_stream = StreamedFile(self.tracks_library[track_id], self.media_dir)
+        broadcast = Broadcast(
+            Ice.generateUUID(), stream, stream.boundaries, self.remove_broadcast,
+            self.played)
+        self.broadcasts[broadcast.id] = broadcast
+        broadcast.start()
+        logger.info(f"Broadcast '{broadcast.id}' started for playlist '{playlist_id}'")
 
-        logger.info(f"Open stream for track '{track_id}'")
+        return self.join_broadcast(broadcast.id, current)
+
+    @timed('join_broadcast')
+    @profiled('server.join_broadcast')
+    def join_broadcast(self, broadcast_id, current=None):
+        broadcast = self.broadcasts.get(broadcast_id)
+        if broadcast is None:
+            raise Spotifice.StreamError(broadcast_id, "Broadcast not found")
+
+        self.admit()
+        #Me suscribo antes de soltar el stream anterior: si era el único oyente de este
+        #mismo broadcast, al salir yo se cerraría
+        previous = self.current_stream
+        self.current_stream = BroadcastSubscription(broadcast, Ice.generateUUID())
+        if previous:
+            previous.close()
+
+        #Quien se une empieza a oír la pista que se está emitiendo
+        resumed = self.resumed()
+        rejoined = getattr(previous, 'broadcast', None) is broadcast
+        if broadcast.stream.track and not (rejoined or resumed):
+            self.played(broadcast.stream.track.id)
+        return self.current_stream.info
+
+    #Cada sesión ocupa un hueco de stream mientras tenga uno abierto
+    def admit(self):
+        self.last_active = time.monotonic()
+        retry_after_ms = self.admission.admit(self.session_id, self.user.username)
+        if retry_after_ms:
+            logger.warning(f"Stream rejected for '{self.user.username}': "
+                           f"server over capacity, retry in {retry_after_ms} ms")
+            raise Spotifice.OverloadError(
+                self.user.username, "Server over capacity", retry_after_ms)
+
+    def remove_broadcast(self, broadcast):
+        if self.broadcasts.pop(broadcast.id, None):
+            logger.info(f"Broadcast '{broadcast.id}' closed: no subscribers left")
+
+    #Recoloco el stream en un byte relativo a su inicio (reanudación tras failover)
+    def seek_stream(self, byte_offset, current=None):
+        if not self.current_stream:
+            raise Spotifice.StreamError("Session", "No open stream for render")
+
+        try:
+            self.current_stream.resume_at(byte_offset)
+        except (OSError, ValueError) as e:
+            raise Spotifice.IOError(str(byte_offset), f"Error resuming stream: {e}")
+
+        logger.info(f"Stream {self.current_stream} resumed at byte {byte_offset}")
+
+    def frame_index(self, track):
+        try:
+            return self.frame_indexes.get(track.id, self.media_dir / track.filename)
+        except OSError as e:
+            raise Spotifice.IOError(track.filename, f"Error indexing media file: {e}")
+
+    # ---- PlaylistEditor ----
+    def check_editable(self, playlist_id):
+        if self.store is None:
+            raise Spotifice.PlaylistError(playlist_id,
+                                          "Playlists are read-only on this server")
+        playlist = self.playlists.get(playlist_id)
+        if playlist is None:
+            raise Spotifice.PlaylistError(playlist_id, "Playlist not found")
+        if playlist.owner != self.user.username:
+            raise Spotifice.PlaylistError(playlist_id,
+                                          "Only the owner can edit a playlist")
+
+    def edit_playlist(self, playlist_id, operation, *args):
+        self.check_editable(playlist_id)
+        try:
+            return getattr(self.store, operation)(playlist_id, *args)
+        except KeyError:
+            raise Spotifice.PlaylistError(playlist_id, "Playlist not found")
+        except IndexError as e:
+            raise Spotifice.PlaylistError(playlist_id, str(e))
+
+    @timed('create_playlist')
+    @profiled('server.create_playlist')
+    def create_playlist(self, name, description, current=None):
+        if self.store is None:
+            raise Spotifice.PlaylistError(reason="Playlists are read-only on this server")
+        if not name.strip():
+            raise Spotifice.PlaylistError(reason="A playlist needs a name")
+
+        playlist = Spotifice.Playlist(
+            id=Ice.generateUUID(), name=name, description=description,
+            owner=self.user.username, created_at=int(time.time()), track_ids=[])
+        return self.store.create(playlist)
+
+    @timed('append_track')
+    @profiled('server.append_track')
+    def append_track(self, playlist_id, track_id, current=None):
+        if track_id not in self.tracks_library:
+            raise Spotifice.TrackError(track_id, "Track not found")
+        return self.edit_playlist(playlist_id, 'append', track_id)
+
+    @timed('remove_track')
+    @profiled('server.remove_track')
+    def remove_track(self, playlist_id, index, current=None):
+        return self.edit_playlist(playlist_id, 'remove', index)
+
+    @timed('move_track')
+    @profiled('server.move_track')
+    def move_track(self, playlist_id, from_index, to_index, current=None):
+        return self.edit_playlist(playlist_id, 'move', from_index, to_index)
+
+    @timed('delete_playlist')
+    @profiled('server.delete_playlist')
+    def delete_playlist(self, playlist_id, current=None):
+        self.edit_playlist(playlist_id, 'delete')
 
     def close_stream(self, current=None):
+        self.admission.release(self.session_id)
         if self.current_stream:
             self.current_stream.close()
             self.current_stream=None
             logger.info("Closed stream")
 
+    @timed('get_audio_chunk')
+    @profiled('server.get_audio_chunk')
+    @traced('server.get_audio_chunk')
     def get_audio_chunk(self, chunk_size, current=None):
+        self.last_active = time.monotonic()
         streamed_file = self.current_stream
 
         if not streamed_file:
             raise Spotifice.StreamError("Session", "No open stream for render")
 
+        #En un broadcast el tamaño de chunk lo marca el lector común
+        if isinstance(streamed_file, BroadcastSubscription):
+            future = streamed_file.read_async()
+            future.add_done_callback(
+                lambda f: f.exception() or BYTES_SERVED.inc(len(f.result())))
+            return future
+
         try:
             data = streamed_file.read(chunk_size)
             if not data:
                 logger.info(f"Track exhausted: '{streamed_file.track.id}'")
                 self.close_stream(current)
-            return data
 
         except Exception as e:
             raise Spotifice.IOError(
                 streamed_file.track.filename, f"Error reading file: {e}" 
             )
 
+        BYTES_SERVED.inc(len(data))
+        return self.pace(streamed_file, data)
+
+    #Si la sesión va por delante de su ritmo, respondo más tarde sin bloquear el hilo
+    def pace(self, stream, data):
+        if not data or not self.scheduler.enabled:
+            return data
+
+        index = stream.index
+        delay = self.scheduler.reserve(
+            self.session_id, len(data), index.bitrate_kbps if index else 0)
+        if delay <= 0:
+            return data
+
+        #Mientras esperan su turno, estos bytes cuentan como bytes en vuelo
+        username = self.user.username
+        self.admission.add_in_flight(username, len(data))
+
+        def deliver():
+            self.admission.remove_in_flight(username, len(data))
+            future.set_result(data)
+
+        future = Ice.Future()
+        self.scheduler.schedule(delay, deliver)
+        return future
+
 
 
 
 class MediaServerI(Spotifice.MediaServer):
-    def __init__(self, media_dir, playlist_dir, users_file): #Añado users_file al constructor
+    TOKEN_TTL_SECS = 24 * 3600
+
+    #Añado users_file al constructor
+    def __init__(self, media_dir, playlist_dir, users_file, session_secret=None,
+                 catalog=None, scheduler=None, admission=None, transcodes=None,
+                 free_quality=0, changes=None, playlist_store=None, plays=None):
         self.media_dir = Path(media_dir)
+        #Secreto para firmar los tokens de reanudación; las réplicas deben compartirlo
+        self.session_secret = session_secret or secrets.token_bytes(32)
         self.playlist_dir = Path(playlist_dir)
         self.users_file = Path(users_file) #Guardo la ruta del fichero de usuarios
 
         self.tracks = {}
         self.playlists = {}
         self.users_db = {} 
-        
+        #Índices de frames MP3, se calculan una vez por pista
+        self.frame_indexes = FrameIndexCache()
+        self.broadcasts = {}
+        #Reparto del ancho de banda entre sesiones
+        self.scheduler = scheduler or FairShareScheduler()
+        self.admission = admission or AdmissionController()
+        self.transcodes = transcodes
+        self.free_quality = free_quality
+        #Versión del catálogo y últimos cambios, para los clientes
+        self.changes = changes or ChangeLog()
+        self.catalog_lock = threading.Lock()
+        self.track_pages = PageIndex(self.tracks, self.changes)
+        self.playlist_pages = PageIndex(self.playlists, self.changes)
+        self.store = None
+        self.sessions = {} #Identity -> (adaptador, servant) de las sesiones abiertas
+        self.plays = plays #Reproducciones y popularidad de las pistas
+        self.register_gauges()
+
+        #Los workers cargan el catálogo del supervisor en vez de releer el disco
+        if catalog:
+            self.load_catalog(catalog)
+            return
+
         self.load_media()
         self.load_playlists()  
         self.load_users()
+        if playlist_store:
+            self.open_store(playlist_store)
+
+    #Con almacén, las playlists de disco solo lo siembran la primera vez; luego se editan
+    def open_store(self, path):
+        from_files = dict(self.playlists)
+        self.playlists.clear()
+        self.store = PlaylistStore(
+            path, self.playlists, Spotifice.Playlist,
+            lambda playlist_id: self.changes.record(PLAYLIST, playlist_id))
+        new = not os.path.exists(self.store.snapshot_path) \
+            and not os.path.exists(self.store.journal_path)
+        self.store.open()
+
+        if new:
+            for playlist in from_files.values():
+                self.store.create(playlist)
+
+        #Pistas fuera de la biblioteca: el índice inverso dice qué playlists tocar
+        for track_id in [t for t in self.store.by_track if t not in self.tracks]:
+            self.store.purge_track(track_id)
+
+    #Vuelco pistas, playlists y usuarios a un fichero para compartirlo con los workers
+    def dump_catalog(self, path):
+        catalog = {
+            'tracks': [dict(id=t.id, title=t.title, filename=t.filename)
+                       for t in self.tracks.values()],
+            'playlists': [dict(id=p.id, name=p.name, description=p.description,
+                               owner=p.owner, created_at=p.created_at,
+                               track_ids=list(p.track_ids))
+                          for p in self.playlists.values()],
+            'users': self.users_db,
+        }
+        with open(path, 'w', encoding='utf-8') as fd:
+            json.dump(catalog, fd)
+
+    def load_catalog(self, path):
+        #Cada worker decodifica el fichero a sus propios objetos: no se comparte memoria
+        with open(path, encoding='utf-8') as fd:
+            catalog = json.load(fd)
+
+        for track in catalog['tracks']:
+            self.tracks[track['id']] = Spotifice.TrackInfo(**track)
+        for playlist in catalog['playlists']:
+            self.playlists[playlist['id']] = Spotifice.Playlist(**playlist)
+        self.users_db = catalog['users']
+
+        logger.info(f"Load catalog: {len(self.tracks)} tracks, "
+                    f"{len(self.playlists)} playlists, {len(self.users_db)} users")
 
     def ensure_track_exists(self, track_id):
         if track_id not in self.tracks:
             raise Spotifice.TrackError(track_id, "Track not found")
 
-    def load_media(self):
+    def load_media(self, tracks=None):
+        tracks = self.tracks if tracks is None else tracks
         for filepath in sorted(Path(self.media_dir).iterdir()):
             if not filepath.is_file() or filepath.suffix.lower() != ".mp3":
                 continue
 
-            self.tracks[filepath.name] = self.track_info(filepath)
+            tracks[filepath.name] = self.track_info(filepath)
 
-        logger.info(f"Load media:  {len(self.tracks)} tracks")
+        logger.info(f"Load media:  {len(tracks)} tracks")
+        return tracks
     
     #Método para cargar los usuarios desde el fichero JSON
     def load_users(self):
@@ -160,11 +880,12 @@ class MediaServerI(Spotifice.MediaServer):
             title=filepath.stem,
             filename=filepath.name)
 
-    def load_playlists(self):
+    def load_playlists(self, playlists=None):
+        playlists = self.playlists if playlists is None else playlists
         # Compruebo que la ruta de las playlists existe y es un directorio
         if not self.playlist_dir.exists() or not self.playlist_dir.is_dir(): 
             logger.warning("Playlist directory does not exist or is not a directory.")
-            return
+            return playlists
         #Itero sobre todos los archivos del directorio de playlists
         for filepath in sorted(self.playlist_dir.iterdir()):
             if not filepath.is_file() or filepath.suffix.lower() != ".playlist": #Ignoro los archivos que no son .playlist
@@ -195,11 +916,143 @@ class MediaServerI(Spotifice.MediaServer):
                         created_at=created_at_timestamp,
                         track_ids=valid_track_ids,
                     )
-                    self.playlists[playlist.id] = playlist #Añado la playlist cargada al diccionario del servidor
+                    #Añado la playlist cargada al diccionario del servidor
+                    playlists[playlist.id] = playlist
             except Exception as e:
                 logger.error(f"Error loading playlist from '{filepath.name}': {e}")
         
-        logger.info(f"Load playlists: {len(self.playlists)} playlists")
+        logger.info(f"Load playlists: {len(playlists)} playlists")
+        return playlists
+
+    #Releo el disco y aplico las diferencias, anotando cada una en el log de cambios
+    def rescan(self):
+        removed = self.apply_changes(TRACK, self.tracks, self.load_media({}),
+                                     lambda t: (t.title, t.filename))
+        if self.store is None:
+            self.apply_changes(PLAYLIST, self.playlists, self.load_playlists({}))
+            return
+
+        for track_id in removed:
+            self.store.purge_track(track_id)
+
+    def apply_changes(self, kind, current, fresh, key=lambda item: item):
+        "Make current equal to fresh, recording each difference. Returns the removed ids"
+        with self.catalog_lock:
+            removed = [i for i in current if i not in fresh]
+            for item_id in removed:
+                del current[item_id]
+                self.changes.record(kind, item_id)
+
+            for item_id, item in fresh.items():
+                if item_id not in current or key(current[item_id]) != key(item):
+                    current[item_id] = item
+                    self.changes.record(kind, item_id)
+            return removed
+
+    #Tras un reinicio, indexo las pistas más escuchadas y las subo a la caché del SO
+    def warm_up(self, count, max_secs):
+        if not self.plays or count <= 0:
+            return 0
+
+        start = time.monotonic()
+        warmed = size = 0
+        for track_id in self.plays.top(count):
+            if time.monotonic() - start > max_secs:
+                logger.warning(f"Warm-up stopped after {max_secs} s")
+                break
+            track = self.tracks.get(track_id)
+            if track is None:
+                continue
+            filepath = self.media_dir / track.filename
+            try:
+                size += read_ahead(filepath)
+                self.frame_indexes.get(track.id, filepath)
+            except OSError as e:
+                logger.warning(f"Could not warm up '{track_id}': {e}")
+                continue
+            warmed += 1
+
+        logger.info(f"Warmed up {warmed} popular tracks ({size} bytes) "
+                    f"in {time.monotonic() - start:.2f} s")
+        return warmed
+
+    #Los no premium reciben siempre la versión con tope: la codifico de antemano,
+    #las más escuchadas primero y sin pasar de la mitad del presupuesto de disco
+    def pretranscode(self):
+        if not self.transcodes or not self.free_quality:
+            return
+
+        popular = self.plays.top(len(self.tracks)) if self.plays else []
+        budget = self.transcodes.disk_bytes // 2
+        quality = snap_quality(self.free_quality)
+        for track_id in dict.fromkeys(popular + list(self.tracks)):
+            track = self.tracks.get(track_id)
+            if track is None:
+                continue
+            filepath = self.media_dir / track.filename
+            try:
+                index = self.frame_indexes.get(track.id, filepath)
+            except OSError as e:
+                logger.warning(f"Could not index '{track_id}': {e}")
+                continue
+            if self.free_quality >= index.bitrate_kbps:
+                continue
+
+            budget -= index.duration_ms * quality // 8
+            if budget < 0:
+                break
+            self.transcodes.prefetch(track.id, filepath, quality,
+                                     self.frame_indexes.invalidate)
+
+    #Un render caído o una sesión abandonada en un failover no llaman a close
+    def reap_idle_sessions(self, timeout):
+        now = time.monotonic()
+        for identity, (adapter, servant) in list(self.sessions.items()):
+            if not servant.closed and now - servant.last_active < timeout:
+                continue
+            del self.sessions[identity]
+            if servant.closed:
+                continue
+
+            logger.warning(f"Closing idle session of '{servant.user.username}'")
+            servant.release()
+            try:
+                adapter.remove(identity)
+            except Ice.NotRegisteredException:
+                pass
+
+    def reap_loop(self, timeout, stop_e):
+        while not stop_e.wait(min(timeout / 4, 60)):
+            self.reap_idle_sessions(timeout)
+
+    def rescan_loop(self, interval, stop_e):
+        while not stop_e.wait(interval):
+            try:
+                self.rescan()
+                self.pretranscode()
+            except OSError as e:
+                logger.warning(f"Catalog rescan failed: {e}")
+
+    # ---- CatalogSync ----
+    def get_catalog_changes(self, epoch, since_version, current=None):
+        with self.catalog_lock:
+            version, changed = self.changes.changes_since(epoch, since_version)
+            if changed is None:
+                return Spotifice.CatalogDelta(
+                    self.changes.epoch, version, True, list(self.tracks.values()), [],
+                    list(self.playlists.values()), [])
+
+            delta = Spotifice.CatalogDelta(self.changes.epoch, version, False,
+                                           [], [], [], [])
+            for kind, item_id in sorted(changed):
+                items = self.tracks if kind == TRACK else self.playlists
+                if item_id in items:
+                    updated = delta.tracks if kind == TRACK else delta.playlists
+                    updated.append(items[item_id])
+                else:
+                    (delta.removed_tracks if kind == TRACK
+                     else delta.removed_playlists).append(item_id)
+            return delta
     
     def get_all_playlists(self, current=None):
         # Devuelvo una lista con todas las playlists cargadas
@@ -211,10 +1064,23 @@ class MediaServerI(Spotifice.MediaServer):
             raise Spotifice.PlaylistError(playlist_id, "Playlist not found") #Lanzo la excepcion si no se encuentra
         return self.playlists[playlist_id] #Devuelvo la playlist solicitada
 
+    #Una página del listado, para que un cliente no tenga que traerse el catálogo entero
+    def get_playlists_page(self, offset, count, current=None):
+        playlists, version = self.playlist_pages.page(offset, count)
+        page = [Spotifice.PlaylistSummary(p.id, p.name, len(p.track_ids))
+                for p in playlists]
+        return Spotifice.PlaylistPage(self.changes.epoch, version, len(self.playlists),
+                                      page)
+
     # ---- MusicLibrary ----
     def get_all_tracks(self, current=None):
         return list(self.tracks.values())
 
+    def get_tracks_page(self, offset, count, current=None):
+        tracks, version = self.track_pages.page(offset, count)
+        return Spotifice.TrackPage(self.changes.epoch, version, len(self.tracks), tracks)
+
+    @traced('server.get_track_info')
     def get_track_info(self, track_id, current=None):
         self.ensure_track_exists(track_id)
         return self.tracks[track_id]
@@ -222,6 +1088,9 @@ class MediaServerI(Spotifice.MediaServer):
     # Implementación de AuthManager, que se encarga de verificar las credenciales de los usuarios
 
     #Miro si el usuario existe en mi diccionario de usuarios
+    @timed('authenticate')
+    @profiled('server.authenticate')
+    @traced('server.authenticate')
     def authenticate(self, media_render, username, password, current=None):
         if username not in self.users_db:
             raise Spotifice.AuthError(username, "User not found")
@@ -233,6 +1102,42 @@ class MediaServerI(Spotifice.MediaServer):
         if not secrets.compare_digest(calc, user_data["digest"]): #Comparo los hashes de las contraseñas
             raise Spotifice.AuthError(username, "Invalid password")
         
+        logger.info(f"User '{username}' authenticated successfully")
+        return self.create_session(username, current)
+
+    #Reabro una sesión con el token firmado de otra (puede venir de otra réplica)
+    @timed('resume_session')
+    @profiled('server.resume_session')
+    def resume_session(self, media_render, token, current=None):
+        username = self.verify_token(token)
+        logger.info(f"User '{username}' resumed session")
+        return self.create_session(username, current, resumed=True)
+
+    def issue_token(self, username):
+        payload = f"{username}:{int(time.time()) + self.TOKEN_TTL_SECS}"
+        mac = hmac.new(self.session_secret, payload.encode('utf-8'), hashlib.sha256)
+        return f"{payload}:{mac.hexdigest()}"
+
+    def verify_token(self, token):
+        try:
+            username, expires, mac = token.rsplit(':', 2)
+            expires = int(expires)
+        except ValueError:
+            raise Spotifice.AuthError(reason="Malformed resume token")
+
+        payload = f"{username}:{expires}"
+        expected = hmac.new(self.session_secret, payload.encode('utf-8'), hashlib.sha256)
+        if not secrets.compare_digest(mac, expected.hexdigest()):
+            raise Spotifice.AuthError(username, "Invalid resume token")
+        if expires < time.time():
+            raise Spotifice.AuthError(username, "Expired resume token")
+        if username not in self.users_db:
+            raise Spotifice.AuthError(username, "User not found")
+        return username
+
+    def create_session(self, username, current, resumed=False):
+        user_data = self.users_db[username]
+
         # Si las credenciales son correctas, creo un UserInfo con los datos del usuario
         user_info = Spotifice.UserInfo(
             username=username,
@@ -243,11 +1148,57 @@ class MediaServerI(Spotifice.MediaServer):
         )
         #Aqui creo una factoria de objetos remotos, para ello instancio una nueva clase SecureStreamManagerI exclusiva 
         # para este usuario y la registro dinamicamente en el adaptador de Ice
-        stream_servant = SecureStreamManagerI(user_info, self.media_dir, self.tracks)
-        proxy = current.adapter.addWithUUID(stream_servant) 
-        logger.info(f"User '{username}' authenticated successfully")
+        stream_servant = SecureStreamManagerI(
+            user_info, self.media_dir, self.tracks, self.frame_indexes, self.playlists,
+            self.issue_token(username), self.broadcasts, self.scheduler, self.admission,
+            self.transcodes, self.free_quality, self.store, self.plays)
+        stream_servant.resuming = resumed
+        identity = Ice.Identity(name=Ice.generateUUID())
+        current.adapter.add(stream_servant, identity)
+        self.sessions[identity] = (current.adapter, stream_servant)
+        proxy = self.session_proxy(current.adapter, identity)
 
         return Spotifice.SecureStreamManagerPrx.uncheckedCast(proxy)
+
+    def register_gauges(self):
+        REGISTRY.gauge('spotifice_streams', "Open streams",
+                       func=lambda: self.admission.active_streams)
+        REGISTRY.gauge('spotifice_bytes_in_flight', "Paced bytes waiting to be sent",
+                       func=lambda: self.admission.bytes)
+        REGISTRY.gauge('spotifice_pacing_queue_depth', "Paced responses waiting",
+                       func=lambda: self.scheduler.queue_depth)
+        REGISTRY.counter('spotifice_streams_rejected_total',
+                         "Streams refused by admission control",
+                         func=lambda: self.admission.rejected)
+        REGISTRY.gauge('spotifice_broadcasts', "Active broadcasts",
+                       func=lambda: len(self.broadcasts))
+
+        caches = {'frame_index': lambda: self.frame_indexes,
+                  'transcode': lambda: self.transcodes}
+        for name, cache in caches.items():
+            REGISTRY.counter('spotifice_cache_hits_total', "Cache hits", cache=name,
+                             func=lambda cache=cache: getattr(cache(), 'hits', 0))
+            REGISTRY.counter('spotifice_cache_misses_total', "Cache misses", cache=name,
+                             func=lambda cache=cache: getattr(cache(), 'misses', 0))
+
+    # ---- LoadMonitor ----
+    def get_load(self, current=None):
+        admission = self.admission
+        return Spotifice.ServerLoad(
+            streams=admission.active_streams,
+            max_streams=admission.max_streams,
+            bytes_in_flight=admission.bytes,
+            max_bytes_in_flight=admission.max_bytes,
+            queue_depth=self.scheduler.queue_depth,
+            rejected=admission.rejected)
+
+    #La sesión tiene estado: con réplicas, su proxy apunta a este servidor y no al grupo
+    @staticmethod
+    def session_proxy(adapter, identity):
+        properties = adapter.getCommunicator().getProperties()
+        if properties.getProperty(f'{adapter.getName()}.AdapterId'):
+            return adapter.createIndirectProxy(identity)
+        return adapter.createProxy(identity)
     # # ---- StreamManager ----
     # def open_stream(self, track_id, render_id, current=None):
     #     str_render_id = id2str(render_id)
@@ -286,24 +1237,168 @@ class MediaServerI(Spotifice.MediaServer):
     #         raise Spotifice.IOError(
     #             streamed_file.track.filename, f"Error reading file: {e}")
 
-def main(ic):
-   properties = ic.getProperties()
+def create_servant(properties):
    media_dir = properties.getPropertyWithDefault('MediaServer.Content', 'media')
    playlist_dir = properties.getPropertyWithDefault('MediaServer.Playlists', 'playlists')
    users_file = properties.getPropertyWithDefault('MediaServer.UsersFile', 'users.json')
+   session_secret = properties.getProperty('MediaServer.SessionSecret').encode('utf-8')
+   catalog = properties.getProperty('MediaServer.Catalog')
+
+   #Sin BurstFactor ni MaxBytesPerSec no se limita el ritmo de las sesiones
+   scheduler = FairShareScheduler(
+       properties.getPropertyAsInt('MediaServer.MaxBytesPerSec'),
+       float(properties.getPropertyWithDefault('MediaServer.BurstFactor', '0')),
+       float(properties.getPropertyWithDefault('MediaServer.BurstSecs', '4')),
+       float(properties.getPropertyWithDefault('MediaServer.PremiumWeight', '2')))
+
+   #Con 0 no hay límite; con workers, cada proceso aplica sus propios límites
+   admission = AdmissionController(
+       properties.getPropertyAsInt('MediaServer.MaxStreams'),
+       properties.getPropertyAsInt('MediaServer.MaxStreamsPerUser'),
+       properties.getPropertyAsInt('MediaServer.MaxBytesInFlight'),
+       properties.getPropertyAsInt('MediaServer.MaxBytesInFlightPerUser'))
 
+   transcodes = TranscodeCache(
+       properties.getPropertyWithDefault(
+           'MediaServer.TranscodeDir',
+           os.path.join(tempfile.gettempdir(), 'spotifice-transcode')),
+       properties.getPropertyAsIntWithDefault('MediaServer.TranscodeBytes',
+                                              512 * 1024 * 1024))
+   if not transcodes.available:
+       logger.warning("GStreamer not available: "
+                      "streams are served at their original quality")
+       transcodes = None
+
+   return MediaServerI(
+       Path(media_dir), Path(playlist_dir), Path(users_file), session_secret or None,
+       catalog or None, scheduler, admission, transcodes,
+       properties.getPropertyAsInt('MediaServer.FreeQuality'),
+       ChangeLog(
+           properties.getPropertyAsIntWithDefault('MediaServer.CatalogLogSize', 1000)),
+       properties.getProperty('MediaServer.PlaylistStore') or None,
+       create_play_log(properties))
+
+
+def create_play_log(properties):
+   path = properties.getProperty('MediaServer.PlayLog')
+   if not path:
+       return None
+   return PopularityTracker(
+       path,
+       properties.getPropertyAsIntWithDefault('MediaServer.PopularityHalfLife',
+                                              7 * 24 * 3600),
+       properties.getPropertyAsIntWithDefault('MediaServer.PlayLogBatch', 256)).open()
+
+
+def main(ic):
    adapter = ic.createObjectAdapter("MediaServerAdapter")
-   servant = MediaServerI(Path(media_dir), Path(playlist_dir), Path(users_file))
+   servant = create_servant(ic.getProperties())
+   metrics.install(ic)
+   tracing.install(ic, 'MediaServer')
+   profiling.install(ic, 'MediaServer')
    proxy = adapter.add(servant, ic.stringToIdentity("mediaServer1"))
 
+   #Antes de aceptar clientes: tras un despliegue, las pistas populares no se leen en frío
+   properties = ic.getProperties()
+   servant.warm_up(properties.getPropertyAsIntWithDefault('MediaServer.WarmupTracks', 50),
+                   properties.getPropertyAsIntWithDefault('MediaServer.WarmupSecs', 30))
+   threading.Thread(target=servant.pretranscode, daemon=True).start()
+   idle_timeout = properties.getPropertyAsIntWithDefault(
+       'MediaServer.SessionIdleTimeout', 600)
+   if idle_timeout > 0:
+       threading.Thread(target=servant.reap_loop, args=(idle_timeout, threading.Event()),
+                        daemon=True).start()
+   if servant.plays:
+       flush = properties.getPropertyAsIntWithDefault('MediaServer.PlayLogFlush', 10)
+       threading.Thread(target=servant.plays.run, args=(flush, threading.Event()),
+                        daemon=True).start()
+
+   #Con RescanInterval el servidor recoge pistas y playlists nuevas sin reiniciarse
+   rescan_interval = ic.getProperties().getPropertyAsInt('MediaServer.RescanInterval')
+   if rescan_interval > 0:
+       threading.Thread(target=servant.rescan_loop,
+                        args=(rescan_interval, threading.Event()), daemon=True).start()
+
    logger.info(f"MediaServer: {proxy}")
 
    adapter.activate()
    ic.waitForShutdown()
 
+   if servant.plays:
+       servant.plays.close()
    logger.info("Shutdown")
 
 
+#Modo supervisor: carga el catálogo una vez y lanza K workers con su propio communicator
+def supervise(argv, props, workers):
+   #Todos los workers deben firmar los tokens de reanudación con el mismo secreto
+   if not props.getProperty('MediaServer.SessionSecret'):
+       props.setProperty('MediaServer.SessionSecret', secrets.token_hex(32))
+
+   #En /dev/shm (tmpfs) si existe, para que el fichero del catálogo no toque el disco
+   shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+   fd, catalog = tempfile.mkstemp(prefix='spotifice-catalog-', suffix='.json',
+                                  dir=shm_dir)
+   os.close(fd)
+   #Cada worker lleva su propio log de reproducciones; el supervisor no sirve streams
+   play_log = props.getProperty('MediaServer.PlayLog')
+   props.setProperty('MediaServer.PlayLog', '')
+   trace_file = props.getProperty('Trace.File')
+   create_servant(props).dump_catalog(catalog)
+   props.setProperty('MediaServer.Catalog', catalog)
+
+   #Por defecto lejos de los puertos de los .config (render 10001, admin 10010...)
+   base_port = props.getPropertyAsIntWithDefault('MediaServer.WorkerBasePort', 10100)
+   #Las facetas de admin (métricas, profiler) son de cada proceso: un puerto por worker
+   admin_port = props.getPropertyAsInt('MediaServer.WorkerAdminBasePort')
+   admin_name = props.getPropertyWithDefault('Ice.Admin.InstanceName', 'MediaServer')
+   if not admin_port:
+       props.setProperty('Ice.Admin.Endpoints', '')
+   endpoints = []
+   children = []
+
+   for i in range(workers):
+       props.setProperty('MediaServerAdapter.Endpoints', f'tcp -p {base_port + i}')
+       endpoints.append(f'tcp -p {base_port + i}')
+       if play_log:
+           props.setProperty('MediaServer.PlayLog', f'{play_log}.w{i}')
+       if trace_file:
+           props.setProperty('Trace.File', f'{trace_file}.w{i}')
+       if admin_port:
+           props.setProperty('Ice.Admin.Endpoints',
+                             f'tcp -h 127.0.0.1 -p {admin_port + i}')
+           props.setProperty('Ice.Admin.InstanceName', f'{admin_name}-w{i}')
+
+       pid = os.fork()
+       if pid == 0:
+           init_data = Ice.InitializationData()
+           init_data.properties = props
+           try:
+               with Ice.initialize(argv, init_data) as communicator:
+                   main(communicator)
+           finally:
+               os._exit(0)
+
+       children.append(pid)
+
+   logger.info(f"MediaServer workers: mediaServer1:{':'.join(endpoints)}")
+
+   def terminate(signum, frame):
+       for pid in children:
+           os.kill(pid, signal.SIGTERM)
+
+   signal.signal(signal.SIGTERM, terminate)
+   try:
+       for pid in children:
+           os.waitpid(pid, 0)
+   except KeyboardInterrupt:
+       terminate(signal.SIGINT, None)
+   finally:
+       os.remove(catalog)
+
+   logger.info("Supervisor shutdown")
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         sys.exit("Usage: media_server.py <config-file>")
@@ -318,6 +1413,18 @@ if __name__ == "__main__":
     init_data = Ice.InitializationData()
     init_data.properties = props
 
+    # Con MediaServer.Workers > 1 el proceso actúa como supervisor de workers
+    workers = props.getPropertyAsIntWithDefault('MediaServer.Workers', 1)
+    # Bajo IceGrid solo existe el adaptador declarado en spotifice.xml: se escala con
+    # más instancias del servidor en el grupo de réplicas, no con workers
+    if workers > 1 and props.getProperty('MediaServerAdapter.AdapterId'):
+        logger.warning("MediaServer.Workers is ignored under IceGrid; "
+                       "add server instances to MediaServerGroup instead")
+        workers = 1
+    if workers > 1:
+        supervise(sys.argv, props, workers)
+        sys.exit(0)
+
     try:
         # 4. Inicializar usando esos datos combinados
         with Ice.initialize(sys.argv, init_data) as communicator:
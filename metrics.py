@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+import functools
+import logging
+import os
+import threading
+from bisect import bisect_left
+from time import monotonic
+
+try:
+    import Ice
+
+    import slice_cache
+    Spotifice = slice_cache.load('spotifice_v2.ice')
+except ImportError:
+    Ice = None
+
+logger = logging.getLogger("Metrics")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10)
+
+FACET = 'Spotifice.Metrics'
+
+
+def label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class Counter:
+    "Only goes up: increased by hand, or read from `func` (a running total)"
+    kind = 'counter'
+
+    def __init__(self, func=None):
+        self.value = 0
+        self.func = func
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        value = self.value
+        if self.func:
+            try:
+                value = self.func()
+            except Exception as e:
+                logger.warning(f"Counter {name} failed: {e}")
+        yield name + label_text(labels), value
+
+
+class Gauge:
+    "Set by hand, or read from `func` every time it is collected"
+    kind = 'gauge'
+
+    def __init__(self, func=None):
+        self.value = 0
+        self.func = func
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def samples(self, name, labels):
+        value = self.value
+        if self.func:
+            try:
+                value = self.func()
+            except Exception as e:
+                logger.warning(f"Gauge {name} failed: {e}")
+        yield name + label_text(labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield name + '_bucket' + label_text(labels + (('le', bound),)), cumulative
+        yield name + '_sum' + label_text(labels), self.sum
+        yield name + '_count' + label_text(labels), self.count
+
+
+class Registry:
+    "Named metrics, each with any number of label combinations"
+
+    def __init__(self):
+        self.metrics = {}  # nombre -> (tipo, ayuda, {labels: métrica})
+        self.lock = threading.Lock()
+
+    def get(self, cls, name, help, labels, **kwargs):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            kind, _, series = self.metrics.setdefault(name, (cls.kind, help, {}))
+            if kind != cls.kind:
+                raise ValueError(f"Metric {name} is a {kind}, not a {cls.kind}")
+            if key not in series:
+                series[key] = cls(**kwargs)
+            return series[key]
+
+    def counter(self, name, help='', func=None, **labels):
+        counter = self.get(Counter, name, help, labels)
+        if func:
+            counter.func = func
+        return counter
+
+    def gauge(self, name, help='', func=None, **labels):
+        gauge = self.get(Gauge, name, help, labels)
+        if func:
+            gauge.func = func
+        return gauge
+
+    def histogram(self, name, help='', **labels):
+        return self.get(Histogram, name, help, labels)
+
+    def samples(self):
+        with self.lock:
+            metrics = [(name, kind, help, list(series.items()))
+                       for name, (kind, help, series) in sorted(self.metrics.items())]
+
+        for name, kind, help, series in metrics:
+            for labels, metric in series:
+                for sample in metric.samples(name, labels):
+                    yield name, kind, help, sample
+
+    def values(self):
+        return {key: float(value) for _, _, _, (key, value) in self.samples()}
+
+    def prometheus_text(self):
+        "Prometheus text exposition format"
+        lines = []
+        last = None
+        for name, kind, help, (key, value) in self.samples():
+            if name != last:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                last = name
+            lines.append(f"{key} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as fd:
+            fd.write(self.prometheus_text())
+        os.replace(tmp, path)  # quien lea el fichero nunca ve una escritura a medias
+
+
+REGISTRY = Registry()
+
+
+def timed(operation, registry=REGISTRY):
+    """Time a servant operation into spotifice_rpc_seconds{operation} and
+    count its errors. Works with operations that return an Ice.Future."""
+    def decorator(method):
+        histogram = registry.histogram(
+            'spotifice_rpc_seconds', "Servant dispatch time", operation=operation)
+
+        def error(e):
+            registry.counter('spotifice_rpc_errors_total', "Operations that raised",
+                             operation=operation, error=type(e).__name__).inc()
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = monotonic()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                histogram.observe(monotonic() - start)
+                error(e)
+                raise
+
+            if Ice is not None and isinstance(result, Ice.Future):
+                def done(future):
+                    histogram.observe(monotonic() - start)
+                    if future.exception():
+                        error(future.exception())
+                result.add_done_callback(done)
+            else:
+                histogram.observe(monotonic() - start)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def dump_loop(registry, path, interval, stop_e):
+    while not stop_e.wait(interval):
+        try:
+            registry.dump(path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics to '{path}': {e}")
+
+
+if Ice is not None:
+    class MetricsAdminI(Spotifice.MetricsAdmin):
+        def __init__(self, registry=REGISTRY):
+            self.registry = registry
+
+        def get_values(self, current=None):
+            return self.registry.values()
+
+        def get_prometheus_text(self, current=None):
+            return self.registry.prometheus_text()
+
+
+def install(ic, registry=REGISTRY):
+    """Serve the registry as an admin facet and, if Metrics.File is set,
+    dump it there every Metrics.Interval seconds"""
+    ic.addAdminFacet(MetricsAdminI(registry), FACET)
+
+    properties = ic.getProperties()
+    path = properties.getProperty('Metrics.File')
+    if not path:
+        return None
+
+    stop_e = threading.Event()
+    interval = properties.getPropertyAsIntWithDefault('Metrics.Interval', 15)
+    threading.Thread(target=dump_loop, args=(registry, path, interval, stop_e),
+                     daemon=True).start()
+    logger.info(f"Dumping metrics to '{path}' every {interval} s")
+    return stop_e
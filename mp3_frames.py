@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+from bisect import bisect_right
+
+logger = logging.getLogger("Mp3Frames")
+
+# Tablas de la cabecera MPEG audio, indexadas por (version, layer)
+BITRATES_KBPS = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+
+VERSIONS = {0: 2.5, 2: 2, 3: 1}
+LAYERS = {1: 3, 2: 2, 3: 1}
+
+
+def parse_header(header):
+    "Return (frame_length, samples, sample_rate, bitrate_kbps) or None"
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version = VERSIONS.get((header[1] >> 3) & 0x03)
+    layer = LAYERS.get((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+
+    if version is None or layer is None:
+        return None
+    if bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = BITRATES_KBPS[(min(version, 2), layer)][bitrate_index]
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 1 else 576
+        length = samples // 8 * bitrate * 1000 // sample_rate + padding
+
+    return length, samples, sample_rate, bitrate
+
+
+def id3v2_size(data):
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+class FrameIndex:
+    "Byte offset and start time of every MP3 frame in a file"
+
+    def __init__(self, offsets, times_ms, end, duration_ms):
+        self.offsets = offsets
+        self.times_ms = times_ms
+        self.end = end
+        self.duration_ms = duration_ms
+
+    @classmethod
+    def from_bytes(cls, data):
+        offsets = []
+        times_ms = []
+        elapsed = 0.0
+        pos = id3v2_size(data)
+        end = pos
+
+        while pos + 4 <= len(data):
+            frame = parse_header(data[pos:pos + 4])
+            if frame is None or pos + frame[0] > len(data):
+                # Resincronizo solo mientras no haya frames (basura antes del audio)
+                if offsets:
+                    break
+                pos += 1
+                continue
+
+            length, samples, sample_rate, _ = frame
+            offsets.append(pos)
+            times_ms.append(int(elapsed))
+            elapsed += samples * 1000 / sample_rate
+            pos += length
+            end = pos
+
+        return cls(offsets, times_ms, end, int(elapsed))
+
+    @classmethod
+    def from_file(cls, filepath):
+        with open(filepath, 'rb') as fd:
+            return cls.from_bytes(fd.read())
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def bitrate_kbps(self):
+        if not self.duration_ms:
+            return 0
+        return (self.end - self.offsets[0]) * 8 / self.duration_ms
+
+    def offset_at(self, position_ms):
+        "Return (byte_offset, frame_time_ms) of the frame that contains position_ms"
+        if not self.offsets:
+            return 0, 0
+
+        i = max(bisect_right(self.times_ms, position_ms) - 1, 0)
+        return self.offsets[i], self.times_ms[i]
+
+    def align(self, start, end):
+        "Move end back to a frame boundary, keeping at least one whole frame"
+        if not self.offsets or start >= self.end or end >= self.end:
+            return end
+
+        i = bisect_right(self.offsets, end) - 1
+        if i >= 0 and self.offsets[i] > start:
+            return self.offsets[i]
+
+        # El chunk no llega a contener un frame completo: amplio hasta el siguiente
+        i = bisect_right(self.offsets, start)
+        return self.offsets[i] if i < len(self.offsets) else self.end
+
+
+class FrameIndexCache:
+    "Frame indexes computed once per track and shared by every session"
+
+    def __init__(self):
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, track_id, filepath):
+        with self.lock:
+            if track_id in self.indexes:
+                self.hits += 1
+                return self.indexes[track_id]
+            self.misses += 1
+
+        index = FrameIndex.from_file(filepath)
+        logger.info(f"Indexed '{track_id}': {len(index)} frames, {index.duration_ms} ms")
+
+        with self.lock:
+            return self.indexes.setdefault(track_id, index)
+
+    def invalidate(self, track_id):
+        with self.lock:
+            self.indexes.pop(track_id, None)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+import heapq
+import logging
+import threading
+from time import monotonic
+
+logger = logging.getLogger("Pacing")
+
+
+class TokenBucket:
+    "Bytes allowed at `rate` bytes/s with bursts of up to `burst` bytes"
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = monotonic() if now is None else now
+
+    def take(self, nbytes, now=None):
+        "Consume nbytes and return how many seconds the caller should wait"
+        now = monotonic() if now is None else now
+        if self.rate <= 0:
+            return 0.0
+
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= nbytes
+
+        # Se permite deuda: el siguiente envío espera lo necesario para saldarla
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def fair_rates(demands, capacity):
+    """Weighted max-min share of `capacity` among {sid: (demand, weight)}.
+    A demand of 0 means unlimited."""
+    result = {}
+    remaining = capacity
+    total_weight = sum(weight for _, weight in demands.values())
+
+    # Primero los que piden menos de su parte; lo que no usan se reparte al resto
+    def need(item):
+        demand, weight = item[1]
+        return demand / weight if demand else float('inf')
+
+    for sid, (demand, weight) in sorted(demands.items(), key=need):
+        share = remaining * weight / total_weight if total_weight else 0
+        rate = min(demand, share) if demand else share
+        result[sid] = rate
+        remaining -= rate
+        total_weight -= weight
+
+    return result
+
+
+class SessionShare:
+    def __init__(self, weight, burst_secs):
+        self.weight = weight
+        self.burst_secs = burst_secs
+        self.demand = 0.0
+        self.bucket = None  # se crea con el primer chunk, cuando ya se conoce el bitrate
+        self.last_seen = 0.0
+
+
+class FairShareScheduler:
+    """Per-session token buckets plus a weighted fair share of the server
+    capacity among the sessions that are actively pulling chunks."""
+
+    ACTIVE_SECS = 2.0
+    RECOMPUTE_SECS = 0.5
+
+    def __init__(self, capacity=0, burst_factor=0, burst_secs=4.0, premium_weight=2.0):
+        self.capacity = capacity          # bytes/s de todo el servidor (0 = sin límite)
+        self.burst_factor = burst_factor  # ritmo = bitrate * factor (0 = sin límite)
+        self.burst_secs = burst_secs
+        self.premium_weight = premium_weight  # solo reparte capacity (si no es 0)
+        self.sessions = {}
+        self.shares = {}
+        self.shares_at = 0.0
+        self.lock = threading.Lock()
+
+        self.timers = []  # heap de (instante, seq, función)
+        self.timer_seq = 0
+        self.timer_cond = threading.Condition(self.lock)
+        self.thread = None
+
+    @property
+    def enabled(self):
+        return bool(self.capacity or self.burst_factor)
+
+    def weight_for(self, user):
+        return self.premium_weight if user.is_premium else 1.0
+
+    def register(self, sid, weight=1.0):
+        with self.lock:
+            self.sessions[sid] = SessionShare(weight, self.burst_secs)
+
+    def unregister(self, sid):
+        with self.lock:
+            self.sessions.pop(sid, None)
+            self.shares.pop(sid, None)
+
+    def reserve(self, sid, nbytes, bitrate_kbps, now=None):
+        "Account nbytes sent by sid and return the delay before delivering them"
+        now = monotonic() if now is None else now
+        with self.lock:
+            share = self.sessions.get(sid)
+            if share is None:
+                return 0.0
+
+            share.last_seen = now
+            share.demand = bitrate_kbps * 125 * self.burst_factor  # kbit/s -> bytes/s
+            rate = share.demand
+
+            if self.capacity:
+                if now - self.shares_at > self.RECOMPUTE_SECS or sid not in self.shares:
+                    self.recompute_shares(now)
+                rate = self.shares.get(sid, rate)
+
+            if share.bucket is None:
+                share.bucket = TokenBucket(rate, rate * share.burst_secs, now)
+            elif rate != share.bucket.rate:
+                share.bucket.rate = rate
+                share.bucket.burst = rate * share.burst_secs
+
+            return share.bucket.take(nbytes, now)
+
+    def recompute_shares(self, now):
+        active = {sid: (s.demand, s.weight) for sid, s in self.sessions.items()
+                  if now - s.last_seen < self.ACTIVE_SECS}
+        self.shares = fair_rates(active, self.capacity)
+        self.shares_at = now
+
+    @property
+    def queue_depth(self):
+        "Paced responses waiting for their delivery time"
+        with self.lock:
+            return len(self.timers)
+
+    def schedule(self, delay, func):
+        "Run func after delay seconds in the scheduler thread"
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run_timers, daemon=True)
+                self.thread.start()
+
+            self.timer_seq += 1
+            heapq.heappush(self.timers, (monotonic() + delay, self.timer_seq, func))
+            self.timer_cond.notify()
+
+    def run_timers(self):
+        while True:
+            with self.lock:
+                while not self.timers or self.timers[0][0] > monotonic():
+                    timeout = self.timers[0][0] - monotonic() if self.timers else None
+                    self.timer_cond.wait(timeout)
+                _, _, func = heapq.heappop(self.timers)
+
+            try:
+                func()
+            except Exception as e:
+                logger.error(f"Paced delivery failed: {e}")
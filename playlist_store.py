@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+
+logger = logging.getLogger("PlaylistStore")
+
+FIELDS = ('id', 'name', 'description', 'owner', 'created_at', 'track_ids')
+
+
+def as_dict(playlist):
+    return {field: getattr(playlist, field) for field in FIELDS}
+
+
+class PlaylistStore:
+    """Playlists kept in `playlists` (id -> object built by `factory`) and
+    persisted as a snapshot plus an append-only journal. Every change writes
+    one journal line; after `compact_every` lines the snapshot is rewritten
+    and the journal emptied. Also indexes which playlists contain each track.
+
+    Playlist objects are never modified: each change replaces the object,
+    so readers and open streams keep a consistent copy."""
+
+    def __init__(self, path, playlists, factory, on_change=None, compact_every=1000):
+        self.snapshot_path = f"{path}.snapshot"
+        self.journal_path = f"{path}.journal"
+        self.playlists = playlists
+        self.factory = factory
+        self.on_change = on_change or (lambda playlist_id: None)
+        self.compact_every = compact_every
+        self.by_track = defaultdict(Counter)  # pista -> playlist -> veces que aparece
+        self.journal = None
+        self.journal_entries = 0
+        self.seq = 0  # número de la última entrada aplicada
+        self.lock = threading.Lock()
+
+    def open(self):
+        "Load the snapshot, replay the journal and open it for appending"
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as fd:
+                snapshot = json.load(fd)
+            self.seq = snapshot['seq']
+            for data in snapshot['playlists']:
+                self.put(self.factory(**data))
+
+        if os.path.exists(self.journal_path):
+            self.replay()
+
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        logger.info(f"Playlist store: {len(self.playlists)} playlists, "
+                    f"{self.journal_entries} journal entries")
+        return self
+
+    def replay(self):
+        valid = 0  # bytes del journal hasta la última entrada completa
+        with open(self.journal_path, 'rb') as fd:
+            for line in fd:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    entry = json.loads(line)
+                except ValueError:
+                    # una escritura cortada por una caída: lo anterior sigue siendo válido
+                    logger.warning(
+                        f"Dropping truncated journal entry in {self.journal_path}")
+                    break
+                valid += len(line)
+                self.journal_entries += 1
+                # una compactación interrumpida deja entradas ya incluidas en el snapshot
+                if entry['seq'] <= self.seq:
+                    continue
+                self.apply(entry)
+                self.seq = entry['seq']
+
+        if valid < os.path.getsize(self.journal_path):
+            os.truncate(self.journal_path, valid)
+
+    def close(self):
+        with self.lock:
+            if self.journal:
+                self.journal.close()
+                self.journal = None
+
+    # ---- índice inverso ----
+    def put(self, playlist):
+        # sustituir en el sitio mantiene el orden del catálogo (y de sus páginas)
+        old = self.playlists.get(playlist.id)
+        if old is not None:
+            self.unindex(old)
+        self.playlists[playlist.id] = playlist
+        for track_id in playlist.track_ids:
+            self.by_track[track_id][playlist.id] += 1
+
+    def drop(self, playlist_id):
+        old = self.playlists.pop(playlist_id, None)
+        if old is not None:
+            self.unindex(old)
+
+    def unindex(self, playlist):
+        for track_id in playlist.track_ids:
+            counts = self.by_track[track_id]
+            counts[playlist.id] -= 1
+            if counts[playlist.id] <= 0:
+                del counts[playlist.id]
+            if not counts:
+                del self.by_track[track_id]
+
+    def playlists_with(self, track_id):
+        "Ids of the playlists that contain track_id"
+        with self.lock:
+            return set(self.by_track.get(track_id, ()))
+
+    # ---- operaciones ----
+    def get(self, playlist_id):
+        if playlist_id not in self.playlists:
+            raise KeyError(playlist_id)
+        return self.playlists[playlist_id]
+
+    def replace(self, playlist, **changes):
+        data = as_dict(playlist)
+        data.update(changes)
+        self.put(self.factory(**data))
+
+    def apply(self, entry):
+        "Apply a journal entry to the playlists in memory, raising if it does not fit"
+        op = entry['op']
+        if op == 'create':
+            if entry['playlist']['id'] in self.playlists:
+                raise KeyError(f"Playlist {entry['playlist']['id']} already exists")
+            self.put(self.factory(**entry['playlist']))
+            return [entry['playlist']['id']]
+
+        if op == 'purge_track':
+            affected = list(self.by_track.get(entry['track_id'], ()))
+            for playlist_id in affected:
+                playlist = self.playlists[playlist_id]
+                self.replace(playlist, track_ids=[t for t in playlist.track_ids
+                                                  if t != entry['track_id']])
+            return affected
+
+        playlist = self.get(entry['id'])
+        track_ids = list(playlist.track_ids)
+        if op == 'delete':
+            self.drop(playlist.id)
+        elif op == 'append':
+            track_ids.append(entry['track_id'])
+            self.replace(playlist, track_ids=track_ids)
+        elif op == 'remove':
+            del track_ids[self.index(track_ids, entry['index'])]
+            self.replace(playlist, track_ids=track_ids)
+        elif op == 'move':
+            track_id = track_ids.pop(self.index(track_ids, entry['from']))
+            track_ids.insert(self.index(track_ids + [None], entry['to']), track_id)
+            self.replace(playlist, track_ids=track_ids)
+        else:
+            raise ValueError(f"Unknown journal operation '{op}'")
+        return [playlist.id]
+
+    @staticmethod
+    def index(items, index):
+        if not 0 <= index < len(items):
+            raise IndexError(f"Invalid track index: {index}")
+        return index
+
+    def commit(self, entry):
+        "Apply entry and, if it fits, append it to the journal"
+        with self.lock:
+            affected = self.apply(entry)
+            self.seq += 1
+            entry['seq'] = self.seq
+            self.journal.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            self.journal.flush()
+            self.journal_entries += 1
+            if self.journal_entries >= self.compact_every:
+                self.compact_locked()
+
+        for playlist_id in affected:
+            self.on_change(playlist_id)
+        return affected
+
+    def create(self, playlist):
+        self.commit(dict(op='create', playlist=as_dict(playlist)))
+        return self.playlists[playlist.id]
+
+    def delete(self, playlist_id):
+        self.commit(dict(op='delete', id=playlist_id))
+
+    def append(self, playlist_id, track_id):
+        self.commit(dict(op='append', id=playlist_id, track_id=track_id))
+        return self.playlists[playlist_id]
+
+    def remove(self, playlist_id, index):
+        self.commit(dict(op='remove', id=playlist_id, index=index))
+        return self.playlists[playlist_id]
+
+    def move(self, playlist_id, from_index, to_index):
+        self.commit(dict(op='move', id=playlist_id,
+                         **{'from': from_index, 'to': to_index}))
+        return self.playlists[playlist_id]
+
+    def purge_track(self, track_id):
+        "Remove a track from every playlist that has it. Returns their ids"
+        if not self.playlists_with(track_id):
+            return []
+        return self.commit(dict(op='purge_track', track_id=track_id))
+
+    # ---- compactación ----
+    def compact(self):
+        with self.lock:
+            self.compact_locked()
+
+    def compact_locked(self):
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as fd:
+            playlists = [as_dict(p) for p in self.playlists.values()]
+            json.dump(dict(seq=self.seq, playlists=playlists), fd)
+            fd.flush()
+            os.fsync(fd.fileno())
+        os.replace(tmp, self.snapshot_path)
+
+        self.journal.close()
+        self.journal = open(self.journal_path, 'w', encoding='utf-8')
+        self.journal_entries = 0
+        logger.info(f"Compacted playlist store: {len(self.playlists)} playlists")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger("Popularity")
+
+HALF_LIFE = 7 * 24 * 3600
+MIN_SCORE = 0.01          # por debajo, la pista se olvida
+READ_AHEAD = 1024 * 1024
+
+
+class PlayLog:
+    """Append-only log of play events, one `<unix time> <track id>` line
+    each. Events are buffered and written every `batch_size` plays (or on
+    flush); when the file passes `max_bytes` it is rotated to `<path>.1`."""
+
+    def __init__(self, path, batch_size=256, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.buffer = []
+        self.fd = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        self.fd = open(self.path, 'a', encoding='utf-8')
+        return self
+
+    def append(self, track_id, at):
+        with self.lock:
+            self.buffer.append(f"{int(at)} {track_id}\n")
+            if len(self.buffer) >= self.batch_size:
+                self.flush_locked()
+
+    def flush(self):
+        "Write the buffered events; returns the log size, where the next ones will start"
+        with self.lock:
+            self.flush_locked()
+            if self.fd.tell() >= self.max_bytes:
+                self.fd.close()
+                os.replace(self.path, f"{self.path}.1")
+                self.fd = open(self.path, 'a', encoding='utf-8')
+            return self.fd.tell()
+
+    def flush_locked(self):
+        if self.buffer:
+            self.fd.write(''.join(self.buffer))
+            self.fd.flush()
+            self.buffer = []
+
+    def close(self):
+        with self.lock:
+            if self.fd:
+                self.flush_locked()
+                self.fd.close()
+                self.fd = None
+
+    @staticmethod
+    def read(path, offset=0):
+        "(time, track id) of the events from byte offset, skipping bad lines"
+        with open(path, 'rb') as fd:
+            fd.seek(offset)
+            for line in fd:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    at, _, track_id = line.decode('utf-8').rstrip('\n').partition(' ')
+                    at = int(at)
+                except ValueError:  # también UnicodeDecodeError
+                    track_id = None
+                if not track_id:
+                    logger.warning(f"Skipping corrupt line in {path}: {line!r}")
+                    continue
+                yield at, track_id
+
+
+class PopularityScores:
+    """Play counts that decay exponentially: a play `half_life` seconds old
+    counts half as much as one now. Scores are kept as of time `at`."""
+
+    def __init__(self, half_life=HALF_LIFE, at=None):
+        self.half_life = half_life
+        self.at = time.time() if at is None else at
+        self.scores = defaultdict(float)
+
+    def weight(self, at):
+        return 0.5 ** ((self.at - at) / self.half_life)
+
+    def add(self, track_id, at):
+        self.scores[track_id] += self.weight(at)
+
+    def decay_to(self, now):
+        if now <= self.at:
+            return
+        factor = 0.5 ** ((now - self.at) / self.half_life)
+        for track_id in list(self.scores):
+            self.scores[track_id] *= factor
+            if self.scores[track_id] < MIN_SCORE:
+                del self.scores[track_id]
+        self.at = now
+
+    def top(self, count):
+        return heapq.nlargest(count, self.scores.items(), key=lambda item: item[1])
+
+
+#Registra las reproducciones en el log y, en segundo plano, las suma a las puntuaciones
+class PopularityTracker:
+    def __init__(self, path, half_life=HALF_LIFE, batch_size=256,
+                 max_log_bytes=64 * 1024 * 1024):
+        self.log = PlayLog(path, batch_size, max_log_bytes)
+        self.snapshot_path = f"{path}.scores"
+        self.scores = PopularityScores(half_life)
+        self.pending = []  # (time, track id) aún sin sumar
+        self.lock = threading.Lock()
+
+    def open(self):
+        "Load the last scores and add the plays logged after them"
+        offset = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as fd:
+                snapshot = json.load(fd)
+            self.scores.at = snapshot['at']
+            self.scores.scores.update(snapshot['scores'])
+            offset = snapshot['offset']
+
+        if os.path.exists(self.log.path):
+            # el log ha rotado después de la última foto: empieza de nuevo
+            if offset > os.path.getsize(self.log.path):
+                offset = 0
+            replayed = list(PlayLog.read(self.log.path, offset))
+            self.scores.decay_to(max([self.scores.at] + [at for at, _ in replayed]))
+            for at, track_id in replayed:
+                self.scores.add(track_id, at)
+
+        self.log.open()
+        logger.info(f"Popularity: {len(self.scores.scores)} tracks scored")
+        return self
+
+    def record(self, track_id):
+        now = time.time()
+        with self.lock:
+            self.log.append(track_id, now)
+            self.pending.append((now, track_id))
+
+    def aggregate(self):
+        "Add the pending plays to the scores and save them with the log offset they cover"
+        with self.lock:
+            pending, self.pending = self.pending, []
+            self.scores.decay_to(time.time())
+            for at, track_id in pending:
+                self.scores.add(track_id, at)
+            offset = self.log.flush()
+            snapshot = dict(at=self.scores.at, offset=offset,
+                            scores=dict(self.scores.scores))
+
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as fd:
+            json.dump(snapshot, fd)
+        os.replace(tmp, self.snapshot_path)
+
+    def run(self, interval, stop_e):
+        while not stop_e.wait(interval):
+            try:
+                self.aggregate()
+            except OSError as e:
+                logger.warning(f"Could not save popularity scores: {e}")
+
+    def top(self, count):
+        "Ids of the `count` most popular tracks, most popular first"
+        with self.lock:
+            return [track_id for track_id, _ in self.scores.top(count)]
+
+    def close(self):
+        self.aggregate()
+        self.log.close()
+
+
+def read_ahead(filepath):
+    "Bring a file into the OS page cache; returns its size"
+    with open(filepath, 'rb') as fd:
+        size = os.fstat(fd.fileno()).st_size
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        else:
+            while fd.read(READ_AHEAD):
+                pass
+        return size
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime
+
+try:
+    import Ice
+
+    import slice_cache
+    Spotifice = slice_cache.load('spotifice_v2.ice')
+except ImportError:
+    Ice = None
+
+logger = logging.getLogger("Profiling")
+
+FACET = 'Spotifice.Profiler'
+
+# off, cProfile por operación, muestreo de pilas por operación, tracemalloc del proceso
+MODES = ('off', 'cpu', 'sample', 'memory')
+
+SAMPLE_INTERVAL = 0.005
+MEMORY_FRAMES = 16
+MEMORY_TOP = 50
+UNATTRIBUTED = 'other'
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def folded_stack(frame):
+    "root;...;leaf, as flamegraph.pl and speedscope expect"
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profiler:
+    """Switchable at runtime. Operations wrapped with @profiled are profiled
+    separately; leaving a mode writes one file per operation into a new
+    directory under `directory`."""
+
+    def __init__(self, directory='profiles', process_name=None,
+                 sample_interval=SAMPLE_INTERVAL):
+        self.directory = directory
+        self.process_name = process_name or os.path.basename(sys.argv[0]).split('.')[0]
+        self.sample_interval = sample_interval
+        self.mode = 'off'
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stats = {}                     # operación -> pstats.Stats
+        self.samples = defaultdict(Counter)  # operación -> pila plegada -> muestras
+        self.active = {}                    # hilo -> operación en curso (modo sample)
+        self.skipped = 0                    # llamadas que no se pudieron perfilar
+        self.stop_e = None
+        self.started = None
+
+    def set_mode(self, mode):
+        "Switch to `mode`, returning the files written for the previous one"
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}', expected one of {MODES}")
+
+        with self.lock:
+            if mode == self.mode:
+                return []
+
+            files = self.dump_locked()
+            self.stop_locked()
+            self.mode = mode
+            self.started = datetime.now()
+
+            if mode == 'sample':
+                self.stop_e = threading.Event()
+                threading.Thread(target=self.sample_loop, args=(self.stop_e,),
+                                 name='Profiler-sampler', daemon=True).start()
+            elif mode == 'memory':
+                tracemalloc.start(MEMORY_FRAMES)
+
+        logger.info(f"Profiling mode: {mode}")
+        return files
+
+    def dump(self):
+        "Write what has been collected so far and start collecting afresh"
+        with self.lock:
+            files = self.dump_locked()
+            self.started = datetime.now()
+        return files
+
+    def stop_locked(self):
+        if self.stop_e:
+            self.stop_e.set()
+            self.stop_e = None
+        if self.mode == 'memory':
+            tracemalloc.stop()
+
+    def output_dir(self):
+        stamp = self.started.strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, f"{self.process_name}-{os.getpid()}-{stamp}")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def dump_locked(self):
+        files = []
+        if self.mode == 'cpu':
+            stats, self.stats = self.stats, {}
+            for operation, stat in stats.items():
+                path = os.path.join(self.output_dir(), f"{operation}.prof")
+                stat.dump_stats(path)
+                files.append(path)
+
+        elif self.mode == 'sample':
+            samples, self.samples = self.samples, defaultdict(Counter)
+            for operation, stacks in samples.items():
+                path = os.path.join(self.output_dir(), f"{operation}.folded")
+                with open(path, 'w') as fd:
+                    for stack, count in stacks.most_common():
+                        fd.write(f"{stack} {count}\n")
+                files.append(path)
+
+        elif self.mode == 'memory':
+            #tracemalloc no distingue entre operaciones: una foto de todo el proceso
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)])
+            path = os.path.join(self.output_dir(), "memory.txt")
+            with open(path, 'w') as fd:
+                current, peak = tracemalloc.get_traced_memory()
+                fd.write(f"# traced {current} bytes, peak {peak} bytes\n")
+                for stat in snapshot.statistics('traceback')[:MEMORY_TOP]:
+                    fd.write(f"{stat}\n")
+                    fd.writelines(f"    {line}\n" for line in stat.traceback.format())
+            snapshot.dump(os.path.join(os.path.dirname(path), "memory.snapshot"))
+            files.append(path)
+
+        if files:
+            logger.info(f"Profiles written to {os.path.dirname(files[0])}")
+        return files
+
+    def call(self, operation, method, args, kwargs):
+        mode = self.mode
+        #Una operación perfilada dentro de otra cuenta como parte de la de fuera
+        if mode not in ('cpu', 'sample') or getattr(self.local, 'operation', None):
+            return method(*args, **kwargs)
+
+        self.local.operation = operation
+        try:
+            if mode == 'sample':
+                return self.call_sampled(operation, method, args, kwargs)
+            return self.call_profiled(operation, method, args, kwargs)
+        finally:
+            self.local.operation = None
+
+    def call_sampled(self, operation, method, args, kwargs):
+        thread = threading.get_ident()
+        self.active[thread] = operation
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self.active.pop(thread, None)
+
+    def call_profiled(self, operation, method, args, kwargs):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # desde 3.12 solo puede haber un profiler activo a la vez en el proceso
+            self.skipped += 1
+            return method(*args, **kwargs)
+
+        try:
+            return method(*args, **kwargs)
+        finally:
+            profile.disable()
+            stats = pstats.Stats(profile)
+            with self.lock:
+                if self.mode == 'cpu':
+                    if operation in self.stats:
+                        self.stats[operation].add(stats)
+                    else:
+                        self.stats[operation] = stats
+
+    def sample_loop(self, stop_e):
+        me = threading.get_ident()
+        while not stop_e.wait(self.sample_interval):
+            active = dict(self.active)
+            for thread, frame in sys._current_frames().items():
+                if thread == me:
+                    continue
+                operation = active.get(thread, UNATTRIBUTED)
+                self.samples[operation][folded_stack(frame)] += 1
+
+
+PROFILER = Profiler()
+
+
+def profiled(operation, profiler=PROFILER):
+    "Profile every call of a servant operation (or callback) as `operation`"
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if profiler.mode == 'off':
+                return method(*args, **kwargs)
+            return profiler.call(operation, method, args, kwargs)
+        return wrapper
+    return decorator
+
+
+if Ice is not None:
+    class ProfilerAdminI(Spotifice.ProfilerAdmin):
+        def __init__(self, profiler=PROFILER):
+            self.profiler = profiler
+
+        def set_mode(self, mode, current=None):
+            try:
+                return self.profiler.set_mode(mode)
+            except (ValueError, OSError) as e:
+                raise Spotifice.Error(reason=str(e))
+
+        def get_mode(self, current=None):
+            return self.profiler.mode
+
+        def dump(self, current=None):
+            try:
+                return self.profiler.dump()
+            except OSError as e:
+                raise Spotifice.Error(reason=str(e))
+
+    #Ice 3.7 solo acepta callbacks de la faceta Properties que hereden de esta clase
+    class ModeUpdateCallback(Ice.PropertiesAdminUpdateCallback):
+        def __init__(self, set_mode):
+            self.set_mode = set_mode
+
+        def updated(self, changes):
+            if 'Profiling.Mode' in changes:
+                self.set_mode(changes['Profiling.Mode'])
+
+
+def install(ic, process_name, profiler=PROFILER):
+    """Serve the profiler as an admin facet and follow Profiling.Mode, also
+    when it is changed at runtime through the Properties admin facet"""
+    properties = ic.getProperties()
+    profiler.process_name = process_name
+    profiler.directory = properties.getPropertyWithDefault('Profiling.Dir', 'profiles')
+    interval = properties.getPropertyAsInt('Profiling.SampleIntervalMs')
+    if interval > 0:
+        profiler.sample_interval = interval / 1000
+
+    ic.addAdminFacet(ProfilerAdminI(profiler), FACET)
+
+    def set_mode(mode):
+        try:
+            profiler.set_mode(mode or 'off')
+        except (ValueError, OSError) as e:
+            logger.error(f"Profiling.Mode: {e}")
+
+    admin = ic.findAdminFacet('Properties')
+    if admin is not None:
+        admin.addUpdateCallback(ModeUpdateCallback(set_mode))
+
+    set_mode(properties.getProperty('Profiling.Mode'))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import hashlib
+import importlib
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import monotonic
+
+import Ice
+
+logger = logging.getLogger("SliceCache")
+
+HERE = Path(__file__).resolve().parent
+CACHE_DIR = Path(os.environ.get('SPOTIFICE_SLICE_CACHE', HERE / '.slice-cache'))
+DISABLE_ENV = 'SPOTIFICE_NO_SLICE_CACHE'
+SLICE_FILES = ['spotifice_v1.ice', 'spotifice_v2.ice']
+
+
+def slice_hash(ice_file):
+    "Changes with the .ice contents and with the Ice version that generates the code"
+    digest = hashlib.sha256(Path(ice_file).read_bytes())
+    digest.update(Ice.stringVersion().encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_path(ice_file):
+    ice_file = Path(ice_file)
+    return CACHE_DIR / f"{ice_file.stem}-{slice_hash(ice_file)}"
+
+
+def load(ice_file, module='Spotifice'):
+    """Import the code slice2py generated for ice_file (see `make slices`),
+    or parse it with Ice.loadSlice if there is none for its current hash"""
+    ice_file = HERE / ice_file
+    path = cache_path(ice_file)
+
+    if os.environ.get(DISABLE_ENV) or not path.is_dir():
+        if not os.environ.get(DISABLE_ENV):
+            logger.debug(f"No precompiled code for {ice_file.name}, using loadSlice")
+        Ice.loadSlice(f'-I{Ice.getSliceDir()} {ice_file}')
+        return importlib.import_module(module)
+
+    #Importo el *_ice.py y no el paquete: así v1 y v2 completan el mismo módulo Spotifice
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+    importlib.import_module(f"{ice_file.stem}_ice")
+    #El código generado deja el módulo en Ice._pendingModules hasta que se publica
+    Ice.updateModules()
+    return sys.modules[module]
+
+
+def build(ice_file):
+    "Generate the code for ice_file into its cache directory, dropping stale ones"
+    ice_file = HERE / ice_file
+    path = cache_path(ice_file)
+    if path.is_dir():
+        return path
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=CACHE_DIR, prefix='.build-')
+    try:
+        import IcePy
+        status = IcePy.compile(['slice2py', f'-I{Ice.getSliceDir()}', '--output-dir', tmp,
+                                str(ice_file)])
+        if status != 0:
+            raise RuntimeError(f"slice2py failed for {ice_file.name} ({status})")
+        try:
+            os.rename(tmp, path)  # quien cargue a la vez lo ve completo o no lo ve
+        except OSError:
+            #Otro proceso ha generado el mismo directorio antes: vale el suyo
+            if not path.is_dir():
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for stale in CACHE_DIR.glob(f"{ice_file.stem}-*"):
+        if stale != path:
+            shutil.rmtree(stale, ignore_errors=True)
+    return path
+
+
+#Arranque en frío: un intérprete nuevo cada vez, con y sin el código precompilado
+def measure_cold_start(module='media_server', runs=10):
+    results = {}
+    for name, disabled in (('precompiled', ''), ('loadSlice', '1')):
+        env = dict(os.environ, **{DISABLE_ENV: disabled})
+        samples = []
+        for _ in range(runs):
+            start = monotonic()
+            subprocess.run([sys.executable, '-c', f'import {module}'], cwd=HERE, env=env,
+                           check=True, stderr=subprocess.DEVNULL)
+            samples.append(monotonic() - start)
+        results[name] = dict(median_ms=round(statistics.median(samples) * 1000, 1),
+                             min_ms=round(min(samples) * 1000, 1), runs=runs)
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:2] == ['bench']:
+        for ice_file in SLICE_FILES:
+            build(ice_file)
+        for name, result in measure_cold_start(*sys.argv[2:3]).items():
+            print(f"{name:>12}: {result['median_ms']} ms (min {result['min_ms']} ms)")
+    else:
+        for ice_file in sys.argv[1:] or SLICE_FILES:
+            logger.info(f"{ice_file} -> {build(ice_file)}")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+from collections import Counter, defaultdict
+from time import monotonic
+
+import Ice
+
+import slice_cache
+from benchmark import percentiles
+from mp3_frames import FrameIndex
+
+Spotifice = slice_cache.load('spotifice_v2.ice')
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("SpotificeLoad")
+
+DEFAULT_KBPS = 128
+PREBUFFER_SECS = 2.0  # lo que un oyente puede ir por delante de la reproducción
+
+
+class LoadStats:
+    def __init__(self):
+        self.started = monotonic()
+        self.latencies = defaultdict(list)  # operación -> segundos
+        self.calls = Counter()
+        self.errors = Counter()             # tipo de error -> veces
+        self.bytes = 0
+        self.late_chunks = 0                # chunks que llegan cuando ya deberían sonar
+        self.active = 0
+        self.tracks = 0
+        self.skips = 0
+
+    async def call(self, name, future):
+        "Await an AMI future, timing it as operation `name`"
+        start = monotonic()
+        self.calls[name] += 1
+        try:
+            return await Ice.wrap_future(future)
+        except Ice.Exception as e:
+            self.errors[type(e).__name__] += 1
+            raise
+        finally:
+            self.latencies[name].append(monotonic() - start)
+
+    def report(self):
+        elapsed = monotonic() - self.started
+        calls = sum(self.calls.values())
+        errors = sum(self.errors.values())
+        return dict(
+            elapsed_secs=round(elapsed, 1),
+            active_sessions=self.active,
+            mb_per_sec=round(self.bytes / elapsed / 1e6, 3),
+            calls_per_sec=round(calls / elapsed, 1),
+            error_rate=round(errors / calls, 4) if calls else 0,
+            errors=dict(self.errors),
+            late_chunks=self.late_chunks,
+            tracks=self.tracks,
+            skips=self.skips,
+            latency_ms={name: percentiles(samples)
+                        for name, samples in self.latencies.items()})
+
+    def summary(self):
+        chunk = percentiles(self.latencies['get_audio_chunk'])
+        elapsed = monotonic() - self.started
+        return (f"{elapsed:6.1f}s sessions={self.active} "
+                f"{self.bytes / elapsed / 1e6:.2f} MB/s "
+                f"errors={sum(self.errors.values())} "
+                f"late={self.late_chunks} chunk p99={chunk.get('p99')} ms")
+
+
+#Un oyente simulado: se autentica y escucha pistas o playlists al ritmo real del MP3
+class Listener:
+    def __init__(self, server, args, catalog, stats, rng):
+        self.server = server
+        self.args = args
+        self.tracks, self.playlists = catalog
+        self.stats = stats
+        self.rng = rng
+        self.session = None
+
+    async def run(self, deadline):
+        stats = self.stats
+        try:
+            self.session = await stats.call('authenticate', self.server.authenticateAsync(
+                None, self.args.username, self.args.password))
+        except Ice.Exception:
+            return
+
+        stats.active += 1
+        try:
+            while monotonic() < deadline:
+                try:
+                    await self.listen(deadline)
+                except Spotifice.OverloadError as e:
+                    delay = e.retry_after_ms / 1000 * self.rng.uniform(0.5, 1.5)
+                    await asyncio.sleep(delay)
+                except Ice.Exception:
+                    await asyncio.sleep(1)
+        finally:
+            stats.active -= 1
+            try:
+                await stats.call('close', self.session.closeAsync())
+            except Ice.Exception:
+                pass
+
+    async def listen(self, deadline):
+        if self.playlists and self.rng.random() < self.args.playlist_ratio:
+            playlist = self.rng.choice(self.playlists)
+            await self.stats.call('open_playlist_stream',
+                                  self.session.open_playlist_streamAsync(playlist.id, 0))
+        else:
+            track = self.rng.choice(self.tracks)
+            await self.stats.call(
+                'open_stream', self.session.open_streamAsync(track.id, self.args.quality))
+
+        self.stats.tracks += 1
+        skip_at = None
+        if self.rng.random() < self.args.skip_ratio:
+            skip_at = self.rng.uniform(1, self.args.skip_after)
+
+        await self.stream(deadline, skip_at)
+
+    #Pido chunks sin adelantarme más de PREBUFFER_SECS a lo que ya habría sonado
+    async def stream(self, deadline, skip_at):
+        start = monotonic()
+        received = 0
+        kbps = 0
+
+        while monotonic() < deadline:
+            chunk = await self.stats.call(
+                'get_audio_chunk',
+                self.session.get_audio_chunkAsync(self.args.chunk_size))
+            if not chunk:
+                return
+
+            if not kbps:
+                kbps = FrameIndex.from_bytes(chunk).bitrate_kbps or DEFAULT_KBPS
+
+            #Si lo recibido ya se habría acabado de reproducir, un oyente tendría un corte
+            played = monotonic() - start
+            if received and received * 8 / (kbps * 1000) < played:
+                self.stats.late_chunks += 1
+
+            received += len(chunk)
+            self.stats.bytes += len(chunk)
+
+            if skip_at is not None and played >= skip_at:
+                self.stats.skips += 1
+                return
+
+            ahead = received * 8 / (kbps * 1000) - played - PREBUFFER_SECS
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+
+
+async def run_load(server, args):
+    catalog = (await Ice.wrap_future(server.get_all_tracksAsync()),
+               await Ice.wrap_future(server.get_all_playlistsAsync()))
+    if not catalog[0]:
+        raise RuntimeError("The server has no tracks")
+
+    stats = LoadStats()
+    rng = random.Random(args.seed)
+    deadline = monotonic() + args.duration
+
+    #Reparto las sesiones entre varias conexiones para no serializarlas en una sola
+    proxies = [server.ice_connectionId(f'load-{i}') for i in range(args.connections)]
+
+    async def report_loop():
+        while monotonic() < deadline:
+            await asyncio.sleep(args.report_interval)
+            logger.info(stats.summary())
+
+    async def spawn():
+        tasks = []
+        for i in range(args.sessions):
+            listener = Listener(proxies[i % len(proxies)], args, catalog, stats,
+                                random.Random(rng.random()))
+            tasks.append(asyncio.create_task(listener.run(deadline)))
+            await asyncio.sleep(args.ramp_up / args.sessions)
+        await asyncio.gather(*tasks)
+
+    reporter = asyncio.create_task(report_loop())
+    await spawn()
+    reporter.cancel()
+    return stats.report()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Simulated listeners for a MediaServer")
+    parser.add_argument('proxy', nargs='?', default='mediaServer1:tcp -p 10000',
+                        help="MediaServer proxy")
+    parser.add_argument('-n', '--sessions', type=int, default=100)
+    parser.add_argument('-d', '--duration', type=float, default=60)
+    parser.add_argument('--ramp-up', type=float, default=10,
+                        help="seconds to start every session")
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--chunk-size', type=int, default=8192)
+    parser.add_argument('--quality', type=int, default=0, help="kbps, 0 for original")
+    parser.add_argument('--playlist-ratio', type=float, default=0.3,
+                        help="fraction of plays that open a playlist")
+    parser.add_argument('--skip-ratio', type=float, default=0.2,
+                        help="fraction of plays skipped before the end")
+    parser.add_argument('--skip-after', type=float, default=30,
+                        help="skips happen before this many seconds")
+    #Los límites por usuario del servidor (MaxStreamsPerUser) cuentan todas estas sesiones
+    parser.add_argument('--username', default='user',
+                        help="all sessions log in as this user (make run-server-load)")
+    parser.add_argument('--password', default='secret')
+    parser.add_argument('--report-interval', type=float, default=5)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('-o', '--output', help="write the final report as JSON")
+    args, ice_args = parser.parse_known_args(argv)
+
+    with Ice.initialize(ice_args) as communicator:
+        server = Spotifice.MediaServerPrx.checkedCast(
+            communicator.stringToProxy(args.proxy))
+        if server is None:
+            sys.exit(f"Not a MediaServer: {args.proxy}")
+
+        report = asyncio.run(run_load(server, args))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump(report, fd, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+
+import sys
+
+import Ice
+
+import slice_cache
+
+Spotifice = slice_cache.load('spotifice_v2.ice')
+
+from metrics import FACET  # noqa: E402
+
+
+#Lee las métricas de un proceso a través de su objeto admin de Ice
+def main(argv):
+    if len(argv) < 2:
+        sys.exit("Usage: spotifice_metrics.py "
+                 "'<instance>/admin:tcp -h 127.0.0.1 -p <port>'")
+
+    with Ice.initialize(argv) as communicator:
+        admin = communicator.stringToProxy(argv[1]).ice_facet(FACET)
+        metrics = Spotifice.MetricsAdminPrx.checkedCast(admin)
+        if metrics is None:
+            sys.exit(f"No {FACET} facet at {argv[1]}")
+        print(metrics.get_prometheus_text(), end='')
+
+
+if __name__ == "__main__":
+    main(sys.argv)
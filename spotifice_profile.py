@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+import sys
+
+import Ice
+
+import slice_cache
+
+Spotifice = slice_cache.load('spotifice_v2.ice')
+
+from profiling import FACET, MODES  # noqa: E402
+
+
+#Cambia el modo de profiling de un proceso en marcha a través de su objeto admin de Ice
+def main(argv):
+    commands = MODES + ('dump', 'status')
+    if len(argv) < 3 or argv[2] not in commands:
+        sys.exit("Usage: spotifice_profile.py "
+                 "'<instance>/admin:tcp -h 127.0.0.1 -p <port>' "
+                 f"{'|'.join(commands)}")
+
+    with Ice.initialize(argv) as communicator:
+        admin = communicator.stringToProxy(argv[1]).ice_facet(FACET)
+        profiler = Spotifice.ProfilerAdminPrx.checkedCast(admin)
+        if profiler is None:
+            sys.exit(f"No {FACET} facet at {argv[1]}")
+
+        command = argv[2]
+        if command == 'status':
+            print(profiler.get_mode())
+            return
+
+        files = profiler.dump() if command == 'dump' else profiler.set_mode(command)
+        for path in files:
+            print(path)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
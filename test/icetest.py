@@ -1,4 +1,8 @@
 import logging
+import os
+import subprocess
+import sys
+import tempfile
 import time
 from functools import cached_property
 from threading import Thread
@@ -6,6 +10,8 @@ from unittest import TestCase
 
 import Ice
 
+from impairment import ImpairedProxy, Impairments
+
 
 class IceTestCase(TestCase):
     def ice_initialize_with_props(self, props_dict):
@@ -56,3 +62,29 @@ class IceTestCase(TestCase):
         thread.join(3)
         if thread.is_alive():
             logging.warning("Thread could not be joined in time")
+
+    #Proxy TCP con latencia/jitter/ancho de banda/cortes delante de target_port
+    def create_impaired_proxy(self, target_port, **impairments):
+        proxy = ImpairedProxy(target_port, Impairments(**impairments)).start()
+        self.addCleanup(proxy.stop)
+        return proxy
+
+    def create_server_process(self, script, props):
+        fd, config = tempfile.mkstemp(suffix='.config')
+        with os.fdopen(fd, 'w') as f:
+            for k, v in props.items():
+                f.write(f'{k}={v}\n')
+        self.addCleanup(os.remove, config)
+
+        process = subprocess.Popen([sys.executable, script, config])
+        self.addCleanup(self.process_shutdown, process)
+        return process
+
+    @staticmethod
+    def process_shutdown(process):
+        process.terminate()
+        try:
+            process.wait(3)
+        except subprocess.TimeoutExpired:
+            logging.warning("Process could not be terminated in time")
+            process.kill()
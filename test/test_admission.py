@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+from admission import AdmissionController
+
+
+class AdmissionControllerTests(TestCase):
+    def test_unlimited_by_default(self):
+        admission = AdmissionController()
+        for i in range(100):
+            self.assertEqual(admission.admit(f's{i}', 'user'), 0)
+        self.assertEqual(admission.active_streams, 100)
+
+    def test_max_streams(self):
+        admission = AdmissionController(max_streams=2)
+        self.assertEqual(admission.admit('s1', 'ana'), 0)
+        self.assertEqual(admission.admit('s2', 'bob'), 0)
+        self.assertGreater(admission.admit('s3', 'eva'), 0)
+        self.assertEqual(admission.rejected, 1)
+
+    def test_same_session_does_not_count_twice(self):
+        admission = AdmissionController(max_streams=1)
+        self.assertEqual(admission.admit('s1', 'ana'), 0)
+        self.assertEqual(admission.admit('s1', 'ana'), 0)
+
+    def test_max_streams_per_user(self):
+        admission = AdmissionController(max_streams_per_user=1)
+        self.assertEqual(admission.admit('s1', 'ana'), 0)
+        self.assertGreater(admission.admit('s2', 'ana'), 0)
+        self.assertEqual(admission.admit('s3', 'bob'), 0)
+
+    def test_release(self):
+        admission = AdmissionController(max_streams=1)
+        admission.admit('s1', 'ana')
+        admission.release('s1')
+        self.assertEqual(admission.admit('s2', 'bob'), 0)
+
+    def test_bytes_in_flight(self):
+        admission = AdmissionController(max_bytes=1000)
+        admission.add_in_flight('ana', 3000)
+        retry_after_ms = admission.admit('s1', 'bob')
+        self.assertEqual(retry_after_ms, 3 * AdmissionController.RETRY_AFTER_MS)
+
+        admission.remove_in_flight('ana', 3000)
+        self.assertEqual(admission.admit('s1', 'bob'), 0)
+
+    def test_retry_after_is_capped(self):
+        admission = AdmissionController(max_bytes=1)
+        admission.add_in_flight('ana', 10 ** 9)
+        self.assertEqual(admission.admit('s1', 'bob'),
+                         AdmissionController.MAX_RETRY_AFTER_MS)
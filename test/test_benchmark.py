@@ -0,0 +1,16 @@
+from unittest import TestCase
+
+from benchmark import percentiles
+
+
+class PercentilesTests(TestCase):
+    def test_empty(self):
+        self.assertEqual(percentiles([]), {})
+
+    def test_milliseconds(self):
+        result = percentiles([i / 1000 for i in range(1, 101)])
+
+        self.assertEqual(result['p50'], 51)
+        self.assertEqual(result['p99'], 100)
+        self.assertEqual(result['max'], 100)
+        self.assertEqual(result['count'], 100)
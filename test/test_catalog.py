@@ -0,0 +1,88 @@
+from types import SimpleNamespace as Item
+from unittest import TestCase
+
+from catalog import PLAYLIST, TRACK, CatalogReplica, ChangeLog
+
+
+def delta(version, full=False, tracks=(), removed_tracks=(), playlists=(),
+          removed_playlists=(), epoch='e1'):
+    return Item(epoch=epoch, version=version, full=full, tracks=list(tracks),
+                removed_tracks=list(removed_tracks), playlists=list(playlists),
+                removed_playlists=list(removed_playlists))
+
+
+class ChangeLogTests(TestCase):
+    def test_nothing_changed(self):
+        log = ChangeLog(version=10, epoch='e1')
+        self.assertEqual(log.changes_since('e1', 10), (10, set()))
+
+    def test_changes_since(self):
+        log = ChangeLog(version=10, epoch='e1')
+        log.record(TRACK, 'a.mp3')
+        log.record(PLAYLIST, 'p1')
+        log.record(TRACK, 'a.mp3')
+
+        self.assertEqual(log.changes_since('e1', 10),
+                         (13, {(TRACK, 'a.mp3'), (PLAYLIST, 'p1')}))
+        self.assertEqual(log.changes_since('e1', 12), (13, {(TRACK, 'a.mp3')}))
+
+    def test_truncated_log(self):
+        log = ChangeLog(max_entries=2, version=10, epoch='e1')
+        for name in 'abc':
+            log.record(TRACK, name)
+
+        self.assertIsNone(log.changes_since('e1', 10)[1])
+        self.assertEqual(log.changes_since('e1', 11), (13, {(TRACK, 'b'), (TRACK, 'c')}))
+
+    def test_unknown_version(self):
+        log = ChangeLog(version=10, epoch='e1')
+        self.assertIsNone(log.changes_since('e1', 0)[1])
+        self.assertIsNone(log.changes_since('e1', 99)[1])
+
+    def test_other_epoch(self):
+        #Otro proceso con versiones que se solapan con las nuestras
+        log = ChangeLog(version=998, epoch='e1')
+        for name in ['t1', 't2', 'y', 'z']:
+            log.record(TRACK, name)
+
+        self.assertIsNone(log.changes_since('e2', 1001)[1])
+        self.assertIsNone(log.changes_since('', 0)[1])
+
+
+class CatalogReplicaTests(TestCase):
+    def test_full_then_delta(self):
+        replica = CatalogReplica()
+        replica.apply(delta(5, full=True, tracks=[Item(id='a'), Item(id='b')],
+                            playlists=[Item(id='p1')]))
+        replica.apply(delta(6, tracks=[Item(id='c')], removed_tracks=['a'],
+                            removed_playlists=['p1']))
+
+        self.assertEqual(replica.version, 6)
+        self.assertEqual(sorted(replica.tracks), ['b', 'c'])
+        self.assertEqual(replica.playlists, {})
+
+    def test_stale_delta_ignored(self):
+        replica = CatalogReplica()
+        replica.apply(delta(7, full=True, tracks=[Item(id='b')]))
+        replica.apply(delta(6, tracks=[Item(id='a')]))
+
+        self.assertEqual(list(replica.tracks), ['b'])
+
+    def test_full_snapshot_of_new_epoch(self):
+        replica = CatalogReplica()
+        replica.apply(delta(7, full=True, tracks=[Item(id='b')]))
+        replica.apply(delta(3, full=True, tracks=[Item(id='a')], epoch='e2'))
+
+        self.assertEqual((replica.epoch, replica.version), ('e2', 3))
+        self.assertEqual(list(replica.tracks), ['a'])
+
+    def test_sync_rate_limited(self):
+        calls = []
+        server = Item(
+            get_catalog_changes=lambda e, v: calls.append(v) or delta(v + 1, full=not e))
+        replica = CatalogReplica(refresh_secs=60)
+
+        replica.sync(server)
+        replica.sync(server)
+        replica.sync(server, force=True)
+        self.assertEqual(calls, [0, 1])
@@ -0,0 +1,54 @@
+import time
+from unittest import TestCase
+
+from gst_player import SINKS, GstPlayer
+
+
+class HeadlessPlayerTests(TestCase):
+    def create_player(self, sink):
+        player = GstPlayer(sink=sink)
+        player.start()
+        self.addCleanup(player.shutdown)
+        return player
+
+    def play_file(self, player, filename):
+        fd = open(filename, 'rb')
+        self.addCleanup(fd.close)
+        player.configure(fd.read)
+        self.assertTrue(player.confirm_play_starts())
+
+    def wait_exhausted(self, player, timeout):
+        deadline = time.monotonic() + timeout
+        while player.is_playing() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def test_named_sinks(self):
+        self.assertEqual(GstPlayer(sink='fast').sink, SINKS['fast'])
+        self.assertEqual(GstPlayer(sink='fakesink').sink, 'fakesink')
+
+    def test_fast_sink_runs_faster_than_realtime(self):
+        player = self.create_player('fast')
+
+        start = time.monotonic()
+        self.play_file(player, 'test/media/4s.mp3')
+        self.wait_exhausted(player, 4)
+
+        self.assertFalse(player.is_playing())
+        self.assertLess(time.monotonic() - start, 3)
+
+    def test_run_counters(self):
+        player = self.create_player('fast')
+        self.play_file(player, 'test/media/2s.mp3')
+        self.assertIsNotNone(player.wait_first_buffer())
+        self.wait_exhausted(player, 4)
+
+        self.assertEqual(player.stats.bytes_pushed, 16526)
+        self.assertGreater(player.stats.bytes_decoded, player.stats.bytes_pushed)
+        self.assertIsNotNone(player.stats.time_to_first_buffer)
+
+    def test_realtime_sink_paces_playback(self):
+        player = self.create_player('realtime')
+        self.play_file(player, 'test/media/1s.mp3')
+
+        time.sleep(0.3)
+        self.assertTrue(player.is_playing())
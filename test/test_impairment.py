@@ -0,0 +1,80 @@
+import socket
+import socketserver
+import threading
+from time import monotonic
+from unittest import TestCase
+
+from impairment import ImpairedProxy, Impairments
+
+
+class EchoHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while data := self.request.recv(65536):
+            self.request.sendall(data)
+
+
+class ImpairedProxyTests(TestCase):
+    def setUp(self):
+        self.echo = socketserver.ThreadingTCPServer(('127.0.0.1', 0), EchoHandler)
+        self.echo.daemon_threads = True
+        threading.Thread(target=self.echo.serve_forever, daemon=True).start()
+        self.addCleanup(self.echo.server_close)
+        self.addCleanup(self.echo.shutdown)
+
+    def connect(self, **impairments):
+        proxy = ImpairedProxy(self.echo.server_address[1], Impairments(**impairments))
+        proxy.start()
+        self.addCleanup(proxy.stop)
+        sock = socket.create_connection(('127.0.0.1', proxy.port))
+        self.addCleanup(sock.close)
+        return proxy, sock
+
+    def roundtrip(self, sock, data):
+        start = monotonic()
+        sock.sendall(data)
+        received = b''
+        while len(received) < len(data):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            received += chunk
+        return received, monotonic() - start
+
+    def test_forwards_data(self):
+        _, sock = self.connect()
+        received, _ = self.roundtrip(sock, b'hello')
+        self.assertEqual(received, b'hello')
+
+    def test_latency_in_both_directions(self):
+        _, sock = self.connect(latency_ms=100)
+        _, elapsed = self.roundtrip(sock, b'ping')
+        self.assertGreaterEqual(elapsed, 0.2)
+
+    def test_bandwidth_cap(self):
+        _, sock = self.connect(bandwidth_kbps=800)  # 100 KB/s
+        received, elapsed = self.roundtrip(sock, b'x' * 50000)
+
+        self.assertEqual(len(received), 50000)
+        self.assertGreaterEqual(elapsed, 0.4)
+
+    def test_jitter_keeps_order(self):
+        _, sock = self.connect(latency_ms=20, jitter_ms=20, seed=1)
+        data = bytes(range(256)) * 64
+        received, _ = self.roundtrip(sock, data)
+        self.assertEqual(received, data)
+
+    def test_drop(self):
+        proxy, sock = self.connect()
+        self.roundtrip(sock, b'ping')
+        proxy.drop()
+
+        sock.settimeout(1)
+        try:
+            self.assertEqual(sock.recv(1), b'')
+        except ConnectionResetError:
+            pass
+        self.assertEqual(proxy.drops, 1)
+
+    def test_parse(self):
+        impairments = Impairments.parse('latency_ms=50, bandwidth_kbps=256')
+        self.assertEqual((impairments.latency_ms, impairments.bandwidth_kbps), (50, 256))
@@ -0,0 +1,124 @@
+from contextlib import nullcontext
+from unittest import TestCase
+
+import Ice
+from gi.repository import GLib
+
+from media_control import PagedPlaylistModel, Spotifice
+from media_control_v1 import RequestCoalescer, on_main_loop
+
+
+def run_main_loop():
+    context = GLib.MainContext.default()
+    while context.iteration(False):
+        pass
+
+
+class OnMainLoopTests(TestCase):
+    def test_result(self):
+        results = []
+        future = Ice.Future()
+        on_main_loop(future, results.append, self.fail)
+        future.set_result(42)
+        run_main_loop()
+
+        self.assertEqual(results, [42])
+
+    def test_exception(self):
+        errors = []
+        future = Ice.Future()
+        on_main_loop(future, self.fail, errors.append)
+        future.set_exception(RuntimeError('boom'))
+        run_main_loop()
+
+        self.assertEqual([str(e) for e in errors], ['boom'])
+
+
+class RequestCoalescerTests(TestCase):
+    def setUp(self):
+        self.coalescer = RequestCoalescer()
+        self.futures = []
+        self.results = []
+
+    def start(self):
+        future = Ice.Future()
+        self.futures.append(future)
+        return future
+
+    def submit(self, request, read=False):
+        self.coalescer.submit('key', request, self.start, self.results.append,
+                              self.results.append, read)
+
+    def test_same_command_dropped(self):
+        self.submit('play')
+        self.submit('play')
+        self.futures[0].set_result('done')
+        run_main_loop()
+
+        self.assertEqual((len(self.futures), self.results), (1, ['done']))
+
+    def test_failed_request_frees_key(self):
+        self.submit('pause')
+        self.futures[0].set_exception(RuntimeError('stopped'))
+        run_main_loop()
+        self.submit('play')
+
+        self.assertEqual(len(self.futures), 2)
+        self.assertEqual(self.coalescer.running, {'key': 'play'})
+
+    def test_read_runs_again(self):
+        self.submit('get', read=True)
+        self.submit('get', read=True)
+        self.submit('get', read=True)
+        self.futures[0].set_result('old')
+        run_main_loop()
+        self.futures[1].set_result('new')
+        run_main_loop()
+
+        self.assertEqual((len(self.futures), self.results), (2, ['old', 'new']))
+
+
+class FakeServer:
+    def __init__(self):
+        self.requests = []
+
+    def get_playlists_pageAsync(self, offset, count):
+        future = Ice.Future()
+        self.requests.append((offset, future))
+        return future
+
+
+def playlist_page(version, total, names):
+    summaries = [Spotifice.PlaylistSummary(name, name, 0) for name in names]
+    return Spotifice.PlaylistPage('epoch', version, total, summaries)
+
+
+class PagedPlaylistModelTests(TestCase):
+    def setUp(self):
+        self.server = FakeServer()
+        self.model = PagedPlaylistModel(nullcontext)
+        self.model.attach(self.server, lambda total: None)
+        self.answer(0, playlist_page(1, 2, ['a', 'b']))
+
+    def answer(self, request, page):
+        self.server.requests[request][1].set_result(page)
+        run_main_loop()
+
+    def test_pages_cached(self):
+        self.assertEqual(self.model.get_summary(1).name, 'b')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_new_version_drops_pages(self):
+        self.model.pages[5] = playlist_page(1, 2, ['old']).playlists
+        self.model.refresh()
+        self.answer(1, playlist_page(2, 2, ['a', 'c']))
+
+        self.assertEqual(list(self.model.pages), [0])
+        self.assertEqual(self.model.get_summary(1).name, 'c')
+
+    def test_older_page_asked_again(self):
+        self.model.refresh()
+        self.answer(1, playlist_page(0, 2, ['x', 'y']))
+
+        self.assertEqual(self.model.get_summary(0).name, 'a')
+        self.assertEqual(len(self.server.requests), 3)
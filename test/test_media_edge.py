@@ -0,0 +1,146 @@
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from media_edge import BlockCache, Spotifice
+from media_edge import main as edge_main
+from media_server import main as server_main
+
+from .icetest import IceTestCase
+
+
+class BlockCacheTests(TestCase):
+    def test_hit_after_miss(self):
+        cache = BlockCache(1024)
+        cache.get(('t', 0), lambda: b'a' * 100)
+
+        self.assertEqual(cache.get(('t', 0), self.fail), b'a' * 100)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_memory_is_bounded(self):
+        cache = BlockCache(250)
+        for i in range(5):
+            cache.get(('t', i), lambda: b'x' * 100)
+
+        self.assertLessEqual(cache.memory_used, 250)
+        self.assertNotIn(('t', 0), cache.memory)
+
+    def test_evicted_blocks_go_to_disk(self):
+        disk_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(disk_dir.cleanup)
+        cache = BlockCache(250, disk_dir.name, 1000)
+
+        for i in range(5):
+            cache.get(('t', i), lambda i=i: bytes([i]) * 100)
+
+        self.assertEqual(cache.get(('t', 0), self.fail), b'\x00' * 100)
+        self.assertEqual(cache.disk_hits, 1)
+
+    def test_disk_is_bounded(self):
+        disk_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(disk_dir.cleanup)
+        cache = BlockCache(100, disk_dir.name, 300)
+
+        for i in range(10):
+            cache.get(('t', i), lambda: b'x' * 100)
+
+        self.assertLessEqual(cache.disk_used, 300)
+
+    def test_read_while_downloading(self):
+        cache = BlockCache(1024)
+        more = threading.Event()
+
+        def fetch(append):
+            append(b'ab')
+            more.wait(5)
+            append(b'cd')
+
+        self.assertEqual(cache.read(('t', 0), 0, 10, fetch), b'ab')
+        more.set()
+        self.assertEqual(cache.get(('t', 0), self.fail), b'abcd')
+        self.assertEqual((cache.misses, cache.coalesced), (1, 1))
+
+    def test_concurrent_misses_fetch_once(self):
+        cache = BlockCache(1024)
+        fetches = []
+
+        def slow_fetch():
+            fetches.append(1)
+            time.sleep(0.2)
+            return b'data'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            cache.get(('t', 0), slow_fetch))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(fetches), 1)
+        self.assertEqual(results, [b'data'] * 5)
+        self.assertEqual(cache.coalesced, 4)
+
+
+class TestEdge(IceTestCase):
+    server_port = 10000
+    edge_port = 10020
+
+    def setUp(self):
+        server_props = {
+            'MediaServerAdapter.Endpoints': f'tcp -p {self.server_port}',
+            'MediaServer.Content': 'test/media',
+            'MediaServer.Playlists': 'test/playlists'}
+        self.create_server(server_main, server_props)
+
+        edge_props = {
+            'MediaEdgeAdapter.Endpoints': f'tcp -p {self.edge_port}',
+            'MediaEdge.Origin': f'mediaServer1:tcp -p {self.server_port}',
+            'MediaEdge.BlockSize': '8192'}
+        self.create_server(edge_main, edge_props)
+
+        self.sut = self.create_proxy(
+            f'mediaServer1:default -p {self.edge_port} -t 500', Spotifice.MediaServerPrx)
+
+    def read_track(self, session, track_id):
+        session.open_stream(track_id, 0)
+        data = b''
+        while chunk := session.get_audio_chunk(4096):
+            data += chunk
+        return data
+
+
+class EdgeTests(TestEdge):
+    def test_metadata_forwarded(self):
+        self.assertEqual(len(self.sut.get_all_tracks()), 4)
+        self.assertEqual(self.sut.get_track_info('1s.mp3').title, '1s')
+
+    def test_wrong_credentials(self):
+        with self.assertRaises(Spotifice.AuthError):
+            self.sut.authenticate(None, 'user', 'bad-password')
+
+    def test_stream_through_edge(self):
+        session = self.sut.authenticate(None, 'user', 'secret')
+
+        with open('test/media/4s.mp3', 'rb') as f:
+            expected = f.read()
+
+        self.assertEqual(self.read_track(session, '4s.mp3'), expected)
+        # Segunda lectura (otro oyente) servida desde la caché
+        other = self.sut.authenticate(None, 'user', 'secret')
+        self.assertEqual(self.read_track(other, '4s.mp3'), expected)
+
+    def test_broadcast_through_edge(self):
+        host = self.sut.authenticate(None, 'user', 'secret')
+        guest = self.sut.authenticate(None, 'user', 'secret')
+
+        info = host.open_broadcast('test-playlist', 0)
+        self.assertEqual(guest.join_broadcast(info.id).id, info.id)
+        self.assertEqual(host.get_audio_chunk(4096), guest.get_audio_chunk(4096))
+
+    def test_open_stream_wrong_track(self):
+        session = self.sut.authenticate(None, 'user', 'secret')
+
+        with self.assertRaises(Spotifice.TrackError):
+            session.open_stream('bad-track-id', 0)
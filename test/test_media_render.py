@@ -1,5 +1,7 @@
+import time
+
 from gst_player import GstPlayer
-from media_render import Spotifice
+from media_render import Spotifice, host_main
 from media_render import main as render_main
 from media_server import main as server_main
 
@@ -9,15 +11,18 @@ from .icetest import IceTestCase
 class TestRender(IceTestCase):
     render_port = 10001
     server_port = 10000
+    extra_server_props = {}
 
     def setUp(self):
         server_props = {
             'MediaServerAdapter.Endpoints': f'tcp -p {self.server_port}',
-            'MediaServer.Content': 'test/media'}
+            'MediaServer.Content': 'test/media',
+            'MediaServer.Playlists': 'test/playlists',
+            **self.extra_server_props}
         server_endpoint = f'mediaServer1:default -p {self.server_port} -t 500'
         self.create_server(server_main, server_props)
 
-        player = GstPlayer()
+        player = self.player = GstPlayer()
         player.start()
         self.addCleanup(player.shutdown)
 
@@ -29,6 +34,11 @@ class TestRender(IceTestCase):
         self.server = self.create_proxy(server_endpoint, Spotifice.MediaServerPrx)
         self.sut = self.create_proxy(render_enpoint, Spotifice.MediaRenderPrx)
 
+    def bind_session(self):
+        session = self.server.authenticate(self.sut, 'user', 'secret')
+        self.sut.bind_media_server(self.server, session)
+        return session
+
 
 class PlaybackTests(TestRender):
     def test_id(self):
@@ -70,3 +80,152 @@ class PlaybackTests(TestRender):
             self.sut.play()
 
         self.assertEqual(cm.exception.reason, "Already playing")
+
+
+class SeekTests(TestRender):
+    def setUp(self):
+        super().setUp()
+        self.bind_session()
+
+    def test_seek_without_track(self):
+        with self.assertRaises(Spotifice.TrackError) as cm:
+            self.sut.seek(1000)
+
+        self.assertEqual(cm.exception.reason, "No track loaded")
+
+    def test_seek_while_playing(self):
+        self.sut.load_track('4s.mp3')
+        self.sut.play()
+
+        self.sut.seek(2000)
+
+        status = self.sut.get_status()
+        self.assertEqual(status.state, Spotifice.PlaybackState.PLAYING)
+        self.assertEqual(status.current_track_id, '4s.mp3')
+
+    def test_seek_while_stopped_applies_on_play(self):
+        self.sut.load_track('4s.mp3')
+        self.sut.seek(3000)
+        self.sut.play()
+
+        self.assertEqual(self.sut.get_status().state, Spotifice.PlaybackState.PLAYING)
+
+
+class PlaylistStreamTests(TestRender):
+    def setUp(self):
+        super().setUp()
+        self.bind_session()
+
+    def test_play_playlist(self):
+        self.sut.load_playlist('test-playlist')
+        self.sut.play()
+
+        status = self.sut.get_status()
+        self.assertEqual(status.state, Spotifice.PlaybackState.PLAYING)
+        self.assertEqual(status.current_track_id, '1s.mp3')
+
+    def test_next_restarts_playlist_stream(self):
+        self.sut.load_playlist('test-playlist')
+        self.sut.play()
+        self.sut.next()
+
+        self.assertEqual(self.sut.get_status().current_track_id, '2s.mp3')
+
+
+class FailoverTests(TestRender):
+    def test_resume_after_session_lost(self):
+        session = self.bind_session()
+        self.sut.load_track('4s.mp3')
+        self.sut.play()
+        time.sleep(0.5)
+
+        # La sesión desaparece del servidor: el render debe reabrirla y seguir
+        session.close()
+        time.sleep(1)
+
+        status = self.sut.get_status()
+        self.assertEqual(status.state, Spotifice.PlaybackState.PLAYING)
+        self.assertEqual(status.current_track_id, '4s.mp3')
+
+
+class RenderHostTests(TestRender):
+    host_port = 10002
+
+    def setUp(self):
+        super().setUp()
+        host_props = {
+            'MediaRenderAdapter.Endpoints': f'tcp -p {self.host_port}',
+            'MediaRender.Zones': 'zone1 zone2',
+            'MediaRender.Zone.zone1.Identity': 'zoneRender1',
+            'MediaRender.Zone.zone1.Sink': 'realtime',
+            'MediaRender.Zone.zone2.Identity': 'zoneRender2',
+            'MediaRender.Zone.zone2.Sink': 'realtime',
+            'MediaRender.Zone.zone2.BufferBytes': '16384'}
+        self.create_server(host_main, host_props)
+
+        self.zones = [
+            self.create_proxy(f'zoneRender{i}:default -p {self.host_port} -t 500',
+                              Spotifice.MediaRenderPrx)
+            for i in (1, 2)]
+
+    def test_zones_are_independent(self):
+        for zone in self.zones:
+            session = self.server.authenticate(zone, 'user', 'secret')
+            zone.bind_media_server(self.server, session)
+
+        self.zones[0].load_track('4s.mp3')
+        self.zones[0].play()
+        self.zones[1].load_track('2s.mp3')
+
+        states = [zone.get_status().state for zone in self.zones]
+        self.assertEqual(states, [Spotifice.PlaybackState.PLAYING,
+                                  Spotifice.PlaybackState.STOPPED])
+        self.assertEqual(self.zones[1].get_current_track().id, '2s.mp3')
+
+
+class BroadcastRenderTests(TestRender):
+    def test_play_broadcast(self):
+        self.bind_session()
+        host = self.server.authenticate(None, 'user', 'secret')
+        self.addCleanup(host.close)
+        info = host.open_broadcast('test-playlist', 0)
+
+        self.sut.load_broadcast(info.id)
+        self.sut.play()
+
+        status = self.sut.get_status()
+        self.assertEqual(status.state, Spotifice.PlaybackState.PLAYING)
+        self.assertEqual(status.current_track_id, '1s.mp3')
+
+
+class ImpairedNetworkTests(TestRender):
+    def setUp(self):
+        # El servidor publica el puerto del proxy: las sesiones también pasan por él
+        self.impaired = self.create_impaired_proxy(
+            self.server_port, latency_ms=50, jitter_ms=10, bandwidth_kbps=512)
+        self.extra_server_props = {
+            'MediaServerAdapter.PublishedEndpoints': f'tcp -p {self.impaired.port}'}
+        super().setUp()
+
+        self.server = self.create_proxy(
+            f'mediaServer1:tcp -p {self.impaired.port}', Spotifice.MediaServerPrx)
+        self.bind_session()
+
+    def test_play_with_latency(self):
+        self.sut.load_track('2s.mp3')
+        self.sut.play()
+
+        self.assertIsNotNone(self.player.wait_first_buffer())
+        self.assertEqual(self.sut.get_status().state, Spotifice.PlaybackState.PLAYING)
+
+    def test_reconnect_after_drop(self):
+        self.sut.load_track('4s.mp3')
+        self.sut.play()
+        time.sleep(0.5)
+
+        self.impaired.drop()
+        time.sleep(1)
+
+        status = self.sut.get_status()
+        self.assertEqual(status.state, Spotifice.PlaybackState.PLAYING)
+        self.assertGreaterEqual(self.impaired.drops, 1)
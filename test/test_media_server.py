@@ -1,23 +1,66 @@
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import TestCase, skipUnless
+
 import Ice
 
-from media_server import Spotifice, main
+import transcode
+from admission import AdmissionController
+from media_server import (
+    MediaServerI,
+    PlaylistStream,
+    SecureStreamManagerI,
+    Spotifice,
+    main,
+)
+from mp3_frames import FrameIndex
+from popularity import PopularityTracker
 
 from .icetest import IceTestCase
 
 
 class TestServer(IceTestCase):
     server_port = 10000
+    extra_props = {}
 
     def setUp(self):
         server_props = {
             'MediaServerAdapter.Endpoints': f'tcp -p {self.server_port}',
-            'MediaServer.Content': 'test/media'
+            'MediaServer.Content': 'test/media',
+            'MediaServer.Playlists': 'test/playlists',
         }
+        server_props.update(self.extra_props)
         server_endpoint = f'mediaServer1:default -p {self.server_port} -t 500'
         self.create_server(main, server_props)
         self.sut = self.create_proxy(server_endpoint, Spotifice.MediaServerPrx)
 
 
+#Cada test con su sesión en el servidor
+class TestSession(TestServer):
+    def setUp(self):
+        super().setUp()
+        self.session = self.sut.authenticate(None, 'user', 'secret')
+        self.addCleanup(self.session.close)
+
+    def read_all(self):
+        data = b''
+        while chunk := self.session.get_audio_chunk(8192):
+            data += chunk
+        return data
+
+
+#Copia de test/media que cada test puede modificar
+class TestMediaCopy(TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_dir)
+        for name in os.listdir('test/media'):
+            shutil.copy(os.path.join('test/media', name), self.media_dir)
+
+
 class MusicLibraryTests(TestServer):
     def test_get_all_tracks(self):
         tracks = self.sut.get_all_tracks()
@@ -81,3 +124,571 @@ class StreamManagerTests(TestServer):
 
         self.assertEqual(cm.exception.item, 'missing-render-id')
         self.assertEqual(cm.exception.reason, 'No open stream for render')
+
+
+class SecureStreamManagerTests(TestSession):
+    def test_open_stream_at(self):
+        position = self.session.open_stream_at('4s.mp3', 2000)
+        self.assertLessEqual(position, 2000)
+        self.assertGreater(position, 1900)
+
+        chunk = self.session.get_audio_chunk(4096)
+        self.assertEqual(chunk[0], 0xFF)
+
+    def test_open_stream_at_wrong_track(self):
+        with self.assertRaises(Spotifice.TrackError) as cm:
+            self.session.open_stream_at('bad-track-id', 1000)
+
+        self.assertEqual(cm.exception.reason, 'Track not found')
+
+    def test_chunks_aligned_to_frames(self):
+        self.session.open_stream_at('4s.mp3', 1000)
+        first = self.session.get_audio_chunk(4096)
+        second = self.session.get_audio_chunk(4096)
+
+        self.assertLessEqual(len(first), 4096)
+        self.assertEqual(second[0], 0xFF)
+
+    def test_open_playlist_stream(self):
+        boundaries = self.session.open_playlist_stream('test-playlist', 1)
+
+        self.assertEqual([b.track.id for b in boundaries], ['2s.mp3', '4s.mp3'])
+        self.assertEqual([b.index for b in boundaries], [1, 2])
+        self.assertEqual(boundaries[0].offset, 0)
+
+    def test_playlist_stream_is_continuous(self):
+        boundaries = self.session.open_playlist_stream('test-playlist', 0)
+
+        data = b''
+        while chunk := self.session.get_audio_chunk(4096):
+            data += chunk
+
+        # Sin etiquetas ID3: cada pista empieza con un frame MP3
+        for boundary in boundaries:
+            self.assertEqual(data[boundary.offset], 0xFF)
+        self.assertGreater(len(data), boundaries[-1].offset)
+
+    def test_open_playlist_stream_wrong_playlist(self):
+        with self.assertRaises(Spotifice.PlaylistError) as cm:
+            self.session.open_playlist_stream('bad-playlist-id', 0)
+
+        self.assertEqual(cm.exception.reason, 'Playlist not found')
+
+    def test_resume_session(self):
+        token = self.session.get_resume_token()
+        resumed = self.sut.resume_session(None, token)
+        self.addCleanup(resumed.close)
+
+        self.assertEqual(resumed.get_user_info().username, 'user')
+
+    def test_resume_session_bad_token(self):
+        token = self.session.get_resume_token() + '0'
+
+        with self.assertRaises(Spotifice.AuthError) as cm:
+            self.sut.resume_session(None, token)
+
+        self.assertEqual(cm.exception.reason, 'Invalid resume token')
+
+    @skipUnless(transcode.Gst, "GStreamer not available")
+    def test_open_stream_lower_quality(self):
+        self.session.open_stream('4s.mp3', 0)
+        original = self.read_all()
+
+        # La primera vez se sirve el original mientras se codifica en segundo plano
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            self.session.open_stream('4s.mp3', 32)
+            transcoded = self.read_all()
+            if len(transcoded) < len(original):
+                break
+            time.sleep(0.2)
+
+        self.assertLess(len(transcoded), len(original))
+
+    def test_quality_above_source_is_original(self):
+        self.session.open_stream('4s.mp3', 0)
+        original = self.read_all()
+        self.session.open_stream('4s.mp3', 320)
+        self.assertEqual(self.read_all(), original)
+
+    def test_seek_stream(self):
+        self.session.open_stream('4s.mp3', 0)
+        first = self.session.get_audio_chunk(4096)
+        self.session.get_audio_chunk(4096)
+
+        self.session.seek_stream(0)
+        self.assertEqual(self.session.get_audio_chunk(4096), first)
+
+    def test_seek_playlist_stream(self):
+        boundaries = self.session.open_playlist_stream('test-playlist', 0)
+        self.session.seek_stream(boundaries[2].offset)
+
+        with open('test/media/4s.mp3', 'rb') as f:
+            f.seek(FrameIndex.from_file('test/media/4s.mp3').offsets[0])
+            expected = f.read(16)
+        self.assertEqual(self.session.get_audio_chunk(4096)[:16], expected)
+
+
+@skipUnless(transcode.Gst, "GStreamer not available")
+class FreeQualityTests(TestSession):
+    def setUp(self):
+        transcode_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, transcode_dir)
+        self.extra_props = {'MediaServer.FreeQuality': '32',
+                            'MediaServer.TranscodeDir': transcode_dir}
+        super().setUp()
+
+    def original_size(self):
+        indexes = [FrameIndex.from_file(f'test/media/{name}')
+                   for name in ['1s.mp3', '2s.mp3', '4s.mp3']]
+        return sum(index.end - index.offsets[0] for index in indexes)
+
+    def test_playlist_stream_capped(self):
+        boundaries = self.session.open_playlist_stream('test-playlist', 0)
+        data = self.read_all()
+
+        self.assertLess(len(data), self.original_size())
+        for boundary in boundaries:
+            self.assertEqual(data[boundary.offset], 0xFF)
+
+    def test_broadcast_capped(self):
+        self.session.open_broadcast('test-playlist', 0)
+        self.assertLess(len(self.read_all()), self.original_size())
+
+
+class SharedCatalogTests(TestCase):
+    def test_catalog_roundtrip(self):
+        origin = MediaServerI('test/media', 'test/playlists', 'users.json')
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        origin.dump_catalog(path)
+        worker = MediaServerI('test/media', 'test/playlists', 'users.json', catalog=path)
+
+        self.assertEqual(list(worker.tracks), list(origin.tracks))
+        self.assertEqual(worker.playlists['test-playlist'].track_ids,
+                         origin.playlists['test-playlist'].track_ids)
+        self.assertEqual(worker.users_db.keys(), origin.users_db.keys())
+
+
+class CatalogChangesTests(TestMediaCopy):
+    def setUp(self):
+        super().setUp()
+        self.server = MediaServerI(self.media_dir, 'test/playlists', 'users.json')
+
+    def test_full_snapshot_for_new_client(self):
+        delta = self.server.get_catalog_changes('', 0)
+
+        self.assertTrue(delta.full)
+        self.assertEqual(len(delta.tracks), 4)
+        self.assertEqual(len(delta.playlists), 1)
+
+    def test_full_snapshot_for_other_epoch(self):
+        version = self.server.get_catalog_changes('', 0).version
+
+        self.assertTrue(self.server.get_catalog_changes('other-server', version).full)
+
+    def test_no_changes(self):
+        last = self.server.get_catalog_changes('', 0)
+        version = last.version
+        self.server.rescan()
+
+        delta = self.server.get_catalog_changes(last.epoch, version)
+        self.assertFalse(delta.full)
+        self.assertEqual(delta.version, version)
+        self.assertEqual((delta.tracks, delta.removed_tracks), ([], []))
+
+    def test_added_and_removed_tracks(self):
+        last = self.server.get_catalog_changes('', 0)
+        version = last.version
+        shutil.copy(os.path.join(self.media_dir, '1s.mp3'),
+                    os.path.join(self.media_dir, 'copy.mp3'))
+        os.remove(os.path.join(self.media_dir, '4s.mp3'))
+        self.server.rescan()
+
+        delta = self.server.get_catalog_changes(last.epoch, version)
+        self.assertFalse(delta.full)
+        self.assertEqual([t.id for t in delta.tracks], ['copy.mp3'])
+        self.assertEqual(delta.removed_tracks, ['4s.mp3'])
+        self.assertGreater(delta.version, version)
+
+    def test_pages_follow_rescan(self):
+        before = self.server.get_tracks_page(0, 10)
+        os.remove(os.path.join(self.media_dir, '1s.mp3'))
+        self.server.rescan()
+
+        page = self.server.get_tracks_page(0, 10)
+        self.assertGreater(page.version, before.version)
+        self.assertEqual((page.total, [t.id for t in page.tracks]),
+                         (3, [t.id for t in before.tracks[1:]]))
+
+
+class PlaylistEditorTests(TestSession):
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_dir)
+        self.extra_props = {
+            'MediaServer.PlaylistStore': os.path.join(self.store_dir, 'playlists.db')}
+        super().setUp()
+
+    def test_edit_own_playlist(self):
+        playlist = self.session.create_playlist('Mine', '')
+        self.session.append_track(playlist.id, '1s.mp3')
+        self.session.append_track(playlist.id, '2s.mp3')
+        edited = self.session.move_track(playlist.id, 1, 0)
+
+        self.assertEqual(edited.owner, 'user')
+        self.assertEqual(edited.track_ids, ['2s.mp3', '1s.mp3'])
+        self.assertEqual(self.sut.get_playlist(playlist.id).track_ids,
+                         ['2s.mp3', '1s.mp3'])
+
+    def test_bad_index(self):
+        playlist = self.session.create_playlist('Mine', '')
+
+        with self.assertRaises(Spotifice.PlaylistError) as cm:
+            self.session.remove_track(playlist.id, 0)
+
+        self.assertEqual(cm.exception.reason, 'Invalid track index: 0')
+
+    def test_only_owner_edits(self):
+        with self.assertRaises(Spotifice.PlaylistError) as cm:
+            self.session.delete_playlist('test-playlist')
+
+        self.assertEqual(cm.exception.reason, 'Only the owner can edit a playlist')
+
+
+class PlaylistStoreTests(TestMediaCopy):
+    def setUp(self):
+        super().setUp()
+        self.store = os.path.join(self.media_dir, 'playlists.db')
+
+    def server(self):
+        server = MediaServerI(self.media_dir, 'test/playlists', 'users.json',
+                              playlist_store=self.store)
+        self.addCleanup(server.store.close)
+        return server
+
+    def test_removed_track_purged_from_playlists(self):
+        server = self.server()
+        last = server.get_catalog_changes('', 0)
+        version = last.version
+        os.remove(os.path.join(self.media_dir, '4s.mp3'))
+        server.rescan()
+
+        self.assertEqual(server.playlists['test-playlist'].track_ids,
+                         ['1s.mp3', '2s.mp3'])
+        delta = server.get_catalog_changes(last.epoch, version)
+        self.assertEqual([p.id for p in delta.playlists], ['test-playlist'])
+
+    def test_deleted_playlist_not_imported_again(self):
+        server = self.server()
+        server.store.delete('test-playlist')
+        server.store.close()
+
+        self.assertNotIn('test-playlist', self.server().playlists)
+
+
+class WarmUpTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.plays = PopularityTracker(os.path.join(self.dir, 'plays.log')).open()
+        self.addCleanup(self.plays.close)
+        self.server = MediaServerI('test/media', 'test/playlists', 'users.json',
+                                   plays=self.plays)
+
+    def test_popular_tracks_indexed(self):
+        for track_id in ['2s.mp3', '2s.mp3', '1s.mp3', 'gone.mp3']:
+            self.plays.record(track_id)
+        self.plays.aggregate()
+
+        self.assertEqual(self.server.warm_up(3, 30), 2)
+        self.assertEqual(set(self.server.frame_indexes.indexes), {'1s.mp3', '2s.mp3'})
+
+    def test_nothing_played(self):
+        self.assertEqual(self.server.warm_up(10, 30), 0)
+
+
+class PlayRecordTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.plays = PopularityTracker(os.path.join(self.dir, 'plays.log')).open()
+        self.addCleanup(self.plays.close)
+        self.server = MediaServerI('test/media', 'test/playlists', 'users.json')
+        self.playlist = self.server.playlists['test-playlist']
+
+    def played(self):
+        return [track_id for _, track_id in self.plays.pending]
+
+    def session(self):
+        session = SecureStreamManagerI(
+            Spotifice.UserInfo(username='user'), self.server.media_dir,
+            self.server.tracks, self.server.frame_indexes, self.server.playlists,
+            broadcasts={}, plays=self.plays)
+        self.addCleanup(session.release)
+        return session
+
+    def playlist_stream(self, on_track):
+        return PlaylistStream(self.playlist, 0, self.server.tracks, self.server.media_dir,
+                              lambda track: (None, None), on_track)
+
+    def test_playlist_stream_tracks(self):
+        played = []
+        stream = self.playlist_stream(played.append)
+        while stream.read(65536):
+            pass
+        stream.close()
+
+        self.assertEqual(played, ['1s.mp3', '2s.mp3', '4s.mp3'])
+
+    def test_resume_not_played_again(self):
+        played = []
+        stream = self.playlist_stream(played.append)
+        stream.resume_at(stream.boundaries[1].offset + 100)
+        stream.close()
+
+        self.assertEqual(played, ['1s.mp3'])
+
+    def test_session_playlist_stream(self):
+        session = self.session()
+        session.open_playlist_stream('test-playlist', 1)
+
+        self.assertEqual(self.played(), ['2s.mp3'])
+
+    def test_seek_not_played_again(self):
+        session = self.session()
+        session.open_stream('2s.mp3', 0)
+        session.open_stream_at('2s.mp3', 1000)
+
+        self.assertEqual(self.played(), ['2s.mp3'])
+
+    def test_failover_reopen_not_played_again(self):
+        #El render reabre en la sesión reanudada lo que ya estaba sonando
+        session = self.session()
+        session.resuming = True
+        session.open_stream('2s.mp3', 0)
+        self.assertEqual(self.played(), [])
+
+        session.open_stream('4s.mp3', 0)
+        self.assertEqual(self.played(), ['4s.mp3'])
+
+    def test_failover_reopen_playlist_not_played_again(self):
+        session = self.session()
+        session.resuming = True
+        session.open_playlist_stream('test-playlist', 1)
+        session.seek_stream(session.current_stream.boundaries[1].offset)
+
+        self.assertEqual(self.played(), [])
+
+    def test_broadcast_plays(self):
+        host, guest = self.session(), self.session()
+        guest.broadcasts = host.broadcasts
+        info = host.open_broadcast('test-playlist', 0)
+        guest.join_broadcast(info.id)
+
+        deadline = time.monotonic() + 5
+        while self.played().count('4s.mp3') < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        #Cada uno oye cada pista desde que se une (el invitado quizá ya en la segunda)
+        played = self.played()
+        self.assertEqual((played.count('2s.mp3'), played.count('4s.mp3')), (2, 2))
+        self.assertIn(played.count('1s.mp3'), (1, 2))
+
+
+class BroadcastTests(TestServer):
+    def setUp(self):
+        super().setUp()
+        self.host = self.sut.authenticate(None, 'user', 'secret')
+        self.guest = self.sut.authenticate(None, 'user', 'secret')
+        self.addCleanup(self.host.close)
+        self.addCleanup(self.guest.close)
+
+    def test_open_broadcast(self):
+        info = self.host.open_broadcast('test-playlist', 0)
+
+        self.assertTrue(info.id)
+        self.assertEqual([b.track.id for b in info.boundaries],
+                         ['1s.mp3', '2s.mp3', '4s.mp3'])
+
+    def test_join_unknown_broadcast(self):
+        with self.assertRaises(Spotifice.StreamError) as cm:
+            self.guest.join_broadcast('bad-broadcast-id')
+
+        self.assertEqual(cm.exception.reason, 'Broadcast not found')
+
+    def test_join_own_broadcast_again(self):
+        info = self.host.open_broadcast('test-playlist', 0)
+
+        self.assertEqual(self.host.join_broadcast(info.id).id, info.id)
+        self.assertTrue(self.host.get_audio_chunk(4096))
+
+    def test_subscribers_share_stream(self):
+        info = self.host.open_broadcast('test-playlist', 0)
+        joined = self.guest.join_broadcast(info.id)
+        self.assertEqual(joined.offset, 0)
+
+        host_data = b''.join(self.host.get_audio_chunk(4096) for _ in range(3))
+        guest_data = b''.join(self.guest.get_audio_chunk(4096) for _ in range(3))
+        self.assertEqual(host_data, guest_data)
+
+
+class AdmissionTests(TestServer):
+    extra_props = {'MediaServer.MaxStreams': '1'}
+
+    def setUp(self):
+        super().setUp()
+        self.first = self.sut.authenticate(None, 'user', 'secret')
+        self.second = self.sut.authenticate(None, 'user', 'secret')
+        self.addCleanup(self.first.close)
+        self.addCleanup(self.second.close)
+
+    def test_over_capacity(self):
+        self.first.open_stream('1s.mp3', 0)
+
+        with self.assertRaises(Spotifice.OverloadError) as cm:
+            self.second.open_stream('1s.mp3', 0)
+
+        self.assertGreater(cm.exception.retry_after_ms, 0)
+
+    def test_slot_released_on_close_stream(self):
+        self.first.open_stream('1s.mp3', 0)
+        self.first.close_stream()
+        self.second.open_stream('1s.mp3', 0)
+
+    def test_get_load(self):
+        self.first.open_stream('1s.mp3', 0)
+        with self.assertRaises(Spotifice.OverloadError):
+            self.second.open_stream('1s.mp3', 0)
+
+        load = self.sut.get_load()
+        self.assertEqual((load.streams, load.max_streams, load.rejected), (1, 1, 1))
+
+
+class IdleSessionTests(TestCase):
+    def setUp(self):
+        self.admission = AdmissionController(max_streams_per_user=1)
+        self.server = MediaServerI('test/media', 'test/playlists', 'users.json',
+                                   admission=self.admission)
+        self.removed = []
+
+    def open_session(self):
+        user = Spotifice.UserInfo(username='user')
+        session = SecureStreamManagerI(user, self.server.media_dir, self.server.tracks,
+                                       self.server.frame_indexes, self.server.playlists,
+                                       admission=self.admission)
+        identity = Ice.Identity(name=str(len(self.server.sessions)))
+        adapter = SimpleNamespace(remove=self.removed.append)
+        self.server.sessions[identity] = (adapter, session)
+        session.open_stream('1s.mp3', 0)
+        return session
+
+    def test_idle_session_frees_its_slot(self):
+        abandoned = self.open_session()
+        abandoned.last_active -= 601
+        self.server.reap_idle_sessions(600)
+
+        self.assertTrue(abandoned.closed)
+        self.assertEqual(len(self.removed), 1)
+        self.open_session()
+
+    def test_active_session_kept(self):
+        session = self.open_session()
+        self.server.reap_idle_sessions(600)
+
+        self.assertFalse(session.closed)
+        self.assertEqual(self.removed, [])
+
+
+class MetricsFacetTests(TestServer):
+    extra_props = {
+        'Ice.Admin.Endpoints': 'tcp -h 127.0.0.1 -p 10010',
+        'Ice.Admin.InstanceName': 'MediaServer',
+    }
+
+    def test_read_metrics(self):
+        session = self.sut.authenticate(None, 'user', 'secret')
+        self.addCleanup(session.close)
+        session.open_stream('1s.mp3', 0)
+        session.get_audio_chunk(4096)
+
+        admin = self.client_ic.stringToProxy(
+            'MediaServer/admin -f Spotifice.Metrics:tcp -h 127.0.0.1 -p 10010')
+        metrics = Spotifice.MetricsAdminPrx.checkedCast(admin)
+        values = metrics.get_values()
+
+        self.assertGreater(values['spotifice_bytes_served_total'], 0)
+        self.assertGreater(values['spotifice_rpc_seconds_count{operation="open_stream"}'],
+                           0)
+        self.assertIn('# TYPE spotifice_rpc_seconds histogram',
+                      metrics.get_prometheus_text())
+
+
+class ProfilerFacetTests(TestServer):
+    extra_props = {
+        'Ice.Admin.Endpoints': 'tcp -h 127.0.0.1 -p 10010',
+        'Ice.Admin.InstanceName': 'MediaServer',
+    }
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        self.extra_props = dict(self.extra_props, **{'Profiling.Dir': self.profile_dir})
+        super().setUp()
+
+        admin = self.client_ic.stringToProxy(
+            'MediaServer/admin -f Spotifice.Profiler:tcp -h 127.0.0.1 -p 10010')
+        self.profiler = Spotifice.ProfilerAdminPrx.checkedCast(admin)
+        self.addCleanup(self.profiler.set_mode, 'off')
+
+    def stream(self):
+        session = self.sut.authenticate(None, 'user', 'secret')
+        self.addCleanup(session.close)
+        session.open_stream('1s.mp3', 0)
+        session.get_audio_chunk(4096)
+
+    def test_cpu_profile_per_operation(self):
+        self.profiler.set_mode('cpu')
+        self.stream()
+        files = self.profiler.set_mode('off')
+
+        names = sorted(os.path.basename(f) for f in files)
+        self.assertIn('server.get_audio_chunk.prof', names)
+        self.assertIn('server.open_stream.prof', names)
+        self.assertEqual(self.profiler.get_mode(), 'off')
+
+    def test_switch_through_properties(self):
+        admin = self.client_ic.stringToProxy(
+            'MediaServer/admin -f Properties:tcp -h 127.0.0.1 -p 10010')
+        properties = Ice.PropertiesAdminPrx.checkedCast(admin)
+        properties.setProperties({'Profiling.Mode': 'sample'})
+
+        self.assertEqual(self.profiler.get_mode(), 'sample')
+
+    def test_bad_mode(self):
+        with self.assertRaises(Spotifice.Error):
+            self.profiler.set_mode('perf')
+
+
+class PagingTests(TestServer):
+    def test_tracks_page(self):
+        page = self.sut.get_tracks_page(1, 2)
+
+        self.assertEqual(page.total, 4)
+        self.assertEqual([t.id for t in page.tracks],
+                         [t.id for t in self.sut.get_all_tracks()[1:3]])
+
+    def test_tracks_page_past_the_end(self):
+        page = self.sut.get_tracks_page(10, 5)
+        self.assertEqual(page.total, 4)
+        self.assertEqual(page.tracks, [])
+
+    def test_playlists_page(self):
+        page = self.sut.get_playlists_page(0, 10)
+
+        self.assertEqual(page.total, 1)
+        [summary] = page.playlists
+        playlist = self.sut.get_playlist(summary.id)
+        self.assertEqual(summary.name, playlist.name)
+        self.assertEqual(summary.track_count, len(playlist.track_ids))
@@ -0,0 +1,89 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from metrics import Registry, timed
+
+
+class RegistryTests(TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        self.registry.counter('requests_total', "Requests", operation='play').inc()
+        self.registry.counter('requests_total', "Requests", operation='play').inc(2)
+
+        self.assertEqual(self.registry.values(), {'requests_total{operation="play"}': 3})
+
+    def test_counter_callback(self):
+        rejected = [0]
+        self.registry.counter('rejected_total', "Rejected", func=lambda: rejected[0])
+        rejected[0] = 3
+
+        self.assertEqual(self.registry.values()['rejected_total'], 3)
+        self.assertIn('# TYPE rejected_total counter\n', self.registry.prometheus_text())
+
+    def test_gauge_callback(self):
+        sessions = []
+        self.registry.gauge('sessions', "Open sessions", func=lambda: len(sessions))
+        sessions.append('s1')
+
+        self.assertEqual(self.registry.values()['sessions'], 1)
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('rpc_seconds', "RPC time")
+        histogram.observe(0.003)
+        histogram.observe(2)
+
+        values = self.registry.values()
+        self.assertEqual(values['rpc_seconds_count'], 2)
+        self.assertEqual(values['rpc_seconds_bucket{le="0.005"}'], 1)
+        self.assertEqual(values['rpc_seconds_bucket{le="+Inf"}'], 2)
+
+    def test_kind_mismatch(self):
+        self.registry.counter('x')
+        with self.assertRaises(ValueError):
+            self.registry.gauge('x')
+
+    def test_prometheus_text(self):
+        self.registry.counter('bytes_total', "Bytes served").inc(10)
+        text = self.registry.prometheus_text()
+
+        self.assertIn('# HELP bytes_total Bytes served\n', text)
+        self.assertIn('# TYPE bytes_total counter\n', text)
+        self.assertIn('bytes_total 10\n', text)
+
+    def test_dump(self):
+        self.registry.counter('bytes_total').inc()
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        self.registry.dump(path)
+        with open(path) as f:
+            self.assertIn('bytes_total 1', f.read())
+
+
+class TimedTests(TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_timed(self):
+        @timed('play', self.registry)
+        def play():
+            return 'ok'
+
+        self.assertEqual(play(), 'ok')
+        self.assertEqual(
+            self.registry.values()['spotifice_rpc_seconds_count{operation="play"}'], 1)
+
+    def test_timed_error(self):
+        @timed('next', self.registry)
+        def next_track():
+            raise KeyError('x')
+
+        with self.assertRaises(KeyError):
+            next_track()
+
+        key = 'spotifice_rpc_errors_total{error="KeyError",operation="next"}'
+        self.assertEqual(self.registry.values()[key], 1)
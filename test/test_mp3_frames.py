@@ -0,0 +1,55 @@
+from unittest import TestCase
+
+from mp3_frames import FrameIndex, FrameIndexCache, parse_header
+
+
+class FrameIndexTests(TestCase):
+    def setUp(self):
+        self.index = FrameIndex.from_file('test/media/4s.mp3')
+
+    def test_parse_header(self):
+        # MPEG1 layer III, 64 kbps, 48 kHz, sin padding
+        length, samples, sample_rate, bitrate = parse_header(b'\xff\xfb\x54\xc0')
+        self.assertEqual((length, samples, sample_rate, bitrate), (192, 1152, 48000, 64))
+
+    def test_parse_bad_header(self):
+        self.assertIsNone(parse_header(b'ID3\x04'))
+
+    def test_duration(self):
+        self.assertAlmostEqual(self.index.duration_ms, 4000, delta=200)
+
+    def test_first_frame_after_id3(self):
+        with open('test/media/4s.mp3', 'rb') as f:
+            data = f.read()
+
+        self.assertEqual(data[self.index.offsets[0]], 0xFF)
+        self.assertGreater(self.index.offsets[0], 0)
+
+    def test_offset_at(self):
+        offset, frame_ms = self.index.offset_at(2000)
+        self.assertIn(offset, self.index.offsets)
+        self.assertLessEqual(frame_ms, 2000)
+        self.assertGreater(frame_ms, 1900)
+
+    def test_align_to_frame_boundary(self):
+        start = self.index.offsets[0]
+        end = self.index.align(start, start + 4096)
+        self.assertIn(end, self.index.offsets)
+        self.assertLessEqual(end, start + 4096)
+
+    def test_align_small_chunk_keeps_one_frame(self):
+        start = self.index.offsets[3]
+        self.assertEqual(self.index.align(start, start + 10), self.index.offsets[4])
+
+    def test_empty_file(self):
+        index = FrameIndex.from_file('test/media/bad-file.mp3')
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.align(0, 1024), 1024)
+
+
+class FrameIndexCacheTests(TestCase):
+    def test_computed_once(self):
+        cache = FrameIndexCache()
+        first = cache.get('4s.mp3', 'test/media/4s.mp3')
+        second = cache.get('4s.mp3', 'test/media/4s.mp3')
+        self.assertIs(first, second)
@@ -0,0 +1,83 @@
+import threading
+from types import SimpleNamespace
+from unittest import TestCase
+
+from pacing import FairShareScheduler, TokenBucket, fair_rates
+
+
+class TokenBucketTests(TestCase):
+    def test_burst_is_free(self):
+        bucket = TokenBucket(1000, 4000, now=0)
+        self.assertEqual(bucket.take(4000, now=0), 0)
+
+    def test_debt_is_paced(self):
+        bucket = TokenBucket(1000, 4000, now=0)
+        bucket.take(4000, now=0)
+        self.assertAlmostEqual(bucket.take(500, now=0), 0.5)
+
+    def test_refill(self):
+        bucket = TokenBucket(1000, 4000, now=0)
+        bucket.take(4000, now=0)
+        self.assertEqual(bucket.take(1000, now=1), 0)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(0, 0, now=0)
+        self.assertEqual(bucket.take(10 ** 9, now=0), 0)
+
+
+class FairRatesTests(TestCase):
+    def test_equal_split(self):
+        rates = fair_rates({'a': (0, 1), 'b': (0, 1)}, 1000)
+        self.assertEqual(rates, {'a': 500, 'b': 500})
+
+    def test_premium_weight(self):
+        rates = fair_rates({'free': (0, 1), 'premium': (0, 2)}, 900)
+        self.assertAlmostEqual(rates['premium'], 600)
+        self.assertAlmostEqual(rates['free'], 300)
+
+    def test_unused_share_goes_to_others(self):
+        rates = fair_rates({'slow': (100, 1), 'fast': (0, 1)}, 1000)
+        self.assertEqual(rates['slow'], 100)
+        self.assertEqual(rates['fast'], 900)
+
+
+class FairShareSchedulerTests(TestCase):
+    def test_disabled_by_default(self):
+        scheduler = FairShareScheduler()
+        scheduler.register('s1')
+        self.assertFalse(scheduler.enabled)
+        self.assertEqual(scheduler.reserve('s1', 10 ** 6, 128, now=0), 0)
+
+    def test_session_paced_to_bitrate(self):
+        scheduler = FairShareScheduler(burst_factor=1.0, burst_secs=1.0)
+        scheduler.register('s1')
+
+        # 64 kbps = 8000 bytes/s: el primer segundo es ráfaga, el siguiente espera
+        self.assertEqual(scheduler.reserve('s1', 8000, 64, now=0), 0)
+        self.assertAlmostEqual(scheduler.reserve('s1', 8000, 64, now=0), 1.0)
+
+    def test_capacity_shared_by_weight(self):
+        scheduler = FairShareScheduler(capacity=3000, burst_secs=0)
+        free = SimpleNamespace(is_premium=False)
+        premium = SimpleNamespace(is_premium=True)
+        scheduler.register('free', scheduler.weight_for(free))
+        scheduler.register('premium', scheduler.weight_for(premium))
+
+        scheduler.reserve('free', 0, 128, now=0)
+        scheduler.reserve('premium', 0, 128, now=0)
+        scheduler.recompute_shares(now=0)
+
+        self.assertAlmostEqual(scheduler.reserve('free', 1000, 128, now=0), 1.0)
+        self.assertAlmostEqual(scheduler.reserve('premium', 2000, 128, now=0), 1.0)
+
+    def test_unregister(self):
+        scheduler = FairShareScheduler(burst_factor=1.0, burst_secs=0)
+        scheduler.register('s1')
+        scheduler.unregister('s1')
+        self.assertEqual(scheduler.reserve('s1', 8000, 64, now=0), 0)
+
+    def test_schedule(self):
+        scheduler = FairShareScheduler()
+        done = threading.Event()
+        scheduler.schedule(0.05, done.set)
+        self.assertTrue(done.wait(1))
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+
+from playlist_store import PlaylistStore
+
+
+def playlist(playlist_id, *track_ids):
+    return SimpleNamespace(id=playlist_id, name=playlist_id.title(), description='',
+                           owner='user', created_at=0, track_ids=list(track_ids))
+
+
+class PlaylistStoreTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'playlists')
+        self.changed = []
+        self.store = self.open()
+
+    def open(self, compact_every=1000):
+        store = PlaylistStore(self.path, {}, SimpleNamespace, self.changed.append,
+                              compact_every).open()
+        self.addCleanup(store.close)
+        return store
+
+    def reopen(self, compact_every=1000):
+        self.store.close()
+        self.store = self.open(compact_every)
+        return self.store
+
+    def test_edits_survive_restart(self):
+        self.store.create(playlist('rock', 'a.mp3'))
+        self.store.append('rock', 'b.mp3')
+        self.store.append('rock', 'c.mp3')
+        self.store.move('rock', 2, 0)
+        self.store.remove('rock', 1)
+
+        store = self.reopen()
+        self.assertEqual(store.playlists['rock'].track_ids, ['c.mp3', 'b.mp3'])
+        self.assertEqual(self.changed, ['rock'] * 5)
+
+    def test_append_writes_one_line(self):
+        self.store.create(playlist('rock', *[f'{i}.mp3' for i in range(1000)]))
+        size = os.path.getsize(self.store.journal_path)
+        self.store.append('rock', 'new.mp3')
+
+        self.assertLess(os.path.getsize(self.store.journal_path) - size, 100)
+
+    def test_objects_are_replaced_not_modified(self):
+        self.store.create(playlist('rock', 'a.mp3'))
+        before = self.store.playlists['rock']
+        self.store.append('rock', 'b.mp3')
+
+        self.assertEqual(before.track_ids, ['a.mp3'])
+
+    def test_reverse_index(self):
+        self.store.create(playlist('rock', 'a.mp3', 'b.mp3'))
+        self.store.create(playlist('pop', 'b.mp3', 'b.mp3'))
+        self.assertEqual(self.store.playlists_with('b.mp3'), {'rock', 'pop'})
+
+        self.store.remove('pop', 0)
+        self.assertEqual(self.store.playlists_with('b.mp3'), {'rock', 'pop'})
+        self.store.delete('rock')
+        self.assertEqual(self.store.playlists_with('b.mp3'), {'pop'})
+        self.assertEqual(self.store.playlists_with('a.mp3'), set())
+
+    def test_purge_track(self):
+        self.store.create(playlist('rock', 'a.mp3', 'b.mp3'))
+        self.store.create(playlist('pop', 'c.mp3'))
+        self.changed.clear()
+
+        self.assertEqual(self.store.purge_track('a.mp3'), ['rock'])
+        self.assertEqual(self.store.playlists['rock'].track_ids, ['b.mp3'])
+        self.assertEqual(self.changed, ['rock'])
+        self.assertEqual(self.store.purge_track('zzz.mp3'), [])
+
+    def test_bad_edits(self):
+        self.store.create(playlist('rock', 'a.mp3'))
+        with self.assertRaises(KeyError):
+            self.store.append('jazz', 'a.mp3')
+        with self.assertRaises(KeyError):
+            self.store.create(playlist('rock'))
+        with self.assertRaises(IndexError):
+            self.store.remove('rock', 1)
+
+        store = self.reopen()
+        self.assertEqual(store.playlists['rock'].track_ids, ['a.mp3'])
+
+    def test_compaction(self):
+        self.store = self.reopen(compact_every=3)
+        self.store.create(playlist('rock'))
+        for name in 'abcd':
+            self.store.append('rock', f'{name}.mp3')
+
+        self.assertEqual(self.store.journal_entries, 2)
+        store = self.reopen()
+        self.assertEqual(store.playlists['rock'].track_ids,
+                         ['a.mp3', 'b.mp3', 'c.mp3', 'd.mp3'])
+
+    def test_interrupted_compaction(self):
+        self.store.create(playlist('rock'))
+        self.store.append('rock', 'a.mp3')
+        with open(self.store.journal_path) as fd:
+            journal = fd.read()
+        self.store.compact()
+        with open(self.store.journal_path, 'w') as fd:
+            fd.write(journal)  # como si se hubiera caído antes de vaciar el journal
+
+        store = self.reopen()
+        self.assertEqual(store.playlists['rock'].track_ids, ['a.mp3'])
+
+    def test_truncated_journal(self):
+        self.store.create(playlist('rock'))
+        self.store.append('rock', 'a.mp3')
+        self.store.close()
+        with open(self.store.journal_path, 'a') as fd:
+            fd.write('{"op":"app')
+
+        store = self.open()
+        self.assertEqual(store.playlists['rock'].track_ids, ['a.mp3'])
+        store.append('rock', 'b.mp3')
+
+        store = self.reopen()
+        self.assertEqual(store.playlists['rock'].track_ids, ['a.mp3', 'b.mp3'])
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from popularity import PlayLog, PopularityScores, PopularityTracker, read_ahead
+
+
+class PlayLogTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'plays.log')
+
+    def test_batched_writes(self):
+        log = PlayLog(self.path, batch_size=2).open()
+        log.append('a.mp3', 100)
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+        log.append('b.mp3', 101)
+        log.close()
+        self.assertEqual(list(PlayLog.read(self.path)), [(100, 'a.mp3'), (101, 'b.mp3')])
+
+    def test_cut_last_line(self):
+        with open(self.path, 'w') as fd:
+            fd.write('100 a.mp3\n101 b.m')
+
+        self.assertEqual(list(PlayLog.read(self.path)), [(100, 'a.mp3')])
+
+    def test_corrupt_lines_skipped(self):
+        with open(self.path, 'wb') as fd:
+            fd.write(b'100 a.mp3\nxx b.mp3\n101\n\xff\xfe c.mp3\n102 d.mp3\n')
+
+        with self.assertLogs('Popularity', 'WARNING') as logs:
+            events = list(PlayLog.read(self.path))
+        self.assertEqual(events, [(100, 'a.mp3'), (102, 'd.mp3')])
+        self.assertEqual(len(logs.records), 3)
+
+    def test_rotation(self):
+        log = PlayLog(self.path, max_bytes=10).open()
+        log.append('a.mp3', 100)
+
+        self.assertEqual(log.flush(), 0)
+        self.assertTrue(os.path.exists(f'{self.path}.1'))
+        log.close()
+
+
+class PopularityScoresTests(TestCase):
+    def test_decay(self):
+        scores = PopularityScores(half_life=10, at=0)
+        scores.add('a.mp3', 0)
+        scores.decay_to(10)
+
+        self.assertAlmostEqual(scores.scores['a.mp3'], 0.5)
+
+    def test_recent_plays_weigh_more(self):
+        scores = PopularityScores(half_life=10, at=100)
+        for _ in range(3):
+            scores.add('old.mp3', 60)
+        scores.add('new.mp3', 100)
+
+        self.assertEqual([track_id for track_id, _ in scores.top(2)],
+                         ['new.mp3', 'old.mp3'])
+
+    def test_forget(self):
+        scores = PopularityScores(half_life=1, at=0)
+        scores.add('a.mp3', 0)
+        scores.decay_to(100)
+
+        self.assertEqual(scores.top(1), [])
+
+
+class PopularityTrackerTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'plays.log')
+
+    def test_top(self):
+        tracker = PopularityTracker(self.path).open()
+        for track_id in ['a.mp3', 'b.mp3', 'b.mp3']:
+            tracker.record(track_id)
+        tracker.aggregate()
+
+        self.assertEqual(tracker.top(2), ['b.mp3', 'a.mp3'])
+        tracker.close()
+
+    def test_restart(self):
+        tracker = PopularityTracker(self.path, batch_size=1).open()
+        tracker.record('a.mp3')
+        tracker.aggregate()
+        tracker.record('b.mp3')
+        tracker.record('b.mp3')
+        tracker.log.close()  # caída: b.mp3 está en el log pero no en la foto
+
+        restarted = PopularityTracker(self.path).open()
+        self.assertEqual(restarted.top(2), ['b.mp3', 'a.mp3'])
+        self.assertAlmostEqual(sum(restarted.scores.scores.values()), 3, places=3)
+        restarted.close()
+
+
+class ReadAheadTests(TestCase):
+    def test_size(self):
+        path = 'test/media/1s.mp3'
+        self.assertEqual(read_ahead(path), os.path.getsize(path))
@@ -0,0 +1,84 @@
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from profiling import Profiler, profiled
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.profiler = Profiler(self.directory, 'test', sample_interval=0.001)
+        self.addCleanup(self.profiler.set_mode, 'off')
+
+        @profiled('server.get_audio_chunk', self.profiler)
+        def get_audio_chunk(n):
+            return busy(n)
+
+        @profiled('server.open_stream', self.profiler)
+        def open_stream():
+            return get_audio_chunk(10)
+
+        self.get_audio_chunk = get_audio_chunk
+        self.open_stream = open_stream
+
+    def names(self, files):
+        return sorted(os.path.basename(f) for f in files)
+
+    def test_off_writes_nothing(self):
+        self.assertEqual(self.get_audio_chunk(10), busy(10))
+        self.assertEqual(self.profiler.set_mode('off'), [])
+
+    def test_cpu_profile_per_operation(self):
+        self.profiler.set_mode('cpu')
+        self.get_audio_chunk(1000)
+        self.open_stream()
+        files = self.profiler.set_mode('off')
+
+        self.assertEqual(self.names(files),
+                         ['server.get_audio_chunk.prof', 'server.open_stream.prof'])
+
+    def test_cpu_profile_from_threads(self):
+        self.profiler.set_mode('cpu')
+        threads = [threading.Thread(target=self.get_audio_chunk, args=(1000,))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        [path] = self.profiler.dump()
+        stats = pstats.Stats(path)
+        calls = [v[1] for k, v in stats.stats.items() if k[2] == 'busy']
+        self.assertEqual(calls, [4])
+
+    def test_samples_attributed_to_operation(self):
+        self.profiler.set_mode('sample')
+        self.get_audio_chunk(3_000_000)
+        files = self.profiler.set_mode('off')
+
+        self.assertIn('server.get_audio_chunk.folded', self.names(files))
+        path = next(f for f in files if f.endswith('get_audio_chunk.folded'))
+        with open(path) as fd:
+            self.assertIn('test_profiling.py:busy', fd.read())
+
+    def test_memory_snapshot(self):
+        self.profiler.set_mode('memory')
+        data = [bytes(1024) for _ in range(100)]
+        files = self.profiler.set_mode('off')
+
+        self.assertEqual(self.names(files), ['memory.txt'])
+        self.assertTrue(data)
+
+    def test_bad_mode(self):
+        with self.assertRaises(ValueError):
+            self.profiler.set_mode('perf')
+        self.assertEqual(self.profiler.mode, 'off')
@@ -0,0 +1,112 @@
+import os
+import time
+from threading import Thread
+from unittest import skipIf
+
+from media_server import Spotifice, main
+
+from .icetest import IceTestCase
+
+
+class StickySessionTests(IceTestCase):
+    server_port = 10000
+
+    def setUp(self):
+        server_props = {
+            'MediaServerAdapter.Endpoints': f'tcp -p {self.server_port}',
+            'MediaServerAdapter.AdapterId': 'MediaServer-1.MediaServerAdapter',
+            'MediaServerAdapter.ReplicaGroupId': 'MediaServerGroup',
+            'MediaServer.Content': 'test/media'}
+        self.create_server(main, server_props)
+        self.sut = self.create_proxy(
+            f'mediaServer1:default -p {self.server_port} -t 500',
+            Spotifice.MediaServerPrx)
+
+    def test_session_proxy_bound_to_replica(self):
+        session = self.sut.authenticate(None, 'user', 'secret')
+
+        # El proxy de sesión se resuelve por el adaptador de esta réplica, no por el grupo
+        self.assertEqual(session.ice_getAdapterId(), 'MediaServer-1.MediaServerAdapter')
+
+
+class ThroughputMixin:
+    sessions = 12
+    duration = 2
+    chunk_size = 16 * 1024
+
+    def pull(self, session, totals, i):
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline:
+            session.open_stream('4s.mp3', 0)
+            while chunk := session.get_audio_chunk(self.chunk_size):
+                totals[i] += len(chunk)
+
+    def aggregate_throughput(self, servers):
+        sessions = [servers[i % len(servers)].authenticate(None, 'user', 'secret')
+                    for i in range(self.sessions)]
+        totals = [0] * len(sessions)
+        threads = [Thread(target=self.pull, args=(s, totals, i))
+                   for i, s in enumerate(sessions)]
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        return sum(totals) / self.duration
+
+
+@skipIf((os.cpu_count() or 1) < 4, "replica scaling needs at least 4 cores")
+class ReplicaScalingTests(ThroughputMixin, IceTestCase):
+    base_port = 10100
+
+    def start_replicas(self, count):
+        servers = []
+        for i in range(count):
+            port = self.base_port + i
+            self.create_server_process('media_server.py', {
+                'MediaServerAdapter.Endpoints': f'tcp -p {port}',
+                'MediaServer.Content': 'test/media',
+                'MediaServer.SessionSecret': 'test'})
+            servers.append(self.create_proxy(
+                f'mediaServer1:default -p {port} -t 2000', Spotifice.MediaServerPrx))
+        return servers
+
+    def test_throughput_scales_with_replicas(self):
+        servers = self.start_replicas(3)
+
+        single = self.aggregate_throughput(servers[:1])
+        replicated = self.aggregate_throughput(servers)
+
+        self.assertGreater(replicated, single * 1.3,
+                           f"1 replica: {single / 1e6:.2f} MB/s, "
+                           f"3 replicas: {replicated / 1e6:.2f} MB/s")
+
+
+@skipIf((os.cpu_count() or 1) < 4, "worker scaling needs at least 4 cores")
+class WorkerScalingTests(ThroughputMixin, IceTestCase):
+    base_port = 10200
+    workers = 4
+
+    def setUp(self):
+        self.create_server_process('media_server.py', {
+            'MediaServer.Workers': str(self.workers),
+            'MediaServer.WorkerBasePort': str(self.base_port),
+            'MediaServer.Content': 'test/media'})
+        self.servers = [
+            self.create_proxy(f'mediaServer1:default -p {self.base_port + i} -t 2000',
+                              Spotifice.MediaServerPrx)
+            for i in range(self.workers)]
+
+    def test_workers_share_catalog(self):
+        tracks = [[t.id for t in s.get_all_tracks()] for s in self.servers]
+        self.assertTrue(all(t == tracks[0] for t in tracks))
+
+    def test_throughput_per_core(self):
+        results = {}
+        for count in range(1, self.workers + 1):
+            results[count] = self.aggregate_throughput(self.servers[:count])
+
+        report = ', '.join(f"{count}: {throughput / 1e6:.2f} MB/s"
+                           for count, throughput in results.items())
+        self.assertGreater(results[self.workers], results[1] * 1.3, report)
@@ -0,0 +1,62 @@
+import errno
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import slice_cache
+
+
+class SliceCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        patcher = patch.object(slice_cache, 'CACHE_DIR', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def import_in_new_process(self, **env):
+        env = dict(os.environ, SPOTIFICE_SLICE_CACHE=str(self.cache_dir), **env)
+        code = ("import sys, slice_cache; S = slice_cache.load('spotifice_v2.ice'); "
+                "print(hasattr(S, 'MediaServerPrx'), 'spotifice_v2_ice' in sys.modules)")
+        return subprocess.run([sys.executable, '-c', code], cwd=slice_cache.HERE, env=env,
+                              capture_output=True, text=True, check=True).stdout.strip()
+
+    def test_build(self):
+        path = slice_cache.build('spotifice_v2.ice')
+
+        self.assertEqual(path,
+                         slice_cache.cache_path(slice_cache.HERE / 'spotifice_v2.ice'))
+        self.assertTrue((path / 'spotifice_v2_ice.py').exists())
+        self.assertEqual(slice_cache.build('spotifice_v2.ice'), path)
+
+    def test_concurrent_build(self):
+        path = slice_cache.cache_path(slice_cache.HERE / 'spotifice_v2.ice')
+
+        def rename(src, dst):
+            shutil.copytree(src, dst)  # otro proceso termina primero
+            raise OSError(errno.ENOTEMPTY, "Directory not empty")
+
+        with patch('slice_cache.os.rename', side_effect=rename):
+            self.assertEqual(slice_cache.build('spotifice_v2.ice'), path)
+        self.assertTrue((path / 'spotifice_v2_ice.py').exists())
+
+    def test_load_precompiled(self):
+        slice_cache.build('spotifice_v2.ice')
+        self.assertEqual(self.import_in_new_process(), 'True True')
+
+    def test_fallback_to_load_slice(self):
+        self.assertEqual(self.import_in_new_process(), 'True False')
+
+    def test_hash_follows_contents(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ice') as ice:
+            ice.write('module M { interface I {}; };')
+            ice.flush()
+            before = slice_cache.slice_hash(ice.name)
+            ice.write('// changed')
+            ice.flush()
+            self.assertNotEqual(slice_cache.slice_hash(ice.name), before)
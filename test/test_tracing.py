@@ -0,0 +1,99 @@
+import os
+import tempfile
+from time import time
+from unittest import TestCase, skipUnless
+
+import tracing
+
+
+class TracingTests(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(self.path)
+        tracing.TRACER.open(self.path, 'Test')
+
+    def tearDown(self):
+        tracing.TRACER.close()
+        os.remove(self.path)
+
+    def spans(self):
+        tracing.TRACER.close()
+        return [e for e in tracing.load([self.path]) if e['ph'] == 'X']
+
+    def test_nested_spans_share_trace(self):
+        with tracing.span('outer') as outer:
+            with tracing.span('inner') as inner:
+                self.assertEqual(tracing.current(), inner)
+            self.assertEqual(tracing.current(), outer)
+        self.assertIsNone(tracing.current())
+
+        spans = {e['name']: e['args'] for e in self.spans()}
+        self.assertEqual(spans['inner']['trace_id'], spans['outer']['trace_id'])
+        self.assertEqual(spans['inner']['parent_id'], spans['outer']['span_id'])
+        self.assertIsNone(spans['outer']['parent_id'])
+
+    def test_remote_parent(self):
+        with tracing.span('server.open_stream', ('abc', '123')):
+            pass
+
+        [span] = self.spans()
+        self.assertEqual(span['args']['trace_id'], 'abc')
+        self.assertEqual(span['args']['parent_id'], '123')
+
+    def test_record_and_summary(self):
+        with tracing.span('render.play') as ctx:
+            now = time()
+            tracing.record('gst.first_buffer', now, now + 0.05, ctx)
+
+        text = tracing.summary(tracing.load([self.path]))
+        self.assertIn(f'trace {ctx[0]}', text)
+        self.assertIn('Test: gst.first_buffer', text)
+        self.assertIn('50.0 ms', text)
+
+    def test_disabled_without_parent(self):
+        tracing.TRACER.close()
+        with tracing.span('control.play') as ctx:
+            self.assertIsNone(ctx)
+            self.assertIsNone(tracing.current())
+
+    def test_span_ended_in_callback(self):
+        action = tracing.Span('control.on_play')
+        self.assertIsNone(tracing.current())
+        self.assertEqual(action.context, {tracing.TRACE_ID: action.ctx[0],
+                                          tracing.SPAN_ID: action.ctx[1]})
+
+        action.end()
+        action.end()
+        with action.activated():
+            child = tracing.Span('control.track')
+        child.end()
+
+        spans = {e['name']: e['args'] for e in self.spans()}
+        self.assertEqual(len(spans), 2)
+        self.assertEqual(spans['control.track']['trace_id'], action.ctx[0])
+        self.assertEqual(spans['control.track']['parent_id'], action.ctx[1])
+
+    def test_traced_without_context(self):
+        @tracing.traced('server.get_track_info')
+        def operation(current=None):
+            return tracing.current()
+
+        self.assertIsNone(operation())
+        self.assertEqual(self.spans(), [])
+
+    @skipUnless(hasattr(os, 'fork'), "fork not available")
+    def test_forked_process_uses_its_pid(self):
+        tracer = tracing.Tracer()
+        path = f'{self.path}.w0'
+        self.addCleanup(os.remove, path)
+
+        pid = os.fork()
+        if pid == 0:
+            tracer.open(path, 'Worker')
+            tracer.close()
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        [event] = tracing.load([path])
+        self.assertEqual(event['pid'], pid)
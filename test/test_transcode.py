@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase, skipUnless
+
+from mp3_frames import FrameIndex
+from transcode import Gst, TranscodeCache, snap_quality
+
+
+class SnapQualityTests(TestCase):
+    def test_exact(self):
+        self.assertEqual(snap_quality(96), 96)
+
+    def test_rounds_down(self):
+        self.assertEqual(snap_quality(100), 96)
+
+    def test_minimum(self):
+        self.assertEqual(snap_quality(8), 32)
+
+
+@skipUnless(Gst, "GStreamer not available")
+class TranscodeCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_transcode_lowers_bitrate(self):
+        cache = TranscodeCache(self.cache_dir, 10 ** 7)
+        path = cache.get('4s.mp3', 'test/media/4s.mp3', 32)
+
+        index = FrameIndex.from_file(path)
+        original = FrameIndex.from_file('test/media/4s.mp3')
+        self.assertLess(index.bitrate_kbps, original.bitrate_kbps)
+        self.assertAlmostEqual(index.duration_ms, 4000, delta=300)
+
+    def test_second_get_is_a_hit(self):
+        cache = TranscodeCache(self.cache_dir, 10 ** 7)
+        first = cache.get('4s.mp3', 'test/media/4s.mp3', 32)
+        second = cache.get('4s.mp3', 'test/media/4s.mp3', 32)
+
+        self.assertEqual(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_disk_budget(self):
+        evicted = []
+        cache = TranscodeCache(self.cache_dir, 1)
+        cache.get('1s.mp3', 'test/media/1s.mp3', 32, evicted.append)
+        cache.get('2s.mp3', 'test/media/2s.mp3', 32, evicted.append)
+
+        self.assertEqual(evicted, [TranscodeCache.file_name('1s.mp3', 32)])
+        self.assertEqual(len(cache.files), 1)
+
+    def test_prefetch_in_background(self):
+        cache = TranscodeCache(self.cache_dir, 10 ** 7)
+        self.assertIsNone(cache.cached('1s.mp3', 32))
+        cache.prefetch('1s.mp3', 'test/media/1s.mp3', 32)
+
+        deadline = time.monotonic() + 30
+        while cache.cached('1s.mp3', 32) is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.assertIsNotNone(cache.cached('1s.mp3', 32))
+        self.assertFalse([name for name in os.listdir(self.cache_dir) if '.part' in name])
+
+    def test_survives_restart(self):
+        TranscodeCache(self.cache_dir, 10 ** 7).get('1s.mp3', 'test/media/1s.mp3', 32)
+        cache = TranscodeCache(self.cache_dir, 10 ** 7)
+        cache.get('1s.mp3', 'test/media/1s.mp3', 32)
+        self.assertEqual(cache.hits, 1)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import Ice
+except ImportError:
+    Ice = None
+
+logger = logging.getLogger("Tracing")
+
+# Claves del contexto de Ice con las que viaja la traza entre procesos
+TRACE_ID = 'trace-id'
+SPAN_ID = 'span-id'
+
+
+def new_id():
+    return uuid.uuid4().hex[:16]
+
+
+#Escribe los spans en formato Chrome Trace Event (chrome://tracing, Perfetto)
+class Tracer:
+    def __init__(self):
+        self.fd = None
+        self.lock = threading.Lock()
+        self.pid = None  # el del proceso que abre el fichero (un worker tras el fork)
+
+    @property
+    def enabled(self):
+        return self.fd is not None
+
+    def open(self, path, process_name):
+        self.pid = os.getpid()
+        self.fd = open(path, 'a', buffering=1)
+        if self.fd.tell() == 0:
+            self.fd.write('[\n')  # el visor acepta el array sin cerrar
+        self.write(dict(name='process_name', ph='M', pid=self.pid,
+                        args=dict(name=process_name)))
+        logger.info(f"Writing traces to '{path}'")
+
+    def record(self, name, start, end, trace_id, span_id, parent_id=None, **args):
+        if not self.fd:
+            return
+        self.write(dict(
+            name=name, ph='X', pid=self.pid, tid=threading.get_ident(),
+            ts=int(start * 1e6), dur=int((end - start) * 1e6),
+            args=dict(trace_id=trace_id, span_id=span_id, parent_id=parent_id, **args)))
+
+    def write(self, event):
+        with self.lock:
+            self.fd.write(json.dumps(event) + ',\n')
+
+    def close(self):
+        with self.lock:
+            if self.fd:
+                self.fd.close()
+                self.fd = None
+
+
+TRACER = Tracer()
+local = threading.local()
+
+
+def current():
+    "(trace_id, span_id) of the innermost span of this thread, or None"
+    stack = getattr(local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+def record(name, start, end, parent, **args):
+    "Record an already finished span (times from time.time()) under parent"
+    if parent:
+        TRACER.record(name, start, end, parent[0], new_id(), parent[1], **args)
+
+
+@contextmanager
+def span(name, parent=None, ic=None, **args):
+    """Time a block as a span of parent's trace (or of a new one). While it
+    runs, calls made from this thread through ic carry the trace in their
+    Ice context (needs Ice.ImplicitContext=PerThread)."""
+    parent = parent or current()
+    if parent is None and not TRACER.enabled:
+        yield None
+        return
+
+    trace_id = parent[0] if parent else new_id()
+    ctx = (trace_id, new_id())
+
+    implicit = ic.getImplicitContext() if ic else None
+    saved = implicit.getContext() if implicit else None
+    if implicit:
+        implicit.put(TRACE_ID, ctx[0])
+        implicit.put(SPAN_ID, ctx[1])
+
+    local.stack = getattr(local, 'stack', []) + [ctx]
+    start = time.time()
+    try:
+        yield ctx
+    finally:
+        TRACER.record(name, start, time.time(), ctx[0], ctx[1],
+                      parent[1] if parent else None, **args)
+        local.stack = local.stack[:-1]
+        if implicit:
+            implicit.setContext(saved)
+
+
+class Span:
+    """Span ended explicitly with end(), for work that finishes in a callback
+    (an AMI call). Its trace travels in the Ice context given by context,
+    passed to each call with context=, not in the implicit context."""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent or current()
+        self.ctx = None
+        if self.parent is not None or TRACER.enabled:
+            trace_id = self.parent[0] if self.parent else new_id()
+            self.ctx = (trace_id, new_id())
+        self.start = time.time()
+        self.ended = False
+
+    @property
+    def context(self):
+        return {TRACE_ID: self.ctx[0], SPAN_ID: self.ctx[1]} if self.ctx else None
+
+    def end(self, **args):
+        if self.ctx and not self.ended:
+            self.ended = True
+            TRACER.record(self.name, self.start, time.time(), self.ctx[0], self.ctx[1],
+                          self.parent[1] if self.parent else None, **args)
+
+    @contextmanager
+    def activated(self):
+        "Make it the current span of this thread while the block runs"
+        ctx = self.ctx
+        local.stack = getattr(local, 'stack', []) + ([ctx] if ctx else [])
+        try:
+            yield ctx
+        finally:
+            if ctx:
+                local.stack = local.stack[:-1]
+
+
+def traced(name, root=False):
+    """Record a servant operation as a span of the trace that came in its
+    Ice context. With root=True, calls without a trace start a new one."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            current_ = kwargs.get('current')
+            if current_ is None and args and Ice and isinstance(args[-1], Ice.Current):
+                current_ = args[-1]
+
+            ctx = current_.ctx if current_ else {}
+            parent = (ctx[TRACE_ID], ctx.get(SPAN_ID)) if TRACE_ID in ctx else None
+            if parent is None and not (root and TRACER.enabled):
+                return method(*args, **kwargs)
+
+            ic = current_.adapter.getCommunicator() if current_ else None
+            with span(name, parent, ic):
+                return method(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+def install(ic, process_name):
+    "Start writing traces to Trace.File, if the property is set"
+    path = ic.getProperties().getProperty('Trace.File')
+    if path:
+        TRACER.open(path, process_name)
+
+
+def load(paths):
+    events = []
+    for path in paths:
+        with open(path) as fd:
+            text = fd.read().rstrip().rstrip(',').lstrip('[')
+        events.extend(json.loads(f'[{text}]'))
+    return events
+
+
+#Resumen por traza: cada span con su desplazamiento desde el inicio y su duración
+def summary(events):
+    names = {e['pid']: e['args']['name'] for e in events if e.get('ph') == 'M'}
+    traces = defaultdict(list)
+    for e in events:
+        if e.get('ph') == 'X':
+            traces[e['args']['trace_id']].append(e)
+
+    lines = []
+    ordered = sorted(traces.items(), key=lambda t: min(e['ts'] for e in t[1]))
+    for trace_id, spans in ordered:
+        spans.sort(key=lambda e: e['ts'])
+        origin = spans[0]['ts']
+        total = max(e['ts'] + e['dur'] for e in spans) - origin
+        lines.append(f"trace {trace_id}: {total / 1000:.1f} ms")
+        for e in spans:
+            process = names.get(e['pid'], e['pid'])
+            start_ms, dur_ms = (e['ts'] - origin) / 1000, e['dur'] / 1000
+            lines.append(f"  +{start_ms:8.1f} ms {dur_ms:8.1f} ms  "
+                         f"{process}: {e['name']}")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ('merge', 'summary'):
+        sys.exit("Usage: tracing.py merge <out.json> <trace-file>...\n"
+                 "       tracing.py summary <trace-file>...")
+
+    if sys.argv[1] == 'merge':
+        with open(sys.argv[2], 'w') as out:
+            json.dump(load(sys.argv[3:]), out)
+    else:
+        print(summary(load(sys.argv[2:])))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import hashlib
+import logging
+import os
+import queue
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger("Transcoder")
+
+try:
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst  # type: ignore # noqa: E402
+    Gst.init(None)
+except (ImportError, ValueError):
+    Gst = None
+
+# Bitrates CBR que acepta el codificador MP3 (MPEG-1 layer III)
+QUALITIES_KBPS = [32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+
+PIPELINE = ('filesrc name=src ! decodebin ! audioconvert ! audioresample ! '
+            'lamemp3enc name=enc target=bitrate cbr=true ! filesink name=sink')
+
+
+def snap_quality(quality_kbps):
+    "Highest encoder bitrate not above quality_kbps (the lowest one if none is)"
+    valid = [q for q in QUALITIES_KBPS if q <= quality_kbps]
+    return valid[-1] if valid else QUALITIES_KBPS[0]
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def transcode(src, dst, quality_kbps, timeout_secs=120):
+    if Gst is None:
+        raise TranscodeError("GStreamer is not available")
+
+    pipeline = Gst.parse_launch(PIPELINE)
+    pipeline.get_by_name('src').set_property('location', str(src))
+    pipeline.get_by_name('enc').set_property('bitrate', quality_kbps)
+    pipeline.get_by_name('sink').set_property('location', str(dst))
+
+    pipeline.set_state(Gst.State.PLAYING)
+    try:
+        msg = pipeline.get_bus().timed_pop_filtered(
+            timeout_secs * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+
+    if msg is None:
+        raise TranscodeError(f"Timeout transcoding '{src}'")
+    if msg.type == Gst.MessageType.ERROR:
+        err, _ = msg.parse_error()
+        raise TranscodeError(f"Error transcoding '{src}': {err.message}")
+
+
+class TranscodeCache:
+    """Transcoded files per (track, quality), kept on disk within a byte
+    budget. get() transcodes on a miss; prefetch() queues the work for a
+    background thread that encodes one file at a time."""
+
+    def __init__(self, cache_dir, disk_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.disk_bytes = disk_bytes
+        self.files = OrderedDict()  # nombre -> tamaño, del menos al más usado
+        self.used = 0
+        self.inflight = {}  # nombre -> Event de la codificación en curso
+        self.queued = set()  # nombres pendientes en la cola de prefetch
+        self.queue = queue.Queue()
+        self.worker = None
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        #Lo que ya había en disco vale tras reiniciar: el orden LRU sale del mtime
+        for path in sorted(self.cache_dir.glob('*.mp3'), key=lambda p: p.stat().st_mtime):
+            self.files[path.name] = path.stat().st_size
+            self.used += self.files[path.name]
+
+    @property
+    def available(self):
+        return Gst is not None
+
+    @staticmethod
+    def file_name(track_id, quality_kbps):
+        digest = hashlib.sha1(track_id.encode('utf-8')).hexdigest()
+        return f"{digest}-{quality_kbps}.mp3"
+
+    def get(self, track_id, src, quality_kbps, on_evict=None):
+        "Return the path of track_id at quality_kbps, transcoding it on a miss"
+        name = self.file_name(track_id, quality_kbps)
+
+        while True:
+            with self.lock:
+                if name in self.files:
+                    self.files.move_to_end(name)
+                    self.hits += 1
+                    return self.cache_dir / name
+
+                done = self.inflight.get(name)
+                if done is None:
+                    done = self.inflight[name] = threading.Event()
+                    self.misses += 1
+                    break
+
+            # Otra sesión ya está codificando esta pista: espero y vuelvo a mirar
+            done.wait()
+
+        try:
+            path = self.encode(name, src, quality_kbps)
+            with self.lock:
+                self.files[name] = path.stat().st_size
+                self.used += self.files[name]
+                self.evict(on_evict)
+            return path
+        finally:
+            with self.lock:
+                del self.inflight[name]
+            done.set()
+
+    def cached(self, track_id, quality_kbps):
+        "Path of track_id at quality_kbps if it is already transcoded, else None"
+        name = self.file_name(track_id, quality_kbps)
+        with self.lock:
+            return self.cache_dir / name if name in self.files else None
+
+    def prefetch(self, track_id, src, quality_kbps, on_evict=None):
+        "Queue the transcoding of track_id at quality_kbps, unless it is done or underway"
+        name = self.file_name(track_id, quality_kbps)
+        with self.lock:
+            if name in self.files or name in self.inflight or name in self.queued:
+                return
+            self.queued.add(name)
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name='Transcoder',
+                                               daemon=True)
+                self.worker.start()
+        self.queue.put((name, track_id, src, quality_kbps, on_evict))
+
+    def run(self):
+        while True:
+            name, track_id, src, quality_kbps, on_evict = self.queue.get()
+            with self.lock:
+                self.queued.discard(name)
+            try:
+                self.get(track_id, src, quality_kbps, on_evict)
+            except (TranscodeError, OSError) as e:
+                logger.warning(f"Background transcoding of '{track_id}' failed: {e}")
+
+    def encode(self, name, src, quality_kbps):
+        path = self.cache_dir / name
+        #Nombre temporal único: los workers pre-forked comparten el directorio
+        fd, tmp = tempfile.mkstemp(prefix=f".{name}-", suffix='.part', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            transcode(src, tmp, quality_kbps)
+            os.replace(tmp, path)
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+        logger.info(f"Transcoded '{src}' at {quality_kbps} kbps: "
+                    f"{path.stat().st_size} bytes")
+        return path
+
+    def evict(self, on_evict):
+        while self.used > self.disk_bytes and len(self.files) > 1:
+            name, size = self.files.popitem(last=False)
+            self.used -= size
+            (self.cache_dir / name).unlink(missing_ok=True)
+            if on_evict:
+                on_evict(name)
+
+    def __str__(self):
+        return (f"hits={self.hits} misses={self.misses} files={len(self.files)} "
+                f"disk={self.used}")
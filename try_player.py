@@ -1,10 +1,14 @@
 #! /usr/bin/env python3
 
+import sys
 import time
 
 from gst_player import GstPlayer
 
-player = GstPlayer()
+# Uso: try_player.py [auto|realtime|fast|<gst-sink>]
+sink = sys.argv[1] if len(sys.argv) > 1 else None
+
+player = GstPlayer(sink=sink)
 player.start()
 
 with open('test/media/4s.mp3', 'rb') as fd:
@@ -22,6 +26,7 @@ with open('test/media/4s.mp3', 'rb') as fd:
     while player.is_playing():
         time.sleep(0.5)
 
+    print(f"Stats: {player.stats}")
     player.stop()
 
 player.shutdown()